@@ -1,21 +1,26 @@
 import streamlit as st
 from streamlit_option_menu import option_menu
-from streamlit_lottie import st_lottie
-import requests
-import database as db
-from donor import Donor
-from doctor import Doctor
-from blood_bank import BloodBank
-from blood_request import BloodRequest
+import expiry_sweeper
+import metrics
+import resources
 import sqlite3 as sql
-import pandas as pd
-from sklearn.preprocessing import StandardScaler
-import joblib
-import os
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import calendar
+from datetime import datetime
+
+# Heavy dependencies (plotly, pandas via the page classes, numpy via the model
+# registry, requests) are imported inside the page that needs them, so a worker
+# only pays for the pages it actually renders. Importing database does not open
+# the database; the pool connects (and migrates) on first use.
+#
+# modules each page imports on first render; benchmarks/startup_benchmark.py
+# measures the cold-start cost of each page from this table
+PAGE_MODULES = {
+    "Home": ['plotly.graph_objects'],
+    "Donor Management": ['donor'],
+    "Blood Bank": ['blood_bank'],
+    "Find Donors": ['donor'],
+    "Eligibility": ['model_registry'],
+    "Blood Request": ['allocation', 'pagination', 'request_feed', 'write_queue'],
+}
 
 def create_button_with_description(icon, title, description, key, color="#ff4b4b"):
     st.markdown(f"""
@@ -78,32 +83,19 @@ def create_button_with_description(icon, title, description, key, color="#ff4b4b
 def get_button_stats(key):
     """Return relevant statistics based on button type"""
     try:
-        conn = sql.connect('database_1A.db')
-        cursor = conn.cursor()
+        stats = metrics.get_snapshot()
         
         if key == "donor_btn":
-            cursor.execute("SELECT COUNT(*) FROM donors")
-            total_donors = cursor.fetchone()[0]
-            cursor.execute("SELECT MAX(last_donation_date) FROM donors")
-            last_date = cursor.fetchone()[0] or "No donations yet"
-            return f"Active Donors: {total_donors} | Last Registration: {last_date}"
+            return f"Active Donors: {stats.total_donors} | Last Registration: {stats.last_registration}"
             
         elif key == "bank_btn":
-            cursor.execute("SELECT COUNT(*) FROM blood_banks")
-            total_banks = cursor.fetchone()[0]
-            cursor.execute("SELECT SUM(units_required) FROM blood_requests WHERE status='Pending'")
-            total_required = cursor.fetchone()[0] or 0
-            return f"Active Banks: {total_banks} | Required Units: {total_required}"
+            return f"Active Banks: {stats.blood_banks} | Required Units: {stats.required_units}"
             
         elif key == "request_btn":
-            cursor.execute("SELECT COUNT(*) FROM blood_requests WHERE status='Pending'")
-            pending = cursor.fetchone()[0]
-            return f"Pending Requests: {pending}"
+            return f"Pending Requests: {stats.pending_requests}"
             
         elif key == "nearby_btn":
-            cursor.execute("SELECT COUNT(DISTINCT city) FROM blood_banks")
-            locations = cursor.fetchone()[0]
-            return f"Available Locations: {locations}"
+            return f"Available Locations: {stats.locations}"
         
         elif key == "eligibility_btn":
             return f"check eligibility"
@@ -111,58 +103,26 @@ def get_button_stats(key):
             
     except Exception as e:
         return "Error fetching stats"
-    finally:
-        conn.close()
     
     return ""  # Default return for unhandled keys
 
 def handle_donor_management(p):
-    st.markdown("""
-        <style>
-        /* Style for donor management section */
-        .donor-section {
-            color: black !important;
-        }
-        
-        /* Style for selectbox label */
-        .stSelectbox label {
-            color: black !important;
-            font-weight: 500;
-        }
-        
-        /* Style for selectbox selected value */
-        .stSelectbox div[data-baseweb="select"] span {
-            color: white !important;
-        }
-        
-        /* Style for dropdown options */
-        .stSelectbox div[role="listbox"] div {
-            color: black !important;
-        }
-        
-        /* Style for form labels */
-        .stTextInput label, .stNumberInput label, .stDateInput label, .stTextArea label {
-            color: black !important;
-            font-weight: 500;
-        }
-        
-        /* Style for form inputs */
-        .stTextInput input, .stNumberInput input, .stDateInput input, .stTextArea textarea {
-            color: white !important;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+    resources.inject_css('donor_form', 'donor_management')
 
     st.markdown('<div class="donor-section">', unsafe_allow_html=True)
     
     donor_option = st.selectbox(
         'Select Operation',
-        ['Register Donor', 'Update Donor Info', 'Delete Donor', 'Show All Donors', 'Search Donor']
+        ['Register Donor', 'Import Donors', 'Update Donor Info', 'Delete Donor', 'Show All Donors', 'Search Donor',
+         'Top Donors']
     )
     
     if donor_option == 'Register Donor':
         st.markdown('<h3 style="color: black;">📝 REGISTER NEW DONOR</h3>', unsafe_allow_html=True)
         p.add_donor()
+    elif donor_option == 'Import Donors':
+        st.markdown('<h3 style="color: black;">📥 IMPORT DONORS</h3>', unsafe_allow_html=True)
+        p.import_donors()
     elif donor_option == 'Update Donor Info':
         st.markdown('<h3 style="color: black;">✏ UPDATE DONOR INFO</h3>', unsafe_allow_html=True)
         p.update_donor()
@@ -178,10 +138,14 @@ def handle_donor_management(p):
     elif donor_option == 'Search Donor':
         st.markdown('<h3 style="color: black;">🔍 SEARCH DONOR</h3>', unsafe_allow_html=True)
         p.search_donor()
+    elif donor_option == 'Top Donors':
+        st.markdown('<h3 style="color: black;">⭐ DONORS MOST LIKELY TO DONATE</h3>', unsafe_allow_html=True)
+        p.show_top_donors()
 
     st.markdown('</div>', unsafe_allow_html=True)
 
 def handle_nearby_donors(p):
+    resources.inject_css('donor_form')
     st.markdown("<h3 style='color: black;'>🔍 FIND NEARBY DONORS</h3>", unsafe_allow_html=True)
   
     blood_group = st.selectbox(
@@ -190,81 +154,33 @@ def handle_nearby_donors(p):
         key="blood_group_select"
     )
     
-    # City input
-    city = st.text_input(
-        "Enter City",
-        placeholder="Boston",
+    # PIN code (or city) input
+    location = st.text_input(
+        "Enter PIN Code or City",
+        placeholder="02115",
         key="donor_city"
     )
+    radius_km = st.slider("Search radius (km)", min_value=5, max_value=200, value=25, step=5)
+    include_compatible = st.checkbox(
+        "Include compatible blood groups (e.g. O- for an A+ patient)",
+        value=True,
+        key="include_compatible"
+    )
     
     if st.button("Search Donors"):
-        if city and blood_group:
-            p.find_nearby_donors(city, blood_group)  # Update your Donor class method accordingly
+        if location and blood_group:
+            p.find_nearby_donors(location, blood_group, radius_km, include_compatible)
         else:
-            st.warning("Please enter both city and blood group to search")
+            st.warning("Please enter both a PIN code or city and blood group to search")
 
 def handle_blood_bank_management(p):
-    st.markdown("""
-        <style>
-        /* Style for blood bank section */
-        .blood-bank-section {
-            color: black !important;
-        }
-        
-        /* Style for selectbox label */
-        .stSelectbox label {
-            color: black !important;
-            font-weight: 500;
-        }
-        
-        /* Style for selectbox selected value */
-        .stSelectbox div[data-baseweb="select"] span {
-            color: white !important;
-        }
-        
-        /* Style for dropdown options */
-        .stSelectbox div[role="listbox"] div {
-            color: black !important;
-        }
-        
-        /* Style for text area (address) */
-        .stTextArea textarea {
-            color: white !important;
-        }
-        
-        /* Style for text area label */
-        .stTextArea label {
-            color: black !important;
-        }
-        
-        /* Style for text input */
-        .stTextInput input {
-            color: white !important;
-        }
-        
-        /* Style for text input label */
-        .stTextInput label {
-            color: black !important;
-            font-weight: 500;
-        }
-        
-        /* Style for date input */
-        .stDateInput input {
-            color: white !important;
-        }
-        
-        /* Style for date picker selected value */
-        [data-baseweb="input"] input {
-            color: white !important;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+    resources.inject_css('blood_bank_management')
 
     st.markdown('<div class="blood-bank-section">', unsafe_allow_html=True)
     
     bank_option = st.selectbox(
         'Select Operation',
-        ['Add Blood Bank', 'View Blood Banks', 'Update Blood Bank']
+        ['Add Blood Bank', 'View Blood Banks', 'Update Blood Bank', 'Import Blood Units']
     )
     
     if bank_option == 'Add Blood Bank':
@@ -274,46 +190,13 @@ def handle_blood_bank_management(p):
         p.view_blood_banks()
     elif bank_option == 'Update Blood Bank':
         p.update_blood_bank()
+    elif bank_option == 'Import Blood Units':
+        p.import_blood_units()
 
     st.markdown('</div>', unsafe_allow_html=True)
 
 def handle_blood_request():
-    st.markdown("""
-        <style>
-        /* Style for all form inputs */
-        .stTextInput input, .stNumberInput input, .stSelectbox select {
-            color: white !important;
-        }
-        
-        /* Style for all labels */
-        .stTextInput label, .stNumberInput label, .stSelectbox label {
-            color: black !important;
-            font-weight: 500;
-        }
-        
-        /* Style for selectbox text and options */
-        .stSelectbox div[data-baseweb="select"] span {
-            color: white !important;
-        }
-        
-        .stSelectbox div[role="listbox"] div {
-            color: black !important;
-        }
-        
-        /* Style for date input */
-        .stDateInput input {
-            color: white !important;
-        }
-        .stDateInput label {
-            color: black !important;
-            font-weight: 500;
-        }
-        /* Style for date picker calendar */
-        .stDateInput div[data-baseweb="calendar"] {
-            color: black !important;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+    resources.inject_css('blood_request_form')
 
     st.markdown("<h3 style='color: black;'>🩸 Blood Request Form</h3>", unsafe_allow_html=True)
     
@@ -372,7 +255,9 @@ def handle_blood_request():
                         datetime.now().date(), required_by, 'Pending'
                     )
                     
-                    db.execute_query(query, params)
+                    # one group-committing writer serves every session's submissions
+                    import write_queue
+                    write_queue.execute_write(query, params)
                     st.success("Blood request submitted successfully!")
                     
                     # Show emergency contact information
@@ -388,215 +273,52 @@ def handle_blood_request():
             else:
                 st.warning("Please fill in all required fields.")
 
+    # Match pending requests against the available inventory
+    if st.button("Allocate Available Units", key="allocate_units"):
+        try:
+            import allocation
+            stats = allocation.allocate()
+            st.success(f"Approved {stats['approved']} request(s), reserving {stats['units_reserved']} unit(s).")
+            if stats['unfilled'] or stats['conflicts']:
+                st.info(f"{stats['unfilled'] + stats['conflicts']} request(s) are still waiting for compatible units.")
+        except Exception as e:
+            st.error(f"Error allocating units: {str(e)}")
+
     # Show existing requests
     st.markdown("<h3 style='color: black;'>Current Blood Requests</h3>", unsafe_allow_html=True)
     try:
-        query = """
-            SELECT 
-                patient_name, blood_group, units_required,
-                urgency, hospital_name, request_date,
-                required_by, status
-            FROM blood_requests
-            ORDER BY 
-                CASE urgency 
-                    WHEN 'Critical' THEN 1
-                    WHEN 'Urgent' THEN 2
-                    ELSE 3
-                END,
-                required_by ASC
-        """
-        results = db.execute_query(query, fetch=True)
-        
-        if results:
-            for request in results:
-                urgency_color = {
-                    'Critical': '#ff4b4b',
-                    'Urgent': '#ffa500',
-                    'Normal': '#2ecc71'
-                }.get(request['urgency'], '#000000')
-                
-                st.markdown(f"""
-                    <div style="
-                        padding: 15px;
-                        border-radius: 10px;
-                        margin-bottom: 10px;
-                        background-color: white;
-                        border-left: 5px solid {urgency_color};
-                        box-shadow: 0 2px 5px rgba(0,0,0,0.1);">
-                        <div style="display: flex; justify-content: space-between; align-items: center;">
-                            <div>
-                                <h4 style="margin: 0; color: black;">
-                                    {request['patient_name']} • {request['blood_group']}
-                                </h4>
-                                <p style="margin: 5px 0; color: gray;">
-                                    {request['hospital_name']} • {request['units_required']} units
-                                </p>
-                            </div>
-                            <div style="text-align: right;">
-                                <span style="
-                                    background-color: {urgency_color}22;
-                                    color: {urgency_color};
-                                    padding: 3px 8px;
-                                    border-radius: 15px;
-                                    font-size: 0.8em;">
-                                    {request['urgency']}
-                                </span>
-                                <p style="margin: 5px 0; color: gray; font-size: 0.8em;">
-                                    Requested: {request['request_date']}<br>
-                                    Required by: {request['required_by']}<br>
-                                    Status: {request['status']}
-                                </p>
-                            </div>
-                        </div>
-                    </div>
-                """, unsafe_allow_html=True)
+        import pagination
+        import request_feed
+        page = pagination.current_page('request_feed', 'request_feed', page_size=request_feed.WINDOW_ROWS,
+                                       cached=True)
+        
+        if page['rows']:
+            request_feed.render_feed(page['rows'])
+            pagination.page_controls('request_feed', page)
         else:
             st.info("No blood requests at the moment.")
             
     except Exception as e:
         st.error(f"Error loading blood requests: {str(e)}")
 
-def get_total_donors():
-    try:
-        conn = sql.connect('database_1A.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM donor_record")
-        total = cursor.fetchone()[0]
-        return total
-    except Exception as e:
-        st.error(f"Error fetching donor count: {e}")
-        return 0
-    finally:
-        conn.close()
-
-def get_active_blood_banks():
-    try:
-        conn = sql.connect('database_1A.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM blood_banks")
-        total = cursor.fetchone()[0]
-        return total
-    except Exception as e:
-        st.error(f"Error fetching blood bank count: {e}")
-        return 0
-    finally:
-        conn.close()
-
-def get_active_blood_requests():
-    try:
-        conn = sql.connect('database_1A.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM blood_requests WHERE status = 'Pending'")
-        total = cursor.fetchone()[0]
-        return total
-    except Exception as e:
-        st.error(f"Error fetching blood requests count: {e}")
-        return 0
-    finally:
-        conn.close()
-
-def get_critical_blood_groups():
-    try:
-        conn = sql.connect('database_1A.db')
-        cursor = conn.cursor()
-        
-        # Get blood groups with pending requests and their required units
-        cursor.execute("""
-            SELECT blood_group, SUM(units_required) as needed
-            FROM blood_requests 
-            WHERE status = 'Pending'
-            GROUP BY blood_group
-            HAVING needed > 0
-            ORDER BY needed DESC
-            LIMIT 2
-        """)
-        
-        critical_groups = cursor.fetchall()
-        if critical_groups:
-            # Format blood groups for display
-            critical_text = ", ".join([group[0] for group in critical_groups])
-            return critical_text
-        return "None"
-        
-    except Exception as e:
-        return "Error"
-    finally:
-        conn.close()
-
 def predict_donor_eligibility(recency, frequency, monetary, time):
     try:
-        features = pd.DataFrame([[recency, frequency, monetary, time]], 
-                              columns=['Recency (months)', 'Frequency (times)', 
-                                     'Monetary (c.c. blood)', 'Time (months)'])
-        
-        if not os.path.exists('donation_model.joblib'):
-            from donation_model import load_data, preprocess_data, train_model
-            data = load_data('transfusion.csv')
-            
-            train_data = pd.DataFrame(data, columns=['Recency (months)', 'Frequency (times)', 
-                                                   'Monetary (c.c. blood)', 'Time (months)'])
-            
-            # Fit scaler on all training data first
-            scaler = StandardScaler()
-            scaler.fit(train_data)
-            
-            X, y = preprocess_data(data)
-            X_scaled = scaler.transform(X)
-            model = train_model(X_scaled, y)
-            
-            joblib.dump(model, 'donation_model.joblib')
-            joblib.dump(scaler, 'scaler.joblib')
-        
-        # Load model and scaler
-        model = joblib.load('donation_model.joblib')
-        scaler = joblib.load('scaler.joblib')
-        
-        features_scaled = scaler.transform(features)
-        prediction = model.predict(features_scaled)[0]
-        probability = model.predict_proba(features_scaled)[0][1]
-        
-        return prediction, probability
-        
+        import model_registry
+        return model_registry.registry.predict(recency, frequency, monetary, time)
+
     except Exception as e:
         st.error(f"Error predicting eligibility: {str(e)}")
         return None, None
 
 def handle_eligibility_check():
-    st.markdown("""
-        <style>
-        /* Style for eligibility section */
-        .eligibility-section {
-            color: black !important;
-        }
-        
-        /* Style for form labels */
-        .stTextInput label, .stNumberInput label {
-            color: black !important;
-            font-weight: 500;
-        }
-        
-        /* Style for form inputs */
-        .stTextInput input, .stNumberInput input {
-            color: black !important;
-            background-color: white !important;
-            border: 1px solid rgba(255, 75, 75, 0.2) !important;
-        }
-        
-        /* Style for form button */
-        .stButton button {
-            color: white !important;
-            background-color: #ff4b4b !important;
-            font-weight: 500 !important;
-        }
-        
-        /* Style for form button text specifically */
-        .stButton button p {
-            color: white !important;
-        }
-        
-        /* Rest of your existing styles... */
-        </style>
-    """, unsafe_allow_html=True)
+    resources.inject_css('eligibility')
+    import model_registry
+    # the model is published at deploy time; this page only loads it
+    try:
+        model_registry.registry.get()
+    except model_registry.ModelUnavailableError as e:
+        st.error(str(e))
+        return
 
     st.markdown('<div class="eligibility-section">', unsafe_allow_html=True)
     st.markdown("<h3 style='color: black;'>🔍 Check Donor Eligibility</h3>", unsafe_allow_html=True)
@@ -662,12 +384,18 @@ def handle_eligibility_check():
     st.markdown('</div>', unsafe_allow_html=True)
 
 def load_lottie_url(url):
+    import requests
     r = requests.get(url)
     if r.status_code != 200:
         return None
     return r.json()
 
 def create_dashboard_metrics():
+    try:
+        stats = metrics.get_snapshot()
+    except Exception as e:
+        st.error(f"Error fetching dashboard metrics: {e}")
+        return
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
@@ -678,7 +406,7 @@ def create_dashboard_metrics():
                 <div class="metric-label" style="color: black;">Total Donors</div>
                 <div class="metric-trend" style="color: black;">↑ 12% this month</div>
             </div>
-        """.format(get_total_donors()), unsafe_allow_html=True)
+        """.format(stats.total_donors), unsafe_allow_html=True)
     
     with col2:
         st.markdown("""
@@ -688,7 +416,7 @@ def create_dashboard_metrics():
                 <div class="metric-label">Blood Banks</div>
                 <div class="metric-trend">Active Centers</div>
             </div>
-        """.format(get_active_blood_banks()), unsafe_allow_html=True)
+        """.format(stats.blood_banks), unsafe_allow_html=True)
     
     with col3:
         st.markdown("""
@@ -698,7 +426,7 @@ def create_dashboard_metrics():
                 <div class="metric-label">Pending Requests</div>
                 <div class="metric-trend urgent">Urgent Need</div>
             </div>
-        """.format(get_active_blood_requests()), unsafe_allow_html=True)
+        """.format(stats.pending_requests), unsafe_allow_html=True)
     
     with col4:
         st.markdown("""
@@ -708,28 +436,20 @@ def create_dashboard_metrics():
                 <div class="metric-label">Critical Groups</div>
                 <div class="metric-trend">Required Now</div>
             </div>
-        """.format(get_critical_blood_groups()), unsafe_allow_html=True)
+        """.format(", ".join(stats.critical_groups) or "None"), unsafe_allow_html=True)
 
 def create_blood_group_distribution():
-    # Get blood group counts from your database
+    import plotly.graph_objects as go
+
+    # Get blood group counts from the dashboard snapshot
     try:
-        conn = sql.connect('database_1A.db')
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT blood_group, COUNT(*) as count 
-            FROM donors 
-            GROUP BY blood_group 
-            ORDER BY blood_group
-        """)
-        data = cursor.fetchall()
-        blood_groups = [row[0] for row in data]
-        counts = [row[1] for row in data]
+        data = metrics.get_snapshot().blood_group_counts
+        blood_groups = list(data)
+        counts = list(data.values())
     except Exception as e:
         # Fallback data if database query fails
         blood_groups = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
         counts = [150, 50, 140, 45, 80, 30, 160, 40]
-    finally:
-        conn.close()
 
     fig = go.Figure(data=[
         go.Pie(
@@ -769,32 +489,16 @@ def create_blood_group_distribution():
     return fig
 
 def create_age_distribution():
+    import plotly.graph_objects as go
+
     try:
-        conn = sql.connect('database_1A.db')
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT 
-                CASE 
-                    WHEN age < 25 THEN '18-24'
-                    WHEN age BETWEEN 25 AND 34 THEN '25-34'
-                    WHEN age BETWEEN 35 AND 44 THEN '35-44'
-                    WHEN age BETWEEN 45 AND 54 THEN '45-54'
-                    ELSE '55+'
-                END as age_group,
-                COUNT(*) as count 
-            FROM donors 
-            GROUP BY age_group 
-            ORDER BY age_group
-        """)
-        data = cursor.fetchall()
-        age_groups = [row[0] for row in data]
-        counts = [row[1] for row in data]
+        data = metrics.get_snapshot().age_group_counts
+        age_groups = list(data)
+        counts = list(data.values())
     except Exception as e:
         # Fallback data if database query fails
         age_groups = ['18-24', '25-34', '35-44', '45-54', '55+']
         counts = [200, 350, 250, 150, 50]
-    finally:
-        conn.close()
 
     fig = go.Figure(data=[
         go.Bar(
@@ -843,148 +547,13 @@ def home():
         initial_sidebar_state="expanded"
     )
 
+    with resources.rerun() as run:
+        run['page'] = render_page()
+
+def render_page():
+    """Draw the header, navigation and the selected page; return the page's name"""
     # Enhanced CSS
-    st.markdown("""
-        <style>
-        .stApp {
-            background-image: linear-gradient(rgba(255, 255, 255, 0.97), rgba(255, 255, 255, 0.97)),
-                url("https://img.freepik.com/free-photo/close-up-doctor-holding-blood-sample_23-2149140414.jpg");
-            background-size: cover;
-            background-position: center;
-            background-repeat: no-repeat;
-            background-attachment: fixed;
-        }
-        
-        .main-header {
-            background: linear-gradient(135deg, #ff4b4b, #ff8080);
-            padding: 1.5rem;
-            border-radius: 20px;
-            box-shadow: 0 10px 25px rgba(255, 75, 75, 0.2);
-            margin-bottom: 2rem;
-            text-align: center;
-            white-space: nowrap;
-            overflow: hidden;
-        }
-        
-        .metric-card {
-            background: white;
-            padding: 1.8rem;
-            border-radius: 20px;
-            box-shadow: 0 8px 20px rgba(0,0,0,0.08);
-            text-align: center;
-            transition: all 0.3s ease;
-            border: 1px solid rgba(255, 75, 75, 0.1);
-        }
-        
-        .metric-card:hover {
-            transform: translateY(-5px);
-            box-shadow: 0 12px 30px rgba(0,0,0,0.12);
-            border-color: rgba(255, 75, 75, 0.3);
-        }
-        
-        .metric-icon {
-            font-size: 2.8em;
-            margin-bottom: 0.8rem;
-            color: #ff4b4b;
-            background: rgba(255, 75, 75, 0.1);
-            width: 70px;
-            height: 70px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            border-radius: 50%;
-            margin: 0 auto 1rem auto;
-        }
-        
-        .metric-value {
-            font-size: 2.2em;
-            font-weight: 700;
-            color: #2c3e50;
-            margin: 0.5rem 0;
-            background: linear-gradient(45deg, #ff4b4b, #ff8080);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-        }
-        
-        .metric-label {
-            color: #2c3e50;
-            font-size: 1.1em;
-            font-weight: 600;
-            margin-bottom: 0.5rem;
-            text-transform: uppercase;
-            letter-spacing: 0.5px;
-        }
-        
-        .metric-trend {
-            color: #2c3e50;
-            font-size: 0.9em;
-            padding: 0.3rem 0.8rem;
-            border-radius: 15px;
-            background: rgba(255, 75, 75, 0.1);
-            display: inline-block;
-        }
-        
-        .nav-link {
-            background: white !important;
-            border-radius: 15px !important;
-            margin: 0.3rem !important;
-            transition: all 0.3s ease !important;
-            border: 1px solid rgba(255, 75, 75, 0.1) !important;
-            padding: 0.8rem 1.5rem !important;
-        }
-        
-        .nav-link:hover {
-            transform: translateY(-2px) !important;
-            background: rgba(255, 75, 75, 0.05) !important;
-            border-color: rgba(255, 75, 75, 0.3) !important;
-        }
-        
-        .nav-link.active {
-            background: linear-gradient(135deg, #ff4b4b, #ff8080) !important;
-            color: white !important;
-            border: none !important;
-            box-shadow: 0 5px 15px rgba(255, 75, 75, 0.3) !important;
-        }
-        
-        /* Chart styling */
-        .js-plotly-plot {
-            border-radius: 20px;
-            box-shadow: 0 8px 20px rgba(0,0,0,0.08);
-            padding: 1rem;
-            background: white;
-            border: 1px solid rgba(255, 75, 75, 0.1);
-            margin-bottom: 2rem;
-        }
-        
-        /* Make all text inputs and labels consistent */
-        .stTextInput label, .stNumberInput label, .stSelectbox label {
-            color: #2c3e50 !important;
-            font-weight: 600;
-            font-size: 1rem;
-        }
-        
-        .stTextInput input, .stNumberInput input, .stSelectbox select {
-            border-radius: 10px;
-            border: 1px solid rgba(255, 75, 75, 0.2);
-            padding: 0.5rem 1rem;
-        }
-        
-        .stButton>button {
-            background: linear-gradient(135deg, #ff4b4b, #ff8080);
-            color: white;
-            border: none;
-            padding: 0.5rem 2rem;
-            border-radius: 10px;
-            font-weight: 600;
-            transition: all 0.3s ease;
-        }
-        
-        .stButton>button:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 5px 15px rgba(255, 75, 75, 0.3);
-        }
-        </style>
-    """, unsafe_allow_html=True)
+    resources.inject_css('app')
 
     # Header without Lottie Animation
     col1, col2, col3 = st.columns([1,2,1])
@@ -1017,25 +586,37 @@ def home():
         }
     )
 
+    # Keep expired units out of the available stock in the background
+    expiry_sweeper.start_sweeper()
+
     # Content based on selection
     if selected == "Home":
         # Show dashboard content
         create_dashboard_metrics()
+        expiring = expiry_sweeper.near_expiry()
+        if expiring:
+            total = sum(units for _, _, units, _ in expiring)
+            groups = ", ".join(sorted({blood_type for blood_type, _, _, _ in expiring}))
+            st.warning(f"{total} unit(s) of {groups} expire within {expiry_sweeper.WARN_DAYS} days.")
         col1, col2 = st.columns(2)
         with col1:
             st.plotly_chart(create_blood_group_distribution(), use_container_width=True)
         with col2:
             st.plotly_chart(create_age_distribution(), use_container_width=True)
     elif selected == "Donor Management":
-        handle_donor_management(Donor())
+        from donor import Donor
+        handle_donor_management(resources.session_service(Donor))
     elif selected == "Blood Bank":
-        handle_blood_bank_management(BloodBank())
+        from blood_bank import BloodBank
+        handle_blood_bank_management(resources.shared_service(BloodBank))
     elif selected == "Find Donors":
-        handle_nearby_donors(Donor())
+        from donor import Donor
+        handle_nearby_donors(resources.session_service(Donor))
     elif selected == "Eligibility":
         handle_eligibility_check()
     elif selected == "Blood Request":
         handle_blood_request()
+    return selected
 
 if __name__ == "__main__":
     home()
\ No newline at end of file
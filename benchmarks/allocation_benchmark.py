@@ -0,0 +1,70 @@
+"""
+Throughput benchmark for allocation.allocate
+
+Builds a scratch database with N pending requests and M available units and
+times one allocation run:
+
+    python benchmarks/allocation_benchmark.py --requests 100000 --units 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3 as sql
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+import allocation
+import compatibility
+
+def build(path, n_requests, n_units, seed=42):
+    rng = random.Random(seed)
+    today = date.today()
+    conn = sql.connect(path)
+    for pragma, value in db.PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value};")
+    db.migrate(conn)
+
+    groups = compatibility.BLOOD_GROUPS
+    with conn:
+        conn.executemany(
+            "INSERT INTO blood_units (blood_type, collection_date, expiry_date, status) VALUES (?, ?, ?, 'Available')",
+            ((rng.choice(groups), today.isoformat(), (today + timedelta(days=rng.randint(0, 42))).isoformat())
+             for _ in range(n_units))
+        )
+        conn.executemany(
+            """INSERT INTO blood_requests (patient_name, blood_group, units_required, urgency,
+               hospital_name, contact_number, request_date, required_by, status)
+               VALUES ('patient', ?, ?, ?, 'hospital', '0', ?, ?, 'Pending')""",
+            ((rng.choice(groups), rng.randint(1, 10), rng.choice(['Critical', 'Urgent', 'Normal']),
+              (today - timedelta(days=rng.randint(0, 30))).isoformat(),
+              (today + timedelta(days=rng.randint(0, 14))).isoformat())
+             for _ in range(n_requests))
+        )
+    return conn
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100_000)
+    parser.add_argument('--units', type=int, default=1_000_000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        conn = build(os.path.join(tmp, 'allocation.db'), args.requests, args.units)
+        print(f"built {args.requests} requests / {args.units} units in {time.perf_counter() - started:.1f} s")
+
+        stats = allocation.allocate(conn, batch_size=args.batch_size)
+        handled = stats['approved'] + stats['unfilled'] + stats['conflicts']
+        print(f"allocated in {stats['elapsed_s']:.2f} s: {stats['approved']} approved, "
+              f"{stats['unfilled']} unfilled, {stats['units_reserved']} units reserved "
+              f"({handled / stats['elapsed_s']:,.0f} requests/s)")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Throughput of bulk_import for donors and blood units
+
+Builds a scratch database already holding --existing donors, writes CSV
+files of --rows donors and --rows blood units (one row in --invalid-every
+broken on purpose), imports each with bulk_import.import_file and reports
+rows per second, then does the same import with one INSERT per row and the
+triggers left in place, the way rows were added before:
+
+    python benchmarks/bulk_import_benchmark.py --rows 200000 --existing 1000000
+
+The target is 100k rows/s, and it is not met. On one core (Python 3.11,
+SQLite 3.40, pandas 3.0), 200k rows with 1% rejected:
+
+    --existing 100000:   donors 26.9k rows/s (12.2k row by row),
+                         blood_units 63.1k rows/s (43.6k row by row)
+    --existing 1000000:  donors 20.4k rows/s (11.7k row by row),
+                         blood_units 40.0k rows/s (50.3k row by row)
+
+The executemany into the indexed table alone runs at about 50k (donors) and
+73k (blood_units) rows/s. Reading and validating the file come on top of that.
+The row-by-row figures do not include reading or validating anything.
+"""
+import argparse
+import csv
+import os
+import random
+import sqlite3 as sql
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+import compatibility
+import bulk_import
+
+CITIES = ['Boston', 'Cambridge', 'Somerville', 'Brookline', 'Quincy', 'Newton']
+STREETS = ['Main St', 'Beacon St', 'Harvard Ave', 'Elm St', 'Washington St', 'Park Dr']
+
+def donor_row(rng, n, pin_codes):
+    born = date(1960, 1, 1) + timedelta(days=rng.randrange(16000))
+    return {
+        'id': f'V{n:010d}', 'name': f'donor{rng.randrange(100000)} {rng.choice(["smith", "jones", "patel"])}',
+        'gender': rng.choice(['Female', 'Male']), 'date_of_birth': born.isoformat(),
+        'blood_group': rng.choice(compatibility.BLOOD_GROUPS), 'contact_number_1': f'555{n % 10000000:07d}',
+        'address': f'{rng.randrange(1, 999)} {rng.choice(STREETS)}', 'city': rng.choice(CITIES), 'state': 'MA',
+        'pin_code': rng.choice(pin_codes),
+    }
+
+def unit_row(rng):
+    collected = date.today() - timedelta(days=rng.randrange(42))
+    return {
+        'blood_type': rng.choice(compatibility.BLOOD_GROUPS), 'collection_date': collected.isoformat(),
+        'status': 'Available', 'storage_location': f'Fridge {rng.randrange(1, 20)}',
+    }
+
+def write_csv(path, rows, invalid_every, field):
+    rows = list(rows)
+    for row in rows[::invalid_every]:
+        row[field] = 'not valid'
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+def build(path, existing, pin_codes):
+    conn = sql.connect(path)
+    for pragma, value in db.PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value};")
+    db.migrate(conn)
+    rng = random.Random(1)
+    today = date.today().strftime('%d-%m-%Y')
+    with conn:
+        conn.executemany(
+            "INSERT INTO donor_record (id, name, age, gender, date_of_birth, blood_group, contact_number_1, "
+            "verification_id, address, city, state, pin_code, date_of_registration, time_of_registration) "
+            "VALUES (:id, :name, 30, :gender, :date_of_birth, :blood_group, :contact_number_1, :verification_id, "
+            ":address, :city, :state, :pin_code, :today, '00:00:00')",
+            ({**donor_row(rng, n, pin_codes), 'id': f'E{n:010d}', 'verification_id': f'E-{n}', 'today': today}
+             for n in range(existing)))
+    conn.close()
+
+def row_by_row(path, kind, rows):
+    # one INSERT per valid row with every trigger firing, committed once
+    table = bulk_import.IMPORTS[kind][0]
+    conn = sql.connect(path)
+    for pragma, value in db.PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value};")
+    columns = [column for column in rows[0] if column != 'date_of_birth'] if kind == 'donors' else list(rows[0])
+    extra = ", age, date_of_birth, verification_id, date_of_registration, time_of_registration" \
+        if kind == 'donors' else ", expiry_date"
+    query = (f"INSERT INTO {table} ({', '.join(columns)}{extra}) VALUES "
+             f"({', '.join('?' * len(columns))}{', 30, ?, ?, ?, ?' if kind == 'donors' else ', ?'})")
+    started = time.perf_counter()
+    with conn:
+        for n, row in enumerate(rows):
+            if 'not valid' in row.values():
+                continue
+            values = [row[column] for column in columns]
+            if kind == 'donors':
+                values += [row['date_of_birth'], f'R-{n}', '01-01-2000', '00:00:00']
+            else:
+                values.append(row['collection_date'])
+            conn.execute(query, values)
+    conn.close()
+    return len(rows) / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000, help="rows in each imported file")
+    parser.add_argument('--existing', type=int, default=100000, help="donors in the database beforehand")
+    parser.add_argument('--invalid-every', type=int, default=100, help="every Nth row is rejected")
+    parser.add_argument('--chunk-rows', type=int, default=bulk_import.CHUNK_ROWS)
+    args = parser.parse_args()
+
+    with open(db.POSTAL_CODES_FILE, newline='') as f:
+        pin_codes = [row['pin_code'] for row in csv.DictReader(f)]
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        files = {
+            'donors': write_csv(os.path.join(tmp, 'donors.csv'),
+                                (donor_row(rng, n, pin_codes) for n in range(args.rows)),
+                                args.invalid_every, 'blood_group'),
+            'blood_units': write_csv(os.path.join(tmp, 'blood_units.csv'),
+                                     (unit_row(rng) for _ in range(args.rows)),
+                                     args.invalid_every, 'collection_date'),
+        }
+        for kind, rows in files.items():
+            for method in ('bulk_import', 'row by row'):
+                path = os.path.join(tmp, f'{kind}-{method.replace(" ", "_")}.db')
+                build(path, args.existing, pin_codes)
+                if method == 'bulk_import':
+                    stats = bulk_import.import_file(kind, os.path.join(tmp, f'{kind}.csv'),
+                                                    os.path.join(tmp, f'{kind}.errors.csv'),
+                                                    chunk_rows=args.chunk_rows, database=path)
+                    rate = stats['rows_per_second']
+                    detail = f"{stats['imported']} imported, {stats['rejected']} rejected"
+                else:
+                    rate = row_by_row(path, kind, rows)
+                    detail = ''
+                print(f"{kind:>12} {method:>12}: {rate:9.0f} rows/s  {detail}")
+
+if __name__ == "__main__":
+    main()
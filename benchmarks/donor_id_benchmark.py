@@ -0,0 +1,99 @@
+"""
+Insert locality and uniqueness of donor IDs: old P-ddmmyy-xxxxxx against ULIDs
+
+Inserts --rows donors, keyed like donor_record (an integer rowid and a
+UNIQUE TEXT verification_id), into a scratch database with the app's
+pragmas, once with randomly placed legacy-style IDs and once with
+donor_ids ULIDs. For each it reports the insert rate (making the IDs is
+not timed) per --window rows, then the size and fill of the verification_id
+index:
+
+    python benchmarks/donor_id_benchmark.py --rows 10000000
+
+It also calls the old generator and the new one --collision-calls times in
+a tight loop and counts repeated IDs.
+"""
+import argparse
+import os
+import random
+import sqlite3 as sql
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+import donor_ids
+
+# the six random digits of an old ID only allow a million IDs a day, so the
+# stand-in keeps the old shape and random placement with enough digits for --rows
+def legacy_ids(count, rng):
+    day = datetime.now().strftime('%d%m%y')
+    return [f'P-{day}-{rng.getrandbits(63):019d}' for _ in range(count)]
+
+def old_generate_donor_id():
+    # donor.generate_donor_id before donor_ids
+    return f"P-{datetime.now().strftime('%d%m%y')}-{str(hash(datetime.now()))[-6:]}"
+
+def index_stats(conn):
+    # dbstat lists every page of the index; unused bytes show how full the pages are
+    name = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'donors'").fetchone()[0]
+    pages, used, size = conn.execute(
+        "SELECT COUNT(*), SUM(pgsize - unused), SUM(pgsize) FROM dbstat WHERE name = ?", (name,)).fetchone()
+    return pages, used / size
+
+def run(path, make_ids, rows, window, batch):
+    conn = sql.connect(path, isolation_level=None)
+    for pragma, value in db.PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value};")
+    conn.execute("CREATE TABLE donors (id INTEGER PRIMARY KEY, verification_id TEXT NOT NULL UNIQUE)")
+    # only inserting is timed, not making the IDs
+    rates, window_seconds, total_seconds = [], 0.0, 0.0
+    for done in range(0, rows, batch):
+        ids = [(donor_id,) for donor_id in make_ids(min(batch, rows - done))]
+        started = time.perf_counter()
+        conn.execute("BEGIN;")
+        conn.executemany("INSERT INTO donors (verification_id) VALUES (?)", ids)
+        conn.execute("COMMIT;")
+        window_seconds += time.perf_counter() - started
+        if (done + len(ids)) % window == 0:
+            rates.append(window / window_seconds)
+            total_seconds += window_seconds
+            window_seconds = 0.0
+    total = rows / (total_seconds + window_seconds)
+    pages, fill = index_stats(conn)
+    conn.close()
+    return total, rates, pages, fill, os.path.getsize(path)
+
+def collisions(generate, calls):
+    return calls - len({generate() for _ in range(calls)})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000000, help="donors inserted per run")
+    parser.add_argument('--window', type=int, default=1000000, help="rows per reported insert rate")
+    parser.add_argument('--batch', type=int, default=100000, help="rows per transaction")
+    parser.add_argument('--collision-calls', type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    generators = {
+        'legacy P- IDs': lambda count: legacy_ids(count, rng),
+        'ULID': donor_ids.new_donor_ids,
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for n, (name, make_ids) in enumerate(generators.items()):
+            total, rates, pages, fill, size = run(os.path.join(tmp, f'donor_ids_{n}.db'), make_ids,
+                                                  args.rows, args.window, args.batch)
+            print(f"{name:>14}: {total:8.0f} rows/s overall; per {args.window} rows: "
+                  f"{' '.join(f'{rate:.0f}' for rate in rates)}")
+            print(f"{'':>14}  verification_id index {pages} pages, {fill:.0%} full; database {size / 2 ** 20:.0f} MB")
+
+    print(f"repeated IDs in {args.collision_calls} back-to-back calls: "
+          f"old generator {collisions(old_generate_donor_id, args.collision_calls)}, "
+          f"ULID {collisions(donor_ids.new_donor_id, args.collision_calls)}")
+
+if __name__ == "__main__":
+    main()
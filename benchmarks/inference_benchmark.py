@@ -0,0 +1,71 @@
+"""
+Cold-start and per-call latency of the sklearn pipeline vs the NumPy scorer
+
+Publishes a pipeline and its exported scorer into a scratch directory, then
+times a fresh interpreter importing and loading each one, and the latency of
+scoring a single donor with each:
+
+    python benchmarks/inference_benchmark.py --calls 10000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import joblib
+import numpy as np
+
+import donation_model
+import numpy_scorer
+
+# what each serving path has to import and load before its first prediction
+COLD_START = {
+    'sklearn pipeline': "import joblib; joblib.load({pipeline!r})",
+    'numpy scorer': "import numpy_scorer; numpy_scorer.LogisticScorer.load({scorer!r})",
+}
+
+def cold_start(statement, repeat):
+    # best of several fresh interpreters, so the OS file cache is warm for both
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], cwd=ROOT, check=True)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def latency(predict_proba, row, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        predict_proba(row)
+    return (time.perf_counter() - started) / calls
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # every artifact goes to the scratch directory, never over the published model
+        paths = {'pipeline': os.path.join(tmp, 'pipeline.joblib'), 'scorer': os.path.join(tmp, 'scorer.npz')}
+        donation_model.publish_serving_model(donation_model.DATA_PATH, paths['pipeline'], paths['scorer'],
+                                             os.path.join(tmp, 'lookup.npy'))
+
+        baseline = cold_start("pass", args.repeat)
+        for name, statement in COLD_START.items():
+            elapsed = cold_start(statement.format(**paths), args.repeat)
+            print(f"{name:>16}: import + load {(elapsed - baseline) * 1000:7.1f} ms")
+
+        pipeline = joblib.load(paths['pipeline'])
+        scorer = numpy_scorer.LogisticScorer.load(paths['scorer'])
+        row = np.array([[2, 5, 1250, 24]], dtype=np.float64)
+        for name, model in (('sklearn pipeline', pipeline), ('numpy scorer', scorer)):
+            print(f"{name:>16}: {latency(model.predict_proba, row, args.calls) * 1e6:7.1f} us per call")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Throughput benchmark for scoring.score_donors
+
+Builds a scratch database with N donors and their donation history, publishes
+a pipeline next to it, then times a full scoring run and an incremental rerun
+after a small share of donors donated again:
+
+    python benchmarks/scoring_benchmark.py --donors 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3 as sql
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+import compatibility
+import donation_model
+import model_registry
+import scoring
+
+def build(path, n_donors, seed=42):
+    rng = random.Random(seed)
+    today = date.today()
+    conn = sql.connect(path)
+    for pragma, value in db.PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value};")
+    db.migrate(conn)
+
+    groups = compatibility.BLOOD_GROUPS
+    with conn:
+        conn.executemany(
+            """INSERT INTO donor_record (id, name, age, gender, date_of_birth, blood_group, contact_number_1,
+               verification_id, address, city, state, pin_code, date_of_registration, time_of_registration)
+               VALUES (?, 'donor', 30, 'F', '01-01-1995', ?, '0', ?, 'street', 'Boston', 'MA', '02108', ?, '12:00:00')""",
+            ((f'D{i:08d}', rng.choice(groups), f'V{i:08d}',
+              (today - timedelta(days=rng.randint(0, 3000))).strftime('%d-%m-%Y'))
+             for i in range(n_donors))
+        )
+        conn.executemany(
+            "INSERT INTO blood_units (donor_id, blood_type, collection_date, expiry_date, status) "
+            "VALUES (?, 'O+', ?, ?, 'Used')",
+            ((f'D{rng.randrange(n_donors):08d}', day.isoformat(), (day + timedelta(days=42)).isoformat())
+             for day in (today - timedelta(days=rng.randint(0, 3000)) for _ in range(n_donors * 2)))
+        )
+        conn.execute("DELETE FROM donor_score_queue")
+    return conn
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--donors', type=int, default=1_000_000)
+    parser.add_argument('--changed', type=float, default=0.01, help="share of donors rescored incrementally")
+    parser.add_argument('--chunk-size', type=int, default=scoring.CHUNK_SIZE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # every artifact goes to the scratch directory, never over the published model
+        scorer_path, table_path = os.path.join(tmp, 'scorer.npz'), os.path.join(tmp, 'lookup.npy')
+        donation_model.publish_serving_model(donation_model.DATA_PATH, os.path.join(tmp, 'pipeline.joblib'),
+                                             scorer_path, table_path)
+        model = model_registry.ModelRegistry(scorer_path, table_path).get()
+
+        started = time.perf_counter()
+        conn = build(os.path.join(tmp, 'scoring.db'), args.donors)
+        print(f"built {args.donors} donors in {time.perf_counter() - started:.1f} s")
+
+        stats = scoring.score_donors(conn, chunk_size=args.chunk_size, model=model)
+        print(f"full run: {stats['scored']} donors in {stats['elapsed_s']:.2f} s "
+              f"({stats['scored'] / stats['elapsed_s']:,.0f} donors/s)")
+
+        changed = int(args.donors * args.changed)
+        today = date.today().isoformat()
+        with conn:
+            conn.executemany(
+                "INSERT INTO blood_units (donor_id, blood_type, collection_date, expiry_date, status) "
+                "VALUES (?, 'O+', ?, ?, 'Available')",
+                ((f'D{i:08d}', today, today) for i in random.sample(range(args.donors), changed))
+            )
+        stats = scoring.score_donors(conn, incremental=True, chunk_size=args.chunk_size, model=model)
+        print(f"incremental run: {stats['scored']} of {changed} changed donors in {stats['elapsed_s']:.2f} s")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
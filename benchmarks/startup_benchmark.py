@@ -0,0 +1,68 @@
+"""
+Cold-start import cost of the Streamlit app, per page
+
+Runs a fresh interpreter with -X importtime for `import app` and, for each
+page in app.PAGE_MODULES, for `import app` plus that page's modules, and
+reports the import time each page adds on its first render:
+
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --json startup.json --budget-ms 1500
+
+With --budget-ms the exit status is 1 when any page exceeds the budget, so
+the benchmark can gate CI.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def import_time_ms(statement):
+    """Total self time (ms) of every module imported by a fresh interpreter running statement"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    # lines look like "import time:  self [us] | cumulative | imported package"
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and 'self [us]' not in line:
+            total_us += int(line.split(':', 1)[1].split('|')[0])
+    return total_us / 1000
+
+def best_of(statement, repeat):
+    return min(import_time_ms(statement) for _ in range(repeat))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--budget-ms', type=float, help="fail when a page's cold start exceeds this")
+    args = parser.parse_args()
+
+    # read PAGE_MODULES without importing the app into this process
+    page_modules = json.loads(subprocess.run(
+        [sys.executable, '-c', 'import app, json; print(json.dumps(app.PAGE_MODULES))'],
+        cwd=ROOT, capture_output=True, text=True, check=True).stdout)
+
+    base = best_of('import app', args.repeat)
+    results = {'app': base, 'pages': {}}
+    print(f"{'import app':>20}: {base:8.1f} ms")
+    for page, modules in page_modules.items():
+        total = best_of('import app; ' + '; '.join(f'import {module}' for module in modules), args.repeat)
+        results['pages'][page] = total
+        print(f"{page:>20}: {total:8.1f} ms (+{total - base:.1f} ms on first render)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.budget_ms is not None:
+        over = {page: ms for page, ms in results['pages'].items() if ms > args.budget_ms}
+        for page, ms in over.items():
+            print(f"{page} cold start {ms:.1f} ms exceeds the {args.budget_ms:.0f} ms budget")
+        sys.exit(1 if over else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Load test for write_queue.WriteQueue against per-submission commits
+
+Builds a scratch database, then has N threads submit blood requests and
+status updates (4 to 1) as fast as they can for a fixed time, first each on
+its own pooled connection with one commit per submission, then through one
+group-committing WriteQueue, and reports sustained writes per second,
+submit-to-commit latency and how many submissions failed:
+
+    python benchmarks/write_queue_benchmark.py --threads 32 --seconds 10
+"""
+import argparse
+import os
+import random
+import sqlite3 as sql
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+import compatibility
+import write_queue
+
+INSERT_REQUEST_SQL = """
+    INSERT INTO blood_requests (patient_name, blood_group, units_required, urgency,
+                                hospital_name, contact_number, request_date, required_by, status)
+    VALUES ('patient', ?, ?, ?, 'hospital', '0', ?, ?, 'Pending')
+"""
+UPDATE_STATUS_SQL = "UPDATE blood_requests SET status = ? WHERE request_id = ?"
+
+# requests in the scratch database before the load starts
+SEED_REQUESTS = 10000
+
+def build(path):
+    conn = sql.connect(path)
+    for pragma, value in db.PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value};")
+    db.migrate(conn)
+    with conn:
+        rng = random.Random(0)
+        conn.executemany(INSERT_REQUEST_SQL, (request_params(rng) for _ in range(SEED_REQUESTS)))
+    conn.close()
+
+def request_params(rng):
+    today = date.today()
+    return (rng.choice(compatibility.BLOOD_GROUPS), rng.randint(1, 4), rng.choice(['Normal', 'Urgent', 'Critical']),
+            today.isoformat(), (today + timedelta(days=rng.randint(0, 7))).isoformat())
+
+def random_write(rng):
+    if rng.random() < 0.8:
+        return INSERT_REQUEST_SQL, request_params(rng)
+    return UPDATE_STATUS_SQL, (rng.choice(['Approved', 'Completed', 'Cancelled']),
+                               rng.randint(1, SEED_REQUESTS))
+
+def run_load(submit, threads, seconds):
+    """Call submit(query, params) from threads threads for seconds; return writes, errors, latencies"""
+    deadline = time.monotonic() + seconds
+    results = []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        writes, errors, latencies = 0, 0, []
+        while time.monotonic() < deadline:
+            query, params = random_write(rng)
+            started = time.perf_counter()
+            try:
+                submit(query, params)
+                writes += 1
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+        results.append((writes, errors, latencies))
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    latencies = sorted(latency for _, _, thread_latencies in results for latency in thread_latencies)
+    return sum(r[0] for r in results), sum(r[1] for r in results), latencies
+
+def direct_submitter(path):
+    # what the pages did before: the thread's pooled connection, one commit per submission
+    pool = db.ConnectionPool(path)
+
+    def submit(query, params):
+        conn = pool.get()
+        try:
+            conn.execute(query, params)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return submit
+
+def report(name, writes, errors, latencies, seconds):
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else float('nan')
+    print(f"{name:>14}: {writes / seconds:9.0f} writes/s, {errors} failed, latency ms "
+          f"p50 {percentile(0.5):.2f} p95 {percentile(0.95):.2f} p99 {percentile(0.99):.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32, help="concurrent submitters")
+    parser.add_argument('--seconds', type=float, default=10.0, help="duration of each run")
+    parser.add_argument('--flush-interval', type=float, default=write_queue.FLUSH_INTERVAL)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'load.db')
+        build(path)
+        report('per-commit', *run_load(direct_submitter(path), args.threads, args.seconds), args.seconds)
+
+        writer = write_queue.WriteQueue(path, flush_interval=args.flush_interval).start()
+        report('group commit', *run_load(writer.execute, args.threads, args.seconds), args.seconds)
+        writer.stop()
+        info = writer.info()
+        print(f"{'':>14}  {info['batches']} group commits, {info['writes_per_batch']:.1f} writes each, "
+              f"largest {info['largest_batch']}, {info['busy_retries']} busy retries")
+
+if __name__ == "__main__":
+    main()
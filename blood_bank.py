@@ -1,6 +1,9 @@
 import streamlit as st
 import pandas as pd
+import bulk_import
 import database as db
+import pagination
+import search
 from datetime import datetime
 
 class BloodBank:
@@ -30,17 +33,16 @@ class BloodBank:
                 st.error(f"Error adding blood bank: {str(e)}")
 
     def view_blood_banks(self):
+        city = st.text_input("Filter by City", key="bank_list_city")
         try:
-            results = db.execute_query("""
-                SELECT bank_name, address, city, contact_number, email, license_number 
-                FROM blood_banks
-                ORDER BY bank_name
-            """, fetch=True)
+            page = pagination.current_page('blood_banks', 'bank_list', filters={'city': city.strip()},
+                                           cached=True)
             
-            if results:
-                df = pd.DataFrame(results, 
-                    columns=['Bank Name', 'Address', 'City', 'Contact', 'Email', 'License Number'])
+            if page['rows']:
+                df = pd.DataFrame(page['rows'])
+                df.columns = ['Bank Name', 'Address', 'City', 'Contact', 'Email', 'License Number']
                 st.dataframe(df, hide_index=True)
+                pagination.page_controls('bank_list', page)
             else:
                 st.info("No blood banks registered yet.")
                 
@@ -50,13 +52,17 @@ class BloodBank:
     def update_blood_bank(self):
         st.subheader("Update Blood Bank")
         
-        # First, let user select which bank to update
-        banks = db.execute_query("SELECT bank_name FROM blood_banks", fetch=True)
+        # First, let user find the bank to update
+        text = st.text_input("Search blood banks by name, address or city")
+        if not text:
+            st.info("Search for the blood bank to update")
+            return
+        banks = search.search('blood_banks', text)
         if not banks:
-            st.info("No blood banks to update")
+            st.info("No blood bank matches your search")
             return
             
-        bank_names = [bank[0] for bank in banks]
+        bank_names = list(dict.fromkeys(bank['bank_name'] for bank in banks))
         selected_bank = st.selectbox("Select Blood Bank to Update", bank_names)
         
         if selected_bank:
@@ -71,19 +77,25 @@ class BloodBank:
             
             if st.button("Update Blood Bank"):
                 try:
-                    db.execute_query("""
-                        UPDATE blood_banks 
-                        SET contact_number=?, email=?, address=?, city=?
-                        WHERE bank_name=?
-                    """, (contact_number, email, address, city, selected_bank))
+                    db.execute_query(db.UPDATE_BLOOD_BANK_QUERY,
+                        (contact_number, email, address, city, selected_bank))
                     st.success("Blood bank updated successfully!")
                 except Exception as e:
                     st.error(f"Error updating blood bank: {str(e)}")
 
+    def import_blood_units(self):
+        st.subheader("Import Blood Units")
+        banks = db.execute_query("SELECT bank_id, bank_name FROM blood_banks ORDER BY bank_name", fetch=True)
+        bank_names = {bank_id: bank_name for bank_id, bank_name in banks}
+        # without a bank chosen here, each row's own bank_id column is used
+        bank_id = st.selectbox("Blood bank the units belong to", [None, *bank_names],
+                               format_func=lambda bank_id: bank_names.get(bank_id, "Given per row in the file"))
+        bulk_import.render_import('blood_units', bank_id)
+
 def handle_blood_bank_management(p):
     bank_option = st.selectbox(
         'Select Operation',
-        ['Add Blood Bank', 'View Blood Banks', 'Update Blood Bank']
+        ['Add Blood Bank', 'View Blood Banks', 'Update Blood Bank', 'Import Blood Units']
     )
     
     if bank_option == 'Add Blood Bank':
@@ -91,4 +103,6 @@ def handle_blood_bank_management(p):
     elif bank_option == 'View Blood Banks':
         p.view_blood_banks()
     elif bank_option == 'Update Blood Bank':
-        p.update_blood_bank() 
\ No newline at end of file
+        p.update_blood_bank()
+    elif bank_option == 'Import Blood Units':
+        p.import_blood_units() 
\ No newline at end of file
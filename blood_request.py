@@ -1,22 +1,19 @@
 import streamlit as st
-import sqlite3 as sql
 import pandas as pd
+import database as db
+import pagination
+import resources
+import search
+import write_queue
 from datetime import datetime
 
 class BloodRequest:
-    def __init__(self):
-        self.conn = sql.connect('database_1A.db')
-        
+    # stateless: connections come from the pool on each call, so one instance
+    # serves every session (see resources.shared_service)
+
     def add_request(self):
         # Add CSS for number input label at the start of the method
-        st.markdown("""
-            <style>
-            /* Make number input label black */
-            .stNumberInput label {
-                color: #000000 !important;
-            }
-            </style>
-        """, unsafe_allow_html=True)
+        resources.inject_css('request_form')
         
         st.subheader("Submit New Blood Request")
         
@@ -43,8 +40,7 @@ class BloodRequest:
         if st.button("Submit Request", type="primary"):
             if patient_name and contact_number and hospital_name:
                 try:
-                    cursor = self.conn.cursor()
-                    cursor.execute('''
+                    write_queue.execute_write('''
                         INSERT INTO blood_requests 
                         (patient_name, blood_group, units_required, urgency,
                          hospital_name, contact_number, request_date, required_by, status)
@@ -52,7 +48,6 @@ class BloodRequest:
                     ''', (patient_name, blood_group, units_required, urgency,
                           hospital_name, contact_number, datetime.now().date(), 
                           required_by, 'Pending'))
-                    self.conn.commit()
                     st.success("Blood request submitted successfully!")
                     st.experimental_rerun()
                 except Exception as e:
@@ -63,35 +58,25 @@ class BloodRequest:
     def view_requests(self):
         st.subheader("View Blood Requests")
         
-        # Filter options
-        status_filter = st.selectbox(
-            "Filter by Status",
-            ['All', 'Pending', 'Approved', 'Completed', 'Cancelled']
-        )
+        # Filter and sort options
+        col1, col2 = st.columns(2)
+        with col1:
+            status_filter = st.selectbox(
+                "Filter by Status",
+                ['All', 'Pending', 'Approved', 'Completed', 'Cancelled']
+            )
+        with col2:
+            sort = st.selectbox("Sort by", ['newest', 'oldest'], format_func=str.title)
         
         try:
-            query = """
-                SELECT 
-                    request_id,
-                    patient_name,
-                    blood_group,
-                    units_required,
-                    urgency,
-                    hospital_name,
-                    contact_number,
-                    request_date,
-                    required_by,
-                    status
-                FROM blood_requests
-            """
-            if status_filter != 'All':
-                query += f" WHERE status = '{status_filter}'"
-            query += " ORDER BY request_date DESC"
-            
-            df = pd.read_sql_query(query, self.conn)
+            page = pagination.current_page(
+                'blood_requests', 'request_list', sort,
+                {'status': None if status_filter == 'All' else status_filter}
+            )
             
-            if not df.empty:
-                st.dataframe(df)
+            if page['rows']:
+                st.dataframe(pd.DataFrame(page['rows']))
+                pagination.page_controls('request_list', page)
             else:
                 st.info("No blood requests found.")
                 
@@ -102,41 +87,38 @@ class BloodRequest:
         st.subheader("Update Request Status")
         
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                SELECT request_id, patient_name, blood_group, status, hospital_name 
-                FROM blood_requests
-            """)
-            requests = cursor.fetchall()
+            # the newest requests until a patient or hospital is searched for
+            text = st.text_input("Search by patient or hospital name")
+            if text:
+                requests = search.search('blood_requests', text)
+            else:
+                requests = db.fetch_page('blood_requests', 'newest', page_size=search.RESULT_LIMIT)['rows']
             
             if requests:
-                request_options = [
-                    f"ID: {r[0]} - {r[1]} ({r[2]}) - {r[4]} - Current Status: {r[3]}" 
+                request_options = {
+                    r['request_id']: f"ID: {r['request_id']} - {r['patient_name']} ({r['blood_group']}) - "
+                                     f"{r['hospital_name']} - Current Status: {r['status']}"
                     for r in requests
-                ]
-                selected_request = st.selectbox("Select Request to Update", request_options)
+                }
+                request_id = st.selectbox("Select Request to Update", list(request_options),
+                                          format_func=request_options.get)
                 
-                if selected_request:
-                    request_id = int(selected_request.split('-')[0].replace('ID:', '').strip())
+                if request_id is not None:
                     new_status = st.selectbox(
                         "New Status",
                         ['Pending', 'Approved', 'Completed', 'Cancelled']
                     )
                     
                     if st.button("Update Status"):
-                        cursor.execute('''
+                        write_queue.execute_write('''
                             UPDATE blood_requests 
                             SET status = ? 
                             WHERE request_id = ?
                         ''', (new_status, request_id))
-                        self.conn.commit()
                         st.success("Status updated successfully!")
                         st.experimental_rerun()
             else:
-                st.info("No requests available to update.")
+                st.info("No matching requests to update." if text else "No requests available to update.")
                 
         except Exception as e:
             st.error(f"Error updating status: {e}")
-
-    def __del__(self):
-        self.conn.close() 
\ No newline at end of file
@@ -0,0 +1,331 @@
+import io
+import itertools
+import os
+import sqlite3 as sql
+import time
+from datetime import date, datetime
+import pandas as pd
+import compatibility
+import database as db
+import donor_ids
+
+# Bulk import of donors and blood units from CSV or Excel files.
+#
+# The file is read CHUNK_ROWS rows at a time and each chunk is validated with
+# column-wise pandas operations (blood group, dates, PIN code, duplicate
+# IDs within the file and against the database), then inserted with one
+# executemany in its own transaction. The row-by-row insert triggers of the
+# table (search index, coordinates, stock counters) are dropped for that
+# transaction and their work is done once for the whole chunk instead (see
+# database.bulk_insert); no other connection ever sees the table
+# without them. Rejected rows are skipped and written to an error file with
+# their row number in the source file and the reason.
+#
+#     python bulk_import.py donors partner_donors.csv
+#     python bulk_import.py blood_units stock.xlsx --bank-id 3 --errors rejected.csv
+
+CHUNK_ROWS = 50000
+
+# page cache of the import connection (KiB); index inserts into a large table
+# are mostly cache misses with the default 16 MB
+IMPORT_CACHE_KIB = 256 * 1024
+
+# ISO dates, and the app's own day-month-year format
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y')
+# 5-digit ZIP or 6-digit PIN codes
+PIN_CODE_PATTERN = r'\d{5,6}'
+
+# statuses a unit may be imported in; reserving units is left to allocation
+UNIT_STATUSES = ('Available', 'Expired')
+# red cells keep for 42 days after collection
+UNIT_SHELF_LIFE_DAYS = 42
+
+DONOR_REQUIRED = ('id', 'name', 'gender', 'date_of_birth', 'blood_group', 'contact_number_1',
+                  'address', 'city', 'state', 'pin_code')
+DONOR_OPTIONAL = ('verification_id',)
+DONOR_INSERT_COLUMNS = ('id', 'name', 'age', 'gender', 'date_of_birth', 'blood_group', 'contact_number_1',
+                        'verification_id', 'address', 'city', 'state', 'pin_code',
+                        'date_of_registration', 'time_of_registration', 'latitude', 'longitude')
+
+UNIT_REQUIRED = ('blood_type', 'collection_date')
+UNIT_OPTIONAL = ('expiry_date', 'status', 'donor_id', 'bank_id', 'storage_location', 'notes')
+UNIT_INSERT_COLUMNS = ('donor_id', 'blood_type', 'collection_date', 'expiry_date', 'status',
+                       'storage_location', 'notes', 'bank_id')
+
+def read_chunks(file, chunk_rows=CHUNK_ROWS):
+    """
+    DataFrames of at most chunk_rows rows from a CSV or .xlsx file (a path or
+    an uploaded file), every cell as text and indexed by data row from 0
+    """
+    name = str(getattr(file, 'name', file)).lower()
+    if name.endswith('.xlsx'):
+        yield from _excel_chunks(file, chunk_rows)
+    elif name.endswith('.xls'):
+        raise ValueError("old .xls workbooks are not supported, save the sheet as .xlsx or CSV")
+    else:
+        yield from pd.read_csv(file, dtype=str, keep_default_na=False, chunksize=chunk_rows,
+                               encoding='utf-8-sig')
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _excel_chunks(file, chunk_rows):
+    # openpyxl is what pandas reads .xlsx with; read-only mode streams the sheet
+    # instead of loading it whole, which pandas.read_excel cannot do
+    import openpyxl
+
+    book = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = book.active.iter_rows(values_only=True)
+        header = [_cell_text(cell) for cell in next(rows, ())]
+        start = 0
+        while True:
+            # short rows (trailing empty cells) are padded to the header
+            chunk = [[_cell_text(cell) for cell in row[:len(header)]] + [''] * (len(header) - len(row))
+                     for row in itertools.islice(rows, chunk_rows)]
+            if not chunk:
+                break
+            yield pd.DataFrame(chunk, columns=header, index=range(start, start + len(chunk)))
+            start += len(chunk)
+    finally:
+        book.close()
+
+def parse_dates(values):
+    """Text in any of DATE_FORMATS as datetimes, NaT where none matches"""
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    for date_format in DATE_FORMATS:
+        parsed = parsed.fillna(pd.to_datetime(values, format=date_format, errors='coerce'))
+    return parsed
+
+def _reject(errors, mask, reason):
+    # a row keeps the first reason it was rejected for
+    errors[mask & errors.isna()] = reason
+
+def _existing(conn, table, column, values):
+    """The values already present in table.column, looked up through its index in one query"""
+    query = f"SELECT {column} FROM {table} WHERE {column} IN (SELECT value FROM json_each(?))"
+    return {row[0] for row in conn.execute(query, (pd.Series(values).to_json(orient='values'),))}
+
+def _reject_duplicates(errors, conn, table, column, values):
+    # blank values are left to the caller; only the first of repeated values is kept
+    candidates = values.ne('') & errors.isna()
+    _reject(errors, candidates & values.where(candidates).duplicated(), f"duplicate {column} in file")
+    existing = _existing(conn, table, column, values[candidates].unique())
+    _reject(errors, candidates & values.isin(existing), f"{column} already exists")
+
+def prepare_donors(frame, conn, bank_id=None):
+    """Validated donor_record rows of a chunk (DONOR_INSERT_COLUMNS) and each row's rejection reason"""
+    errors = pd.Series(None, index=frame.index, dtype=object)
+    for column in DONOR_REQUIRED:
+        _reject(errors, frame[column].eq(''), f"{column} is empty")
+
+    blood_group = frame['blood_group'].str.upper().str.replace(' ', '', regex=False)
+    _reject(errors, ~blood_group.isin(compatibility.BLOOD_GROUPS), "unknown blood group")
+    dob = parse_dates(frame['date_of_birth'])
+    today = pd.Timestamp(date.today())
+    _reject(errors, dob.isna(), "date_of_birth is not a date")
+    _reject(errors, dob > today, "date_of_birth is in the future")
+    _reject(errors, ~frame['pin_code'].str.fullmatch(PIN_CODE_PATTERN), "PIN code must be 5 or 6 digits")
+    _reject_duplicates(errors, conn, 'donor_record', 'id', frame['id'])
+    _reject_duplicates(errors, conn, 'donor_record', 'verification_id', frame['verification_id'])
+
+    valid = errors.isna()
+    donors = frame.loc[valid, list(DONOR_REQUIRED + DONOR_OPTIONAL)].copy()
+    donors['blood_group'] = blood_group[valid]
+    dob = dob[valid]
+    birthday_to_come = dob.dt.month * 100 + dob.dt.day > today.month * 100 + today.day
+    donors['age'] = today.year - dob.dt.year - birthday_to_come.astype(int)
+    donors['date_of_birth'] = dob.dt.strftime('%d-%m-%Y')
+    generate = donors['verification_id'].eq('')
+    donors.loc[generate, 'verification_id'] = donor_ids.new_donor_ids(int(generate.sum()))
+    now = datetime.now()
+    donors['date_of_registration'] = now.strftime('%d-%m-%Y')
+    donors['time_of_registration'] = now.strftime('%H:%M:%S')
+    centroids = pd.read_sql("SELECT pin_code, latitude, longitude FROM postal_codes", conn, index_col='pin_code')
+    donors['latitude'] = donors['pin_code'].map(centroids['latitude'])
+    donors['longitude'] = donors['pin_code'].map(centroids['longitude'])
+    return donors[list(DONOR_INSERT_COLUMNS)], errors
+
+def prepare_blood_units(frame, conn, bank_id=None):
+    """Validated blood_units rows of a chunk (UNIT_INSERT_COLUMNS) and each row's rejection reason"""
+    errors = pd.Series(None, index=frame.index, dtype=object)
+    for column in UNIT_REQUIRED:
+        _reject(errors, frame[column].eq(''), f"{column} is empty")
+
+    blood_type = frame['blood_type'].str.upper().str.replace(' ', '', regex=False)
+    _reject(errors, ~blood_type.isin(compatibility.BLOOD_GROUPS), "unknown blood type")
+    collected = parse_dates(frame['collection_date'])
+    _reject(errors, collected.isna(), "collection_date is not a date")
+    _reject(errors, collected > pd.Timestamp(date.today()), "collection_date is in the future")
+    given_expiry = frame['expiry_date'].ne('')
+    expires = parse_dates(frame['expiry_date']).where(given_expiry, collected + pd.Timedelta(days=UNIT_SHELF_LIFE_DAYS))
+    _reject(errors, given_expiry & expires.isna(), "expiry_date is not a date")
+    _reject(errors, expires < collected, "expiry_date is before collection_date")
+    status = frame['status'].str.capitalize().replace('', UNIT_STATUSES[0])
+    _reject(errors, ~status.isin(UNIT_STATUSES), f"status must be one of {', '.join(UNIT_STATUSES)}")
+
+    # blood_units.donor_id is a foreign key to donor_record(id)
+    donor_id = frame['donor_id']
+    known_donors = {str(donor) for donor in _existing(conn, 'donor_record', 'id',
+                                                      donor_id[donor_id.ne('') & errors.isna()].unique())}
+    _reject(errors, donor_id.ne('') & ~donor_id.isin(known_donors), "unknown donor_id")
+    banks = pd.Series(str(bank_id), index=frame.index) if bank_id is not None else frame['bank_id']
+    numeric_bank = banks.str.fullmatch(r'\d+')
+    _reject(errors, banks.ne('') & ~numeric_bank, "bank_id is not a number")
+    known_banks = {str(bank) for bank in _existing(conn, 'blood_banks', 'bank_id',
+                                                   banks[numeric_bank].astype(int).unique())}
+    _reject(errors, numeric_bank & ~banks.isin(known_banks), "unknown bank_id")
+
+    valid = errors.isna()
+    units = frame.loc[valid, list(UNIT_INSERT_COLUMNS)].copy()
+    units['blood_type'] = blood_type[valid]
+    units['collection_date'] = collected[valid].dt.strftime('%Y-%m-%d')
+    units['expiry_date'] = expires[valid].dt.strftime('%Y-%m-%d')
+    units['status'] = status[valid]
+    units['bank_id'] = banks[valid]
+    # blank optional values are stored as NULL
+    for column in ('donor_id', 'storage_location', 'notes', 'bank_id'):
+        units[column] = units[column].mask(units[column].eq(''))
+    return units, errors
+
+# kind -> (table, required columns, optional columns, prepare function)
+IMPORTS = {
+    'donors': ('donor_record', DONOR_REQUIRED, DONOR_OPTIONAL, prepare_donors),
+    'blood_units': ('blood_units', UNIT_REQUIRED, UNIT_OPTIONAL, prepare_blood_units),
+}
+
+def _normalise(frame, kind):
+    """Chunk with snake_case column names, stripped cells and every optional column"""
+    _, required, optional, _ = IMPORTS[kind]
+    frame.columns = frame.columns.str.strip().str.lower().str.replace(r'[\s-]+', '_', regex=True)
+    missing = [column for column in required if column not in frame.columns]
+    if missing:
+        raise ValueError(f"the file has no {', '.join(missing)} column(s)")
+    for column in frame.columns:
+        frame[column] = frame[column].str.strip()
+    for column in optional:
+        if column not in frame.columns:
+            frame[column] = ''
+    return frame
+
+def _connect(database):
+    # autocommit mode: each chunk's BEGIN IMMEDIATE and COMMIT are issued here
+    conn = sql.connect(database or db.pool.database, isolation_level=None)
+    for pragma, value in db.PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value};")
+    conn.execute(f"PRAGMA cache_size = {-IMPORT_CACHE_KIB};")
+    db.migrate(conn)
+    return conn
+
+def _import_chunk(conn, kind, frame, bank_id):
+    table, _, _, prepare = IMPORTS[kind]
+    # validated under the write lock, so no other writer can add a duplicate
+    # between the checks and the insert
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        rows, errors = prepare(frame, conn, bank_id)
+        rows = rows.astype(object).where(rows.notna(), None)
+        db.bulk_insert(conn, table, rows.columns, rows.itertuples(index=False, name=None))
+        conn.execute("COMMIT;")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK;")
+        raise
+    return len(rows), errors
+
+def import_file(kind, file, errors=None, bank_id=None, chunk_rows=CHUNK_ROWS, database=None, progress=None):
+    """
+    Import every valid row of a CSV or .xlsx file of IMPORTS kind, one transaction per chunk
+
+    Rejected rows are written as CSV, with their row number in the file and
+    the reason, to errors (a path, opened only if a row is rejected, or a
+    text file). bank_id puts every blood unit in that bank. progress is
+    called with the number of rows read after each chunk.
+    Returns {'imported', 'rejected', 'seconds', 'rows_per_second'}.
+    """
+    table = IMPORTS[kind][0]
+    stats = {'imported': 0, 'rejected': 0}
+    error_file = None
+    header = True
+    started = time.perf_counter()
+    conn = _connect(database)
+    try:
+        for frame in read_chunks(file, chunk_rows):
+            frame = _normalise(frame, kind)
+            imported, reasons = _import_chunk(conn, kind, frame, bank_id)
+            rejected = reasons.notna()
+            if errors is not None and rejected.any():
+                if error_file is None:
+                    error_file = open(errors, 'w', newline='', encoding='utf-8') if isinstance(errors, str) else errors
+                rejected_rows = frame.loc[rejected].assign(error=reasons[rejected])
+                # data row 0 is line 2 of the file, after the header
+                rejected_rows.index = rejected_rows.index + 2
+                rejected_rows.to_csv(error_file, header=header, index_label='row')
+                header = False
+            stats['imported'] += imported
+            stats['rejected'] += int(rejected.sum())
+            if progress:
+                progress(stats['imported'] + stats['rejected'])
+    finally:
+        conn.close()
+        if error_file is not None and isinstance(errors, str):
+            error_file.close()
+        if stats['imported']:
+            db.notify_write(table)
+    stats['seconds'] = time.perf_counter() - started
+    stats['rows_per_second'] = (stats['imported'] + stats['rejected']) / stats['seconds']
+    return stats
+
+def render_import(kind, bank_id=None):
+    """Upload form that imports a file of IMPORTS kind and offers the rejected rows for download"""
+    import streamlit as st
+
+    _, required, optional, _ = IMPORTS[kind]
+    label = kind.replace('_', ' ')
+    file = st.file_uploader(f"CSV or Excel file of {label}", type=['csv', 'xlsx'], key=f'import_{kind}')
+    st.caption(f"Columns: {', '.join(required)}; optional: {', '.join(optional)}")
+    if file is None or not st.button('Import', key=f'import_{kind}_button'):
+        return
+    errors = io.StringIO()
+    status = st.empty()
+    try:
+        stats = import_file(kind, file, errors, bank_id=bank_id,
+                            progress=lambda rows: status.info(f"{rows} rows read..."))
+    except (ValueError, sql.Error) as e:
+        status.empty()
+        st.error(f"Import failed: {e}")
+        return
+    status.success(f"Imported {stats['imported']} {label} in {stats['seconds']:.1f} s")
+    if stats['rejected']:
+        st.warning(f"{stats['rejected']} rows were rejected")
+        st.download_button('Download rejected rows', errors.getvalue(), file_name=f'{kind}_rejected.csv',
+                           mime='text/csv')
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import donors or blood units from a CSV or Excel file")
+    parser.add_argument('kind', choices=list(IMPORTS))
+    parser.add_argument('file', help="CSV or .xlsx file with a header row")
+    parser.add_argument('--errors', help="where to write rejected rows (default: FILE.errors.csv)")
+    parser.add_argument('--bank-id', type=int, help="blood bank every imported unit belongs to")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help="rows per transaction")
+    parser.add_argument('--database', help="database file (default: the app's)")
+    args = parser.parse_args()
+
+    errors = args.errors or os.path.splitext(args.file)[0] + '.errors.csv'
+    try:
+        stats = import_file(args.kind, args.file, errors, args.bank_id, args.chunk_rows, args.database)
+    except (ValueError, sql.Error) as e:
+        print(f"import failed: {e}")
+        raise SystemExit(1)
+    print(f"imported {stats['imported']} {args.kind}, rejected {stats['rejected']} "
+          f"in {stats['seconds']:.1f} s ({stats['rows_per_second']:.0f} rows/s)")
+    if stats['rejected']:
+        print(f"rejected rows written to {errors}")
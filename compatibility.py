@@ -0,0 +1,65 @@
+# ABO/Rh compatibility.
+#
+# Each blood group is described by the antigens on its red cells (A, B, RhD).
+# Red cells can be given when the donor carries no antigen the recipient lacks;
+# plasma can be given when the donor's plasma has no antibody against the
+# recipient's ABO antigens (RhD does not matter for plasma). Both rules are
+# precomputed into 8x8 bitmask matrices: bit d of MATRIX[r] is set when donor
+# group d may give to recipient group r.
+
+BLOOD_GROUPS = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+
+RED_CELLS = 'red_cells'
+PLASMA = 'plasma'
+
+_A, _B, _RH = 1, 2, 4
+
+def _antigens(group):
+    abo, rh = group[:-1], group[-1]
+    return (_A if 'A' in abo else 0) | (_B if 'B' in abo else 0) | (_RH if rh == '+' else 0)
+
+_ANTIGENS = [_antigens(group) for group in BLOOD_GROUPS]
+_ABO = _A | _B
+
+def _build_matrix(can_give):
+    return [
+        sum(1 << d for d, donor in enumerate(_ANTIGENS) if can_give(donor, recipient))
+        for recipient in _ANTIGENS
+    ]
+
+# recipient index -> bitmask of donor indexes
+MATRIX = {
+    RED_CELLS: _build_matrix(lambda donor, recipient: donor & ~recipient == 0),
+    PLASMA: _build_matrix(lambda donor, recipient: recipient & _ABO & ~donor == 0),
+}
+
+def _mismatch(donor, recipient, component):
+    # how far a compatible donor is from an exact match: the antigens the
+    # recipient has that the donor's cells lack (or, for plasma, the extra ABO
+    # antigens the donor carries); universal donors score highest
+    if component == PLASMA:
+        return bin(donor & _ABO & ~recipient).count('1')
+    return bin(recipient & ~donor).count('1')
+
+def is_compatible(donor_group, recipient_group, component=RED_CELLS):
+    """Return True if donor_group can give the component to recipient_group"""
+    mask = MATRIX[component][BLOOD_GROUPS.index(recipient_group)]
+    return bool(mask >> BLOOD_GROUPS.index(donor_group) & 1)
+
+def compatible_groups(recipient_group, component=RED_CELLS):
+    """
+    Return the donor groups compatible with recipient_group, most preferred first
+
+    The exact group comes first and universal donors (O- for red cells, AB for
+    plasma) come last.
+    """
+    r = BLOOD_GROUPS.index(recipient_group)
+    mask = MATRIX[component][r]
+    candidates = [d for d in range(len(BLOOD_GROUPS)) if mask >> d & 1]
+    candidates.sort(key=lambda d: (d != r, _mismatch(_ANTIGENS[d], _ANTIGENS[r], component), d))
+    return [BLOOD_GROUPS[d] for d in candidates]
+
+def preference_sql(column, groups):
+    """Return an SQL expression ranking column by its position in groups (0 = most preferred)"""
+    cases = ' '.join(f"WHEN '{group}' THEN {rank}" for rank, group in enumerate(groups))
+    return f"CASE {column} {cases} ELSE {len(groups)} END"
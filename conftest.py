@@ -0,0 +1,19 @@
+# keeps the repository root on sys.path, so tests import the app modules directly
+import sqlite3 as sql
+import pytest
+import database as db
+
+@pytest.fixture
+def conn(tmp_path):
+    # a migrated scratch database with the app's pragmas
+    conn = sql.connect(tmp_path / 'test.db')
+    for pragma, value in db.PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value};")
+    db.migrate(conn)
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def triggers(conn):
+    # the schema's triggers, to check that a bulk write put every one back
+    return lambda: conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name").fetchall()
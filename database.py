@@ -1,33 +1,290 @@
+import base64
+import csv
+import json
+import os
+import re
 import sqlite3 as sql
-import config
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from datetime import datetime
+import compatibility
 
-# function to establish connection to the database, enable foreign key constraint support, and create cursor
+# all modules share this one database file
+DATABASE = 'database_1A.db'
+
+# offline PIN code -> centroid table loaded into postal_codes
+POSTAL_CODES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'postal_codes.csv')
+
+# PIN-code centroids are bucketed into square grid cells of this many degrees;
+# geo_cell = latitude row * GEO_CELLS_PER_ROW + longitude column
+GEO_CELL_DEGREES = 0.1
+GEO_CELLS_PER_ROW = round(360 / GEO_CELL_DEGREES)
+
+# adds (or replaces) one PIN-code centroid together with its grid cell
+INSERT_POSTAL_CODE_SQL = f"""
+    INSERT OR REPLACE INTO postal_codes (pin_code, latitude, longitude, place, geo_cell)
+    VALUES (
+        :pin_code, :latitude, :longitude, :place,
+        CAST((:latitude + 90) / {GEO_CELL_DEGREES} AS INTEGER) * {GEO_CELLS_PER_ROW}
+            + CAST((:longitude + 180) / {GEO_CELL_DEGREES} AS INTEGER)
+    )
+"""
+
+# copies the donors' PIN-code centroids onto their rows
+GEOCODE_DONOR_SQL = """
+    UPDATE donor_record SET (latitude, longitude) = (
+        SELECT latitude, longitude FROM postal_codes WHERE pin_code = TRIM(donor_record.pin_code)
+    )
+    WHERE {where}
+"""
+
+# recounts stock_levels from blood_units (see _m006_stock_levels)
+COUNT_STOCK_SQL = """
+    SELECT IFNULL(bank_id, 0), blood_type, status, COUNT(*)
+    FROM blood_units
+    GROUP BY IFNULL(bank_id, 0), blood_type, status
+"""
+REBUILD_STOCK_LEVELS_SQL = "INSERT INTO stock_levels " + COUNT_STOCK_SQL
+
+# full-text search index -> (table it indexes, indexed columns); see search.py.
+# The indexes point at rows by rowid, and VACUUM may renumber the rowids of
+# donor_record (it has no INTEGER PRIMARY KEY), so run
+# `python search.py rebuild` after a VACUUM.
+SEARCH_INDEXES = {
+    'donor_search': ('donor_record', ('name', 'address', 'city')),
+    'blood_bank_search': ('blood_banks', ('bank_name', 'address', 'city')),
+    'blood_request_search': ('blood_requests', ('patient_name', 'hospital_name')),
+}
+# case- and accent-insensitive words; the prefix indexes answer 2- and
+# 3-letter prefix queries without walking every longer term
+SEARCH_TOKENIZE = 'unicode61 remove_diacritics 2'
+SEARCH_PREFIXES = '2 3'
+
+# tables whose writes are counted in table_versions by triggers (see
+# _m013_table_versions), so a process can tell which tables others have
+# written; tables only written by triggers follow through TRIGGER_WRITES
+VERSIONED_TABLES = ('donor_record', 'donors', 'blood_units', 'blood_banks', 'blood_requests',
+                    'donor_scores', 'postal_codes', 'donor_id_aliases')
+
+BUMP_TABLE_VERSION_SQL = "UPDATE table_versions SET version = version + 1 WHERE name = '{table}'"
+
+# row-by-row insert triggers that bulk_insert (used by bulk_import.py) drops for
+# the length of its transaction, each with the statement that then does the
+# trigger's work at once for every row inserted after a given rowid
+BULK_INSERT_TRIGGERS = {
+    'donor_record': {
+        # the import looks coordinates up itself; this only catches rows it left empty
+        'donor_record_geocode_insert': GEOCODE_DONOR_SQL.format(where='rowid > ? AND latitude IS NULL'),
+        'donor_record_search_insert': """
+            INSERT INTO donor_search (rowid, name, address, city)
+            SELECT rowid, name, address, city FROM donor_record WHERE rowid > ?
+        """,
+        'donor_record_version_insert': BUMP_TABLE_VERSION_SQL.format(table='donor_record')
+            + " AND EXISTS (SELECT 1 FROM donor_record WHERE rowid > ?)",
+    },
+    'blood_units': {
+        'blood_units_stock_insert': """
+            INSERT INTO stock_levels
+            SELECT IFNULL(bank_id, 0), blood_type, status, COUNT(*)
+            FROM blood_units
+            WHERE rowid > ?
+            GROUP BY IFNULL(bank_id, 0), blood_type, status
+            ON CONFLICT (blood_type, status, bank_id) DO UPDATE SET units = units + excluded.units
+        """,
+        'blood_units_score_insert': """
+            INSERT OR REPLACE INTO donor_score_queue (donor_id)
+            SELECT DISTINCT donor_id FROM blood_units WHERE rowid > ? AND donor_id IS NOT NULL
+        """,
+        'blood_units_version_insert': BUMP_TABLE_VERSION_SQL.format(table='blood_units')
+            + " AND EXISTS (SELECT 1 FROM blood_units WHERE rowid > ?)",
+    },
+}
+
+RESERVE_UNIT_SQL = """
+    UPDATE blood_units SET status = 'Reserved', request_id = ?
+    WHERE unit_id = ? AND status = 'Available'
+"""
+
+# row-by-row update triggers that bulk_reserve_units (used by allocation.py)
+# drops for the length of its transaction, each with the statement that then
+# does the trigger's work at once for a JSON array of the reserved unit IDs
+BULK_RESERVE_TRIGGERS = {
+    'blood_units_stock_update': """
+        WITH moved AS MATERIALIZED (
+            SELECT IFNULL(bank_id, 0) AS bank_id, blood_type, COUNT(*) AS units
+            FROM blood_units
+            WHERE unit_id IN (SELECT value FROM json_each(?))
+            GROUP BY IFNULL(bank_id, 0), blood_type
+        )
+        INSERT INTO stock_levels
+        SELECT bank_id, blood_type, 'Reserved', units FROM moved WHERE true
+        UNION ALL
+        SELECT bank_id, blood_type, 'Available', -units FROM moved WHERE true
+        ON CONFLICT (blood_type, status, bank_id) DO UPDATE SET units = units + excluded.units
+    """,
+    'blood_units_version_update': BUMP_TABLE_VERSION_SQL.format(table='blood_units')
+        + " AND json_array_length(?) > 0",
+}
+
+# request feed order: Critical, then Urgent, then everything else
+URGENCY_RANK_SQL = "CASE urgency WHEN 'Critical' THEN 1 WHEN 'Urgent' THEN 2 ELSE 3 END"
+
+# pragmas applied to every pooled connection when it is opened
+PRAGMAS = {
+    'journal_mode': 'WAL',          # readers no longer block the writer
+    'synchronous': 'NORMAL',        # safe with WAL, avoids an fsync per commit
+    'foreign_keys': 'ON',
+    'cache_size': -16000,           # 16 MB page cache (negative means KiB)
+    'mmap_size': 268435456,         # 256 MB memory-mapped I/O
+    'busy_timeout': 5000,           # wait up to 5 s for a lock instead of failing
+    'temp_store': 'MEMORY',
+}
+
+# upper bound on the memory held by cached query results (see cached_query)
+QUERY_CACHE_BYTES = 16 * 1024 * 1024
+
+class ConnectionPool:
+    """
+    Hands out one reusable SQLite connection per thread
+
+    A thread keeps its connection for as long as it lives; when the thread
+    object is garbage collected the connection goes back to an idle list and
+    is reused by the next thread instead of being closed.
+    """
+
+    def __init__(self, database, pragmas=None, max_idle=8, health_check_interval=30.0):
+        self.database = database
+        self.pragmas = dict(PRAGMAS if pragmas is None else pragmas)
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self._local = threading.local()
+        self._idle = []
+        self._lock = threading.Lock()
+        self._migrate_lock = threading.Lock()
+        self._migrated = False
+        self.stats = {'opened': 0, 'reused': 0, 'health_checks': 0, 'reconnects': 0}
+
+    def _open(self):
+        conn = sql.connect(self.database, check_same_thread=False)
+        conn.row_factory = sql.Row
+        for pragma, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {pragma} = {value};")
+        with self._lock:
+            self.stats['opened'] += 1
+        # the schema is brought up to date once per process, on first use;
+        # threads opening connections meanwhile wait until it has succeeded
+        if not self._migrated:
+            with self._migrate_lock:
+                if not self._migrated:
+                    try:
+                        migrate(conn)
+                    except Exception:
+                        conn.close()
+                        raise
+                    self._migrated = True
+        return conn
+
+    def _release(self, conn):
+        # called when the owning thread is gone: keep the connection for reuse
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def _healthy(self, conn):
+        with self._lock:
+            self.stats['health_checks'] += 1
+        try:
+            conn.execute("SELECT 1;").fetchone()
+            return True
+        except sql.Error:
+            return False
+
+    def get(self):
+        """Return the calling thread's connection, opening or reusing one if needed"""
+        conn = getattr(self._local, 'conn', None)
+        now = time.monotonic()
+        if conn is not None:
+            if now - self._local.checked_at < self.health_check_interval:
+                return conn
+            if self._healthy(conn):
+                self._local.checked_at = now
+                return conn
+            self.discard()
+            with self._lock:
+                self.stats['reconnects'] += 1
+
+        conn = None
+        while conn is None:
+            with self._lock:
+                idle = self._idle.pop() if self._idle else None
+            if idle is None:
+                conn = self._open()
+            elif now - idle[1] < self.health_check_interval or self._healthy(idle[0]):
+                conn = idle[0]
+                with self._lock:
+                    self.stats['reused'] += 1
+            else:
+                idle[0].close()
+
+        self._local.conn = conn
+        self._local.checked_at = now
+        self._local.finalizer = weakref.finalize(threading.current_thread(), self._release, conn)
+        return conn
+
+    def discard(self):
+        """Close the calling thread's connection so the next get() opens a fresh one"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.finalizer.detach()
+        self._local.conn = None
+        try:
+            conn.close()
+        except sql.Error:
+            pass
+
+    def health_check(self):
+        """Check the calling thread's connection and report pool statistics"""
+        conn = self.get()
+        ok = self._healthy(conn)
+        if not ok:
+            self.discard()
+            with self._lock:
+                self.stats['reconnects'] += 1
+            ok = self._healthy(self.get())
+        with self._lock:
+            report = dict(self.stats, idle=len(self._idle))
+        report['ok'] = ok
+        report['journal_mode'] = self.get().execute("PRAGMA journal_mode;").fetchone()[0]
+        return report
+
+    def close_all(self):
+        """Close every idle connection and the calling thread's own connection"""
+        self.discard()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+pool = ConnectionPool(DATABASE)
+
+# function to get the pooled connection for this thread and a cursor on it
+# (pooled connections must not be closed by the caller)
 def connection():
-    conn = sql.connect(config.database_name + '.db')
-    conn.execute("PRAGMA foreign_keys = ON;")
+    conn = pool.get()
     c = conn.cursor()
     return conn, c
 
-# function to establish connection to the database and create tables (if they don't exist yet)
-def db_init():
-    conn = sql.connect('database_1A.db')
-    c = conn.cursor()
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS donor_record
-                 (donor_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  name TEXT NOT NULL,
-                  blood_type TEXT NOT NULL,
-                  ... other fields ...)''')
-    
-    conn.commit()
-    conn.close()
-
 # Database connection
 def get_db_connection():
-    conn = sql.connect('database_1A.db')
-    conn.row_factory = sql.Row
-    return conn
+    return pool.get()
 
 def execute_query(query, params=(), fetch=False):
     """
@@ -40,8 +297,12 @@ def execute_query(query, params=(), fetch=False):
     
     Returns:
         list: Query results if fetch=True, None otherwise
+
+    fetch=True reads the whole result into memory; walk large results with
+    stream_query instead.
     """
     conn = get_db_connection()
+    changes = conn.total_changes
     try:
         cur = conn.cursor()
         cur.execute(query, params)
@@ -52,18 +313,411 @@ def execute_query(query, params=(), fetch=False):
             results = None
             
         conn.commit()
+        if conn.total_changes != changes:
+            notify_write(*written_tables(query))
         return results
     except Exception as e:
         conn.rollback()
         raise e
+
+def _without_triggers(conn, replacements, write):
+    # drops the triggers named in replacements, calls write() (which returns
+    # the replacements' parameters), runs each replacement once and recreates
+    # its trigger, all under a savepoint so a failure restores the triggers;
+    # outside a transaction each DROP TRIGGER would be committed on its own
+    if not conn.in_transaction:
+        raise ValueError("bulk writes must run inside a transaction")
+    conn.execute("SAVEPOINT bulk_write;")
+    try:
+        triggers = conn.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN ({', '.join('?' * len(replacements))})",
+            list(replacements)).fetchall() if replacements else []
+        for name, _ in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        result, params = write()
+        for name, create in triggers:
+            conn.execute(replacements[name], params)
+            conn.execute(create)
+    except Exception:
+        conn.execute("ROLLBACK TO bulk_write;")
+        conn.execute("RELEASE bulk_write;")
+        raise
+    conn.execute("RELEASE bulk_write;")
+    return result
+
+def bulk_insert(conn, table, columns, rows):
+    """
+    executemany rows into table inside the caller's transaction, with the
+    table's BULK_INSERT_TRIGGERS dropped around it and their work done once
+
+    Everything runs under a savepoint: if any statement fails, the rows and
+    the dropped triggers are rolled back to how they were before the call.
+    """
+    def write():
+        start = conn.execute(f"SELECT IFNULL(MAX(rowid), 0) FROM {table}").fetchone()[0]
+        conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                         rows)
+        return None, (start,)
+    _without_triggers(conn, BULK_INSERT_TRIGGERS.get(table, {}), write)
+
+def bulk_reserve_units(conn, reservations):
+    """
+    Mark Available units Reserved from (request_id, unit_id) pairs inside the
+    caller's transaction, with BULK_RESERVE_TRIGGERS dropped around it and
+    their work done once; returns the number of units reserved
+
+    The replacements count every unit as moved from Available to Reserved,
+    so the caller must roll back unless all of them were reserved.
+    """
+    def write():
+        reserved = conn.executemany(RESERVE_UNIT_SQL, reservations).rowcount
+        return reserved, (json.dumps([unit_id for _, unit_id in reservations]),)
+    return _without_triggers(conn, BULK_RESERVE_TRIGGERS, write)
+
+# bumped after every write this process commits, so caches built from query
+# results can tell they may be stale; code that writes through its own
+# connection or cursor instead of execute_query calls notify_write() itself,
+# naming the tables it wrote when it knows them
+_write_version = 0
+_write_version_lock = threading.Lock()
+
+# per-table write counters, and an epoch bumped by writes to unknown tables
+_table_versions = {}
+_write_epoch = 0
+
+# tables that triggers write when the key table is written (see the migrations)
+TRIGGER_WRITES = {
+    'blood_units': ('stock_levels', 'donor_score_queue'),
+    'donor_record': ('donor_scores', 'donor_search'),
+    'blood_banks': ('blood_bank_search',),
+    'blood_requests': ('blood_request_search',),
+}
+
+_WRITTEN_TABLE = re.compile(
+    r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+(\w+)",
+    re.IGNORECASE)
+_READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)", re.IGNORECASE)
+
+def written_tables(query):
+    """Return the table an INSERT/UPDATE/DELETE statement writes (empty if unknown)"""
+    match = _WRITTEN_TABLE.match(query)
+    return (match.group(1).lower(),) if match else ()
+
+def read_tables(query):
+    """Return the tables a SELECT reads from, including subqueries and joins"""
+    return tuple(sorted({table.lower() for table in _READ_TABLES.findall(query)}))
+
+def notify_write(*tables):
+    """Record that this process has committed a write to tables (to any table if none are named)"""
+    global _write_version
+    with _write_version_lock:
+        _write_version += 1
+    _note_table_writes(tables)
+
+def _note_table_writes(tables):
+    # moves the tables and those their triggers write; no tables means any table
+    global _write_epoch
+    with _write_version_lock:
+        if not tables:
+            _write_epoch += 1
+        for table in tables:
+            for written in (table.lower(), *TRIGGER_WRITES.get(table.lower(), ())):
+                _table_versions[written] = _table_versions.get(written, 0) + 1
+
+def write_version():
+    """Return the number of writes this process has committed so far"""
+    return _write_version
+
+def table_versions(tables):
+    """Return a stamp that changes whenever any of tables may have been written"""
+    return (_write_epoch, tuple(_table_versions.get(table, 0) for table in tables))
+
+class QueryCache:
+    """
+    LRU cache of read-only query results keyed on (SQL, params)
+
+    Each entry remembers the write versions of the tables its query reads and
+    is dropped on lookup once any of them has moved. Writes from other
+    processes (and connections that do not call notify_write) are noticed by
+    one watcher connection per process: its PRAGMA data_version moves on any
+    commit, and then the table_versions counters, shared by every process,
+    tell which tables were written.
+    """
+
+    def __init__(self, max_bytes=QUERY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()   # key -> (rows, size, tables, stamp)
+        self._lock = threading.Lock()
+        self._watcher = None            # read-only connection that never commits
+        self._data_version = None       # its last PRAGMA data_version
+        self._seen_versions = {}        # table -> table_versions.version at the last check
+        self._watch_lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+
+    def check_external_writes(self):
+        """Invalidate the tables written by other connections or processes since the last check"""
+        with self._watch_lock:
+            if self._watcher is None:
+                self._watcher = _stream_connection()
+            version = self._watcher.execute("PRAGMA data_version;").fetchone()[0]
+            if version == self._data_version:
+                return
+            self._data_version = version
+            try:
+                versions = dict(self._watcher.execute("SELECT name, version FROM table_versions;").fetchall())
+            except sql.OperationalError:
+                # no table_versions (an unmigrated database): the writes cannot be attributed
+                _note_table_writes(())
+                return
+            changed = [table for table, count in versions.items() if self._seen_versions.get(table) != count]
+            self._seen_versions = versions
+        if changed:
+            _note_table_writes(changed)
+
+    def _drop(self, key):
+        _, size, _, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            rows, _, tables, stamp = entry
+            if stamp != table_versions(tables):
+                self._drop(key)
+                self.stats['invalidations'] += 1
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return rows
+
+    def put(self, key, rows, tables, stamp):
+        size = _result_size(rows)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (rows, size, tables, stamp)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def info(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return dict(self.stats, entries=len(self._entries), bytes=self.bytes,
+                        hit_rate=self.stats['hits'] / lookups if lookups else 0.0)
+
+def _result_size(rows):
+    # rough memory held by a result: the list, each row and each value
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+query_cache = QueryCache()
+
+def cached_query(query, params=()):
+    """
+    Run a read-only query through the result cache
+
+    Opt-in replacement for execute_query(query, params, fetch=True) on reads
+    that are repeated far more often than their tables change.
+    """
+    if not query.lstrip().upper().startswith(('SELECT', 'WITH')):
+        raise ValueError("cached_query only runs read-only SELECT queries")
+    key = (query, tuple(params.items()) if isinstance(params, dict) else tuple(params))
+
+    conn = get_db_connection()
+    query_cache.check_external_writes()
+    rows = query_cache.get(key)
+    if rows is None:
+        tables = read_tables(query)
+        # stamp before reading, so a write that lands mid-query leaves the entry stale
+        stamp = table_versions(tables)
+        rows = conn.execute(query, params).fetchall()
+        query_cache.put(key, rows, tables, stamp)
+    return list(rows)
+
+# ---------------------------------------------------------------------------
+# Streaming reads
+#
+# stream_query walks a result chunk by chunk with fetchmany instead of
+# fetchall, so reports, exports and batch jobs over millions of rows hold one
+# chunk in memory at a time. SQLite only steps the statement when the next
+# chunk is asked for, so a slow consumer holds the reader back (back-pressure)
+# and stopping early - breaking out of the loop, close() on the generator or
+# setting a cancel event - finalizes the statement without reading the rest.
+#
+# Each stream gets its own query-only connection: it reads one consistent
+# snapshot from start to finish, and a commit or rollback on the thread's
+# pooled connection can neither see nor abort it. Under WAL the snapshot also
+# keeps the writer from checkpointing past it, so streams should not be left
+# open longer than their consumer needs.
+# ---------------------------------------------------------------------------
+
+# rows fetched per step of a stream
+STREAM_CHUNK_ROWS = 10000
+
+# pragmas of a stream connection; journal_mode is left to the pooled connections
+STREAM_PRAGMAS = {pragma: value for pragma, value in PRAGMAS.items() if pragma != 'journal_mode'}
+STREAM_PRAGMAS['query_only'] = 'ON'
+
+_STREAM_DONE = object()
+
+def _stream_connection():
+    conn = sql.connect(pool.database, check_same_thread=False)
+    conn.row_factory = sql.Row
+    for pragma, value in STREAM_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value};")
+    return conn
+
+def _read_chunks(query, params, chunk_size, cancel):
+    conn = _stream_connection()
+    try:
+        cursor = conn.execute(query, params)
+        try:
+            while cancel is None or not cancel.is_set():
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
     finally:
         conn.close()
 
-def db_init():
-    """Initialize the database with required tables"""
-    
-    # Create donors table
-    execute_query("""
+def _prefetch_chunks(chunks, prefetch, cancel):
+    # a reader thread stays up to prefetch chunks ahead; put() blocks when the
+    # queue is full, which is what holds the reader back
+    import queue
+    buffer = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def read():
+        try:
+            for rows in chunks:
+                while not stop.is_set():
+                    try:
+                        buffer.put(rows, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    break
+        except Exception as e:
+            buffer.put(e)
+        finally:
+            chunks.close()
+            buffer.put(_STREAM_DONE)
+
+    reader = threading.Thread(target=read, name='stream-reader', daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _STREAM_DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+            if cancel is not None and cancel.is_set():
+                break
+    finally:
+        stop.set()
+        # unblock a reader waiting on a full queue, then wait for it to finish
+        while reader.is_alive():
+            try:
+                buffer.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        reader.join()
+
+def stream_query(query, params=(), chunk_size=STREAM_CHUNK_ROWS, prefetch=0, cancel=None):
+    """
+    Yield the rows of a read-only query as lists of at most chunk_size rows
+
+    With prefetch > 0 a background thread reads up to that many chunks ahead
+    of the consumer. cancel is an optional threading.Event; once set, the
+    stream stops at the next chunk boundary.
+    """
+    if not query.lstrip().upper().startswith(('SELECT', 'WITH')):
+        raise ValueError("stream_query only runs read-only SELECT queries")
+    chunks = _read_chunks(query, params, chunk_size, cancel)
+    if prefetch > 0:
+        chunks = _prefetch_chunks(chunks, prefetch, cancel)
+    try:
+        yield from chunks
+    finally:
+        chunks.close()
+
+def iter_rows(query, params=(), chunk_size=STREAM_CHUNK_ROWS, prefetch=0, cancel=None):
+    """Yield the rows of a read-only query one at a time (see stream_query)"""
+    for rows in stream_query(query, params, chunk_size, prefetch, cancel):
+        yield from rows
+
+def stream_frames(query, params=(), chunk_size=STREAM_CHUNK_ROWS, prefetch=0, cancel=None):
+    """Yield the result of a read-only query as pandas DataFrames of at most chunk_size rows"""
+    import pandas as pd
+
+    columns = None
+    for rows in stream_query(query, params, chunk_size, prefetch, cancel):
+        columns = columns or list(rows[0].keys())
+        yield pd.DataFrame.from_records([tuple(row) for row in rows], columns=columns)
+
+def export_csv(query, params, file, chunk_size=STREAM_CHUNK_ROWS, cancel=None):
+    """Write the result of a read-only query to an open text file as CSV and return the row count"""
+    writer = csv.writer(file)
+    count = 0
+    # the reader fetches the next chunk while this thread writes the last one
+    for rows in stream_query(query, params, chunk_size, prefetch=2, cancel=cancel):
+        if count == 0:
+            writer.writerow(rows[0].keys())
+        writer.writerows(rows)
+        count += len(rows)
+    return count
+
+# ---------------------------------------------------------------------------
+# Schema migrations
+#
+# Every schema change is an ordered, numbered migration. Applied versions are
+# recorded in the schema_version table, so a database that is already up to
+# date costs a single indexed MAX() lookup on startup.
+# ---------------------------------------------------------------------------
+
+def _m001_baseline(conn):
+    """Tables as they exist in the live database_1A.db"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS donor_record (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            age INTEGER NOT NULL,
+            gender TEXT NOT NULL,
+            date_of_birth TEXT NOT NULL,
+            blood_group TEXT NOT NULL,
+            contact_number_1 TEXT NOT NULL,
+            verification_id TEXT NOT NULL UNIQUE,
+            address TEXT NOT NULL,
+            city TEXT NOT NULL,
+            state TEXT NOT NULL,
+            pin_code TEXT NOT NULL,
+            date_of_registration TEXT NOT NULL,
+            time_of_registration TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS donors (
             donor_id INTEGER PRIMARY KEY AUTOINCREMENT,
             first_name TEXT NOT NULL,
@@ -74,21 +728,20 @@ def db_init():
             last_donation_date DATE
         )
     """)
-    
-    # Create blood_units table
-    execute_query("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS blood_units (
             unit_id INTEGER PRIMARY KEY AUTOINCREMENT,
             donor_id TEXT,
             blood_type TEXT NOT NULL,
             collection_date DATE NOT NULL,
+            expiry_date DATE NOT NULL,
             status TEXT NOT NULL,
+            storage_location TEXT,
+            notes TEXT,
             FOREIGN KEY (donor_id) REFERENCES donors(donor_id)
         )
     """)
-    
-    # Create blood_banks table
-    execute_query("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS blood_banks (
             bank_id INTEGER PRIMARY KEY AUTOINCREMENT,
             bank_name TEXT NOT NULL,
@@ -99,9 +752,7 @@ def db_init():
             license_number TEXT UNIQUE
         )
     """)
-    
-    # Create blood_requests table
-    execute_query("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS blood_requests (
             request_id INTEGER PRIMARY KEY AUTOINCREMENT,
             patient_name TEXT NOT NULL,
@@ -116,8 +767,740 @@ def db_init():
         )
     """)
 
-# Initialize database when module is imported
-db_init()
+def _m002_blood_unit_columns(conn):
+    """Bring blood_units created by the old db_init (e.g. blood_bank.db) up to the live columns"""
+    columns = table_columns(conn, 'blood_units')
+    if 'expiry_date' not in columns:
+        conn.execute("ALTER TABLE blood_units ADD COLUMN expiry_date DATE")
+        # red cells keep for 42 days after collection
+        conn.execute("UPDATE blood_units SET expiry_date = DATE(collection_date, '+42 days')")
+    if 'storage_location' not in columns:
+        conn.execute("ALTER TABLE blood_units ADD COLUMN storage_location TEXT")
+    if 'notes' not in columns:
+        conn.execute("ALTER TABLE blood_units ADD COLUMN notes TEXT")
+
+def _m003_hot_path_indexes(conn):
+    """Indexes for the hot lookup paths (see INDEXES)"""
+    ensure_indexes(conn, [
+        'idx_donor_record_city_blood_group',
+        'idx_blood_requests_status_group_units',
+        'idx_blood_requests_status_request_date',
+        'idx_blood_requests_urgency_rank_required_by',
+        'idx_blood_units_status_blood_type',
+        'idx_blood_banks_bank_name',
+    ])
+
+def _m004_donor_locations(conn):
+    """PIN-code centroids with a grid-cell index, and donor coordinates"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS postal_codes (
+            pin_code TEXT PRIMARY KEY,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            place TEXT,
+            geo_cell INTEGER NOT NULL
+        )
+    """)
+    columns = table_columns(conn, 'donor_record')
+    for column in ['latitude', 'longitude']:
+        if column not in columns:
+            conn.execute(f"ALTER TABLE donor_record ADD COLUMN {column} REAL")
+
+    # donor coordinates follow the PIN code on every insert and PIN code change
+    for event in ['INSERT', 'UPDATE OF pin_code']:
+        name = 'donor_record_geocode_' + event.split()[0].lower()
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name}
+            AFTER {event} ON donor_record
+            BEGIN
+                {GEOCODE_DONOR_SQL.format(where='id = NEW.id')};
+            END
+        """)
+
+    if os.path.exists(POSTAL_CODES_FILE):
+        with open(POSTAL_CODES_FILE, newline='') as f:
+            conn.executemany(INSERT_POSTAL_CODE_SQL, csv.DictReader(f))
+    conn.execute(GEOCODE_DONOR_SQL.format(where='1'))
+    ensure_indexes(conn, ['idx_postal_codes_geo_cell', 'idx_donor_record_location'])
+
+def _m005_unit_reservations(conn):
+    """Record which request a reserved unit was allocated to; FEFO index for allocation"""
+    if 'request_id' not in table_columns(conn, 'blood_units'):
+        # no foreign key: it would add a parent lookup to every reservation
+        conn.execute("ALTER TABLE blood_units ADD COLUMN request_id INTEGER")
+    # (status, blood_type, expiry_date) serves every query the old (status, blood_type)
+    # index did, and each extra index slows down reserving units
+    conn.execute("DROP INDEX IF EXISTS idx_blood_units_status_blood_type")
+    ensure_indexes(conn, ['idx_blood_units_status_blood_type_expiry'])
+
+def _m006_stock_levels(conn):
+    """Per bank, blood type and status unit counts kept exact by triggers on blood_units"""
+    if 'bank_id' not in table_columns(conn, 'blood_units'):
+        conn.execute("ALTER TABLE blood_units ADD COLUMN bank_id INTEGER REFERENCES blood_banks(bank_id)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock_levels (
+            bank_id INTEGER NOT NULL,
+            blood_type TEXT NOT NULL,
+            status TEXT NOT NULL,
+            units INTEGER NOT NULL,
+            PRIMARY KEY (blood_type, status, bank_id)
+        ) WITHOUT ROWID
+    """)
+    # units without a bank are counted under bank_id 0
+    add = """
+        INSERT INTO stock_levels VALUES (IFNULL(NEW.bank_id, 0), NEW.blood_type, NEW.status, 1)
+        ON CONFLICT (blood_type, status, bank_id) DO UPDATE SET units = units + 1
+    """
+    remove = """
+        UPDATE stock_levels SET units = units - 1
+        WHERE bank_id = IFNULL(OLD.bank_id, 0) AND blood_type = OLD.blood_type AND status = OLD.status
+    """
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS blood_units_stock_insert
+        AFTER INSERT ON blood_units
+        BEGIN {add}; END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS blood_units_stock_delete
+        AFTER DELETE ON blood_units
+        BEGIN {remove}; END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS blood_units_stock_update
+        AFTER UPDATE OF bank_id, blood_type, status ON blood_units
+        WHEN IFNULL(OLD.bank_id, 0) != IFNULL(NEW.bank_id, 0)
+          OR OLD.blood_type != NEW.blood_type
+          OR OLD.status != NEW.status
+        BEGIN {remove}; {add}; END
+    """)
+    conn.execute("DELETE FROM stock_levels")
+    conn.execute(REBUILD_STOCK_LEVELS_SQL)
+
+def _m007_expiry_index(conn):
+    """Index for the expiry sweeper and near-expiry warnings"""
+    ensure_indexes(conn, ['idx_blood_units_status_expiry'])
+
+def _m008_donor_scores(conn):
+    """Eligibility scores per donor and a queue of donors whose donation history changed"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS donor_scores (
+            donor_id TEXT PRIMARY KEY,
+            recency INTEGER,
+            frequency INTEGER NOT NULL,
+            monetary INTEGER NOT NULL,
+            time INTEGER,
+            probability REAL NOT NULL,
+            eligible INTEGER NOT NULL,
+            model_version TEXT NOT NULL,
+            scored_at TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    # INSERT OR REPLACE gives a re-queued donor a new rowid, so a scoring run
+    # only dequeues the entries that existed when it started
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS donor_score_queue (
+            donor_id TEXT PRIMARY KEY
+        )
+    """)
+    enqueue = "INSERT OR REPLACE INTO donor_score_queue (donor_id) VALUES ({})"
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS blood_units_score_insert
+        AFTER INSERT ON blood_units
+        WHEN NEW.donor_id IS NOT NULL
+        BEGIN {enqueue.format('NEW.donor_id')}; END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS blood_units_score_delete
+        AFTER DELETE ON blood_units
+        WHEN OLD.donor_id IS NOT NULL
+        BEGIN {enqueue.format('OLD.donor_id')}; END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS blood_units_score_update
+        AFTER UPDATE OF donor_id, collection_date ON blood_units
+        BEGIN
+            {enqueue.format('IFNULL(OLD.donor_id, NEW.donor_id)')};
+            {enqueue.format('IFNULL(NEW.donor_id, OLD.donor_id)')};
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS donor_record_scores_delete
+        AFTER DELETE ON donor_record
+        BEGIN DELETE FROM donor_scores WHERE donor_id = OLD.id; END
+    """)
+    ensure_indexes(conn, ['idx_blood_units_donor_collection', 'idx_donor_scores_probability'])
+
+def _m009_listing_indexes(conn):
+    """Sort keys and indexes for keyset-paginated listings"""
+    # a row-value seek cannot use an expression index, so the feed's urgency
+    # rank becomes a (virtual, computed on read) column with a plain index
+    if 'urgency_rank' not in table_columns(conn, 'blood_requests'):
+        conn.execute(f"ALTER TABLE blood_requests ADD COLUMN urgency_rank INTEGER "
+                     f"GENERATED ALWAYS AS ({URGENCY_RANK_SQL}) VIRTUAL")
+    conn.execute("DROP INDEX IF EXISTS idx_blood_requests_urgency_rank_required_by")
+    ensure_indexes(conn, [
+        'idx_blood_requests_request_date',
+        'idx_donor_record_name_id',
+        'idx_blood_requests_feed',
+    ])
+
+def _m010_search_indexes(conn):
+    """Full-text indexes over donors, blood banks and requests, kept in sync by triggers"""
+    for index, (table, columns) in SEARCH_INDEXES.items():
+        # external content: the index stores tokens only and reads rows back from table
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5(
+                {', '.join(columns)}, content='{table}', content_rowid='rowid',
+                tokenize='{SEARCH_TOKENIZE}', prefix='{SEARCH_PREFIXES}'
+            )
+        """)
+        # one row per indexed term, used to correct misspelt search terms
+        conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {index}_terms USING fts5vocab({index}, 'row')")
+        new_values = ', '.join(f'NEW.{column}' for column in columns)
+        old_values = ', '.join(f'OLD.{column}' for column in columns)
+        insert = f"INSERT INTO {index} (rowid, {', '.join(columns)}) VALUES (NEW.rowid, {new_values})"
+        delete = f"INSERT INTO {index} ({index}, rowid, {', '.join(columns)}) VALUES ('delete', OLD.rowid, {old_values})"
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_search_insert
+            AFTER INSERT ON {table}
+            BEGIN {insert}; END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_search_delete
+            AFTER DELETE ON {table}
+            BEGIN {delete}; END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_search_update
+            AFTER UPDATE OF {', '.join(columns)} ON {table}
+            BEGIN {delete}; {insert}; END
+        """)
+        conn.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+
+def _m011_donor_id_aliases(conn):
+    """Old P-ddmmyy-xxxxxx donor IDs and the ULIDs they were migrated to (see donor_ids.py)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS donor_id_aliases (
+            legacy_id TEXT PRIMARY KEY,
+            verification_id TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+
+def _m012_blood_unit_donor_key(conn):
+    """Point blood_units.donor_id at donor_record(id), the donors the app registers"""
+    # the baseline foreign key names the legacy donors table, whose integer IDs
+    # nothing writes any more; SQLite cannot alter a foreign key, so the table
+    # is rebuilt and its indexes and triggers recreated from their stored SQL.
+    # There is no ON DELETE action: one would run the score queue triggers as
+    # a foreign key action, where their INSERT OR REPLACE aborts on the queued
+    # donor, so delete_donor unlinks a donor's units before deleting the donor
+    dependents = conn.execute("""
+        SELECT sql FROM sqlite_master
+        WHERE tbl_name = 'blood_units' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    """).fetchall()
+    conn.execute("""
+        CREATE TABLE blood_units_new (
+            unit_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            donor_id TEXT REFERENCES donor_record(id),
+            blood_type TEXT NOT NULL,
+            collection_date DATE NOT NULL,
+            expiry_date DATE NOT NULL,
+            status TEXT NOT NULL,
+            storage_location TEXT,
+            notes TEXT,
+            request_id INTEGER,
+            bank_id INTEGER REFERENCES blood_banks(bank_id)
+        )
+    """)
+    # (sqlite_sequence exists from here on, since the new table is AUTOINCREMENT)
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'blood_units'").fetchone()
+    # a unit whose donor is not a registered donor keeps its history without one
+    conn.execute("""
+        INSERT INTO blood_units_new (unit_id, donor_id, blood_type, collection_date, expiry_date, status,
+                                     storage_location, notes, request_id, bank_id)
+        SELECT unit_id, (SELECT d.id FROM donor_record d WHERE d.id = u.donor_id), blood_type,
+               collection_date, expiry_date, status, storage_location, notes, request_id, bank_id
+        FROM blood_units u
+    """)
+    conn.execute("DROP TABLE blood_units")
+    conn.execute("ALTER TABLE blood_units_new RENAME TO blood_units")
+    for (statement,) in dependents:
+        conn.execute(statement)
+    if sequence is not None:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'blood_units'", sequence)
+
+def _m013_table_versions(conn):
+    """Per-table write counters kept by triggers, shared by every process (see QueryCache)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.executemany("INSERT OR IGNORE INTO table_versions VALUES (?, 0)", [(table,) for table in VERSIONED_TABLES])
+    for table in VERSIONED_TABLES:
+        for event in ['INSERT', 'UPDATE', 'DELETE']:
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN {BUMP_TABLE_VERSION_SQL.format(table=table)}; END
+            """)
+
+# (version, description, function) in the order they must be applied
+MIGRATIONS = [
+    (1, 'baseline tables', _m001_baseline),
+    (2, 'blood_units expiry and storage columns', _m002_blood_unit_columns),
+    (3, 'hot path indexes', _m003_hot_path_indexes),
+    (4, 'donor locations and spatial index', _m004_donor_locations),
+    (5, 'blood unit reservations', _m005_unit_reservations),
+    (6, 'stock level counters', _m006_stock_levels),
+    (7, 'blood unit expiry index', _m007_expiry_index),
+    (8, 'donor eligibility scores', _m008_donor_scores),
+    (9, 'listing sort indexes', _m009_listing_indexes),
+    (10, 'full-text search indexes', _m010_search_indexes),
+    (11, 'donor ID aliases', _m011_donor_id_aliases),
+    (12, 'blood unit donor foreign key', _m012_blood_unit_donor_key),
+    (13, 'shared table write versions', _m013_table_versions),
+]
+
+# timings of the last migrate() call in this process
+migration_stats = {}
+
+def table_columns(conn, table):
+    """Return the column names of a table"""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table});")]
+
+def schema_version(conn):
+    """Return the highest applied migration version (0 for a fresh database)"""
+    try:
+        return conn.execute("SELECT MAX(version) FROM schema_version;").fetchone()[0] or 0
+    except sql.OperationalError:
+        return 0
+
+def migrate(conn):
+    """Apply every pending migration once, each in its own transaction"""
+    started = time.perf_counter()
+    target = MIGRATIONS[-1][0]
+    current = schema_version(conn)
+    applied = []
+
+    if current < target:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TEXT NOT NULL,
+                duration_ms REAL NOT NULL
+            )
+        """)
+        for version, description, apply in MIGRATIONS:
+            if version <= current:
+                continue
+            step_started = time.perf_counter()
+            # BEGIN IMMEDIATE takes the write lock, so two workers starting
+            # together cannot both apply the same migration
+            conn.execute("BEGIN IMMEDIATE;")
+            try:
+                if schema_version(conn) >= version:
+                    conn.rollback()
+                    continue
+                apply(conn)
+                conn.execute(
+                    "INSERT INTO schema_version VALUES (?, ?, ?, ?);",
+                    (version, description, datetime.now().isoformat(timespec='seconds'),
+                     (time.perf_counter() - step_started) * 1000)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(version)
+
+    migration_stats.clear()
+    migration_stats.update({
+        'from_version': current,
+        'to_version': target,
+        'applied': applied,
+        'elapsed_ms': (time.perf_counter() - started) * 1000,
+    })
+    return migration_stats
+
+# ---------------------------------------------------------------------------
+# Indexes and query plans
+#
+# INDEXES declares every secondary index the application relies on; the
+# migrations create them through ensure_indexes(). Hot queries are registered
+# with register_query() so check_query_plans() can run EXPLAIN QUERY PLAN on
+# each of them and catch any that fall back to a full table scan.
+# ---------------------------------------------------------------------------
+
+# index name -> (table, indexed columns or expressions)
+INDEXES = {
+    # find_nearby_donors: WHERE LOWER(city) = LOWER(?) AND blood_group = ?
+    'idx_donor_record_city_blood_group': ('donor_record', 'LOWER(city), blood_group'),
+    # dashboard: pending counts and SUM(units_required) per blood group
+    'idx_blood_requests_status_group_units': ('blood_requests', 'status, blood_group, units_required'),
+    # view_requests: WHERE status = ? ORDER BY request_date DESC
+    'idx_blood_requests_status_request_date': ('blood_requests', 'status, request_date'),
+    # request feed before migration 9 (replaced by idx_blood_requests_feed)
+    'idx_blood_requests_urgency_rank_required_by': (
+        'blood_requests',
+        "(CASE urgency WHEN 'Critical' THEN 1 WHEN 'Urgent' THEN 2 ELSE 3 END), required_by"
+    ),
+    # get_available_blood_units before migration 5 (replaced by idx_blood_units_status_blood_type_expiry)
+    'idx_blood_units_status_blood_type': ('blood_units', 'status, blood_type'),
+    # update_blood_bank: WHERE bank_name = ?
+    'idx_blood_banks_bank_name': ('blood_banks', 'bank_name'),
+    # nearest-donor search: PIN-code centroids by grid cell, then donors at each centroid
+    'idx_postal_codes_geo_cell': ('postal_codes', 'geo_cell'),
+    'idx_donor_record_location': ('donor_record', 'blood_group, latitude, longitude, age'),
+    # get_available_blood_units: WHERE status = ? AND blood_type = ?, and
+    # allocation: available units of a type, first-expiry-first-out
+    'idx_blood_units_status_blood_type_expiry': ('blood_units', 'status, blood_type, expiry_date'),
+    # expiry sweeper: WHERE status = ? AND expiry_date < ?; expired units drop out of the range
+    'idx_blood_units_status_expiry': ('blood_units', 'status, expiry_date'),
+    # batch scoring: donation count and first/last collection per donor
+    'idx_blood_units_donor_collection': ('blood_units', 'donor_id, collection_date'),
+    # most likely donors first
+    'idx_donor_scores_probability': ('donor_scores', 'probability'),
+    # paginated listings: all requests newest first, donors by name
+    'idx_blood_requests_request_date': ('blood_requests', 'request_date'),
+    'idx_donor_record_name_id': ('donor_record', 'name, id'),
+    # request feed: ORDER BY urgency_rank, required_by, request_id
+    'idx_blood_requests_feed': ('blood_requests', 'urgency_rank, required_by'),
+}
+
+def ensure_indexes(conn, names=None):
+    """Create the named (by default every) declared index that does not exist yet"""
+    for name in names or INDEXES:
+        table, columns = INDEXES[name]
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns});")
+
+# query name -> (sql, sample parameters used for EXPLAIN QUERY PLAN)
+QUERIES = {}
+
+def register_query(name, query, sample_params=()):
+    """Register a hot query for plan checking and return its SQL unchanged"""
+    QUERIES[name] = (query, sample_params)
+    return query
+
+def donors_in_city_query(blood_groups):
+    """Donors of any of blood_groups in one city, most preferred group first"""
+    return f"""
+        SELECT id, name, blood_group, contact_number_1, address
+        FROM donor_record
+        WHERE LOWER(city) = LOWER(?)
+        AND blood_group IN ({', '.join('?' * len(blood_groups))})
+        ORDER BY {compatibility.preference_sql('blood_group', blood_groups)}
+    """
+
+register_query('nearby_donors', donors_in_city_query(compatibility.BLOOD_GROUPS),
+               ('Boston',) + tuple(compatibility.BLOOD_GROUPS))
+
+PENDING_REQUESTS_COUNT_QUERY = register_query('pending_requests_count', """
+    SELECT COUNT(*) FROM blood_requests WHERE status = 'Pending'
+""")
+
+PENDING_UNITS_QUERY = register_query('pending_units', """
+    SELECT SUM(units_required) FROM blood_requests WHERE status = 'Pending'
+""")
+
+# the two blood groups whose pending demand most exceeds the available stock
+CRITICAL_BLOOD_GROUPS_QUERY = register_query('critical_blood_groups', """
+    SELECT blood_group,
+           SUM(units_required) - IFNULL((
+               SELECT SUM(units) FROM stock_levels
+               WHERE blood_type = blood_requests.blood_group AND status = 'Available'
+           ), 0) AS shortfall
+    FROM blood_requests
+    WHERE status = 'Pending'
+    GROUP BY blood_group
+    HAVING shortfall > 0
+    ORDER BY shortfall DESC
+    LIMIT 2
+""")
+
+AVAILABLE_UNITS_QUERY = register_query('available_units', """
+    SELECT * FROM blood_units WHERE status = 'Available'
+""")
+
+AVAILABLE_UNITS_BY_TYPE_QUERY = register_query('available_units_by_type', """
+    SELECT * FROM blood_units WHERE status = 'Available' AND blood_type = ?
+""", ('O-',))
+
+UPDATE_BLOOD_BANK_QUERY = register_query('update_blood_bank', """
+    UPDATE blood_banks
+    SET contact_number=?, email=?, address=?, city=?
+    WHERE bank_name=?
+""", ('', '', '', '', 'Example Blood Bank'))
+
+# the donor_record columns shown to users, in display order
+DONOR_COLUMNS = """
+    id, name, age, gender, date_of_birth, blood_group,
+    contact_number_1, verification_id, address, city, state, pin_code,
+    date_of_registration, time_of_registration
+"""
+
+DONOR_BY_ID_QUERY = register_query('donor_by_id', f"""
+    SELECT {DONOR_COLUMNS} FROM donor_record WHERE id = ?
+""", ('0',))
+
+DONOR_BY_VERIFICATION_ID_QUERY = register_query('donor_by_verification_id', f"""
+    SELECT {DONOR_COLUMNS} FROM donor_record WHERE verification_id = ?
+""", ('0',))
+
+CENTROIDS_IN_CELLS_QUERY = register_query('centroids_in_cells', """
+    SELECT DISTINCT latitude, longitude
+    FROM postal_codes
+    WHERE geo_cell BETWEEN ? AND ?
+""", (0, 0))
+
+def donors_at_location_query(blood_groups):
+    """Donors of any of blood_groups at one centroid, most preferred group first"""
+    return f"""
+        SELECT id, name, blood_group, contact_number_1, address, city,
+               {compatibility.preference_sql('blood_group', blood_groups)} AS preference
+        FROM donor_record
+        WHERE blood_group IN ({', '.join('?' * len(blood_groups))})
+        AND latitude = ?
+        AND longitude = ?
+        AND age BETWEEN ? AND ?
+        ORDER BY preference
+        LIMIT ?
+    """
+
+register_query('donors_at_location', donors_at_location_query(compatibility.BLOOD_GROUPS),
+               tuple(compatibility.BLOOD_GROUPS) + (0.0, 0.0, 18, 65, 20))
+
+def ungeocoded_donors_query(blood_groups):
+    """Donors of any of blood_groups whose PIN code has no centroid, so no proximity search finds them"""
+    return f"""
+        SELECT id, name, blood_group, contact_number_1, address, city, pin_code,
+               {compatibility.preference_sql('blood_group', blood_groups)} AS preference
+        FROM donor_record
+        WHERE blood_group IN ({', '.join('?' * len(blood_groups))})
+        AND latitude IS NULL
+        AND age BETWEEN ? AND ?
+        ORDER BY preference, id
+    """
+
+register_query('ungeocoded_donors', ungeocoded_donors_query(compatibility.BLOOD_GROUPS),
+               tuple(compatibility.BLOOD_GROUPS) + (18, 65))
+
+def compatible_units_query(blood_types):
+    """Available units of any of blood_types, most preferred type first, then first to expire"""
+    return f"""
+        SELECT * FROM blood_units
+        WHERE status = 'Available'
+        AND blood_type IN ({', '.join('?' * len(blood_types))})
+        ORDER BY {compatibility.preference_sql('blood_type', blood_types)}, expiry_date
+    """
+
+register_query('compatible_units', compatible_units_query(compatibility.BLOOD_GROUPS),
+               tuple(compatibility.BLOOD_GROUPS))
+
+PENDING_ALLOCATION_QUERY = register_query('pending_allocation', """
+    SELECT request_id, blood_group, units_required, urgency, required_by, request_date
+    FROM blood_requests
+    WHERE status = 'Pending'
+""")
+
+UNITS_FOR_ALLOCATION_QUERY = register_query('units_for_allocation', """
+    SELECT unit_id
+    FROM blood_units
+    WHERE status = 'Available'
+    AND blood_type = ?
+    AND expiry_date >= ?
+    ORDER BY expiry_date, unit_id
+""", ('O-', '2000-01-01'))
+
+EXPIRED_UNITS_BATCH_QUERY = register_query('expired_units_batch', """
+    SELECT unit_id, request_id FROM blood_units
+    WHERE status = ? AND expiry_date < ?
+    LIMIT ?
+""", ('Available', '2000-01-01', 500))
+
+NEAR_EXPIRY_QUERY = register_query('near_expiry', """
+    SELECT blood_type, IFNULL(bank_id, 0) AS bank_id, COUNT(*) AS units, MIN(expiry_date) AS first_expiry
+    FROM blood_units
+    WHERE status = 'Available' AND expiry_date BETWEEN ? AND ?
+    GROUP BY blood_type, IFNULL(bank_id, 0)
+    ORDER BY first_expiry
+""", ('2000-01-01', '2000-01-08'))
+
+TOP_DONOR_SCORES_QUERY = register_query('top_donor_scores', """
+    SELECT s.donor_id, d.name, d.blood_group, d.contact_number_1, s.probability, s.scored_at
+    FROM donor_scores s
+    JOIN donor_record d ON d.id = s.donor_id
+    ORDER BY s.probability DESC
+    LIMIT ?
+""", (20,))
+
+def explain_query_plan(conn, query, params=()):
+    """Return the detail lines of EXPLAIN QUERY PLAN for a query"""
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params)]
+
+def is_full_scan(detail):
+    """A plan step is a full table scan when it scans a table without any index"""
+    return detail.startswith('SCAN ') and 'USING' not in detail
+
+def check_query_plans(conn):
+    """Return {query name: offending plan steps} for every registered query that scans a table"""
+    failures = {}
+    for name, (query, params) in QUERIES.items():
+        scans = [d for d in explain_query_plan(conn, query, params) if is_full_scan(d)]
+        if scans:
+            failures[name] = scans
+    return failures
+
+# ---------------------------------------------------------------------------
+# Keyset pagination
+#
+# Listings are paged by seeking past the sort key of the last row shown
+# instead of using OFFSET, so with an index on the sort key page N costs the
+# same as page 1. Every sort ends in a unique column, which keeps the order
+# stable, and uses a single direction. SQLite only seeks a row-value
+# comparison (a, b, id) > (?, ?, ?) on its leading column and then walks every
+# row tied on it, so the seek is spelled out as one arm per key
+# (a = ? AND b = ? AND id > ?, a = ? AND b > ?, a > ?) in a UNION ALL that
+# SQLite merges in index order. Page tokens are opaque strings holding the
+# listing, sort, direction and boundary key.
+# ---------------------------------------------------------------------------
+
+PAGE_SIZE = 25
+
+# listing name -> table, selected columns, sorts {name: (key columns, direction)}
+# with the default sort first, and filters {name: condition with one placeholder}
+LISTINGS = {
+    'donors': {
+        'table': 'donor_record',
+        'columns': DONOR_COLUMNS,
+        'sorts': {'id': (['id'], 'ASC'), 'name': (['name', 'id'], 'ASC')},
+        'filters': {'blood_group': 'blood_group = ?', 'city': 'LOWER(city) = LOWER(?)'},
+    },
+    'blood_banks': {
+        'table': 'blood_banks',
+        'columns': 'bank_name, address, city, contact_number, email, license_number',
+        'sorts': {'name': (['bank_name', 'bank_id'], 'ASC')},
+        'filters': {'city': 'LOWER(city) = LOWER(?)'},
+    },
+    'blood_requests': {
+        'table': 'blood_requests',
+        'columns': """
+            request_id, patient_name, blood_group, units_required, urgency,
+            hospital_name, contact_number, request_date, required_by, status
+        """,
+        'sorts': {
+            'newest': (['request_date', 'request_id'], 'DESC'),
+            'oldest': (['request_date', 'request_id'], 'ASC'),
+        },
+        'filters': {'status': 'status = ?', 'blood_group': 'blood_group = ?'},
+    },
+    'request_feed': {
+        'table': 'blood_requests',
+        'columns': """
+            patient_name, blood_group, units_required, urgency,
+            hospital_name, request_date, required_by, status
+        """,
+        'sorts': {'priority': (['urgency_rank', 'required_by', 'request_id'], 'ASC')},
+        'filters': {},
+    },
+}
+
+def page_query(listing, sort=None, filters=(), seek=None):
+    """SQL for one page of a listing; seek is None (first page), 'after' or 'before' a boundary key"""
+    spec = LISTINGS[listing]
+    keys, direction = spec['sorts'][sort or next(iter(spec['sorts']))]
+    # pages before the boundary are read in reverse and flipped back by fetch_page
+    ascending = (direction == 'ASC') != (seek == 'before')
+    conditions = [spec['filters'][name] for name in filters]
+    select = f"SELECT {spec['columns']}, {', '.join(f'{key} AS _key{i}' for i, key in enumerate(keys))} FROM {spec['table']}"
+    if seek:
+        # one arm per key: equal on the keys before it, past the boundary on it
+        arms = []
+        for i in reversed(range(len(keys))):
+            seek_conditions = [f"{key} = ?" for key in keys[:i]] + [f"{keys[i]} {'>' if ascending else '<'} ?"]
+            arms.append(f"{select} WHERE {' AND '.join(conditions + seek_conditions)}")
+        select = '\n        UNION ALL\n        '.join(arms)
+        keys = [f'_key{i}' for i in range(len(keys))]
+    elif conditions:
+        select += f" WHERE {' AND '.join(conditions)}"
+    order = 'ASC' if ascending else 'DESC'
+    return f"""
+        {select}
+        ORDER BY {', '.join(f'{key} {order}' for key in keys)}
+        LIMIT ?
+    """
+
+def page_params(filter_values, boundary, limit):
+    """Parameters for page_query: the filter values (and boundary key prefix) of each arm, then the limit"""
+    filter_values, boundary = list(filter_values), list(boundary)
+    if not boundary:
+        return (*filter_values, limit)
+    params = []
+    for i in reversed(range(len(boundary))):
+        params += filter_values + boundary[:i + 1]
+    return (*params, limit)
+
+def _page_token(listing, sort, seek, key):
+    return base64.urlsafe_b64encode(json.dumps([listing, sort, seek, list(key)]).encode()).decode()
+
+def fetch_page(listing, sort=None, filters=None, page_size=PAGE_SIZE, token=None, cached=False):
+    """
+    Return one page of a listing as {'rows', 'next', 'previous'}
+
+    rows are dicts of the listing's columns; next and previous are page tokens
+    to pass back as token, or None at either end. Filters with an empty value
+    are ignored.
+    """
+    spec = LISTINGS[listing]
+    sort = sort or next(iter(spec['sorts']))
+    keys, _ = spec['sorts'][sort]
+    filters = {name: value for name, value in sorted((filters or {}).items()) if value not in (None, '')}
+    unknown = set(filters) - set(spec['filters'])
+    if unknown:
+        raise ValueError(f"{listing} cannot be filtered by {', '.join(sorted(unknown))}")
+
+    seek, boundary = None, []
+    if token:
+        try:
+            token_listing, token_sort, seek, boundary = json.loads(base64.urlsafe_b64decode(token))
+        except ValueError:
+            raise ValueError("invalid page token")
+        if (token_listing, token_sort) != (listing, sort) or seek not in ('after', 'before'):
+            raise ValueError("page token belongs to a different listing or sort")
+
+    query = page_query(listing, sort, list(filters), seek)
+    params = page_params(filters.values(), boundary, page_size + 1)
+    rows = cached_query(query, params) if cached else get_db_connection().execute(query, params).fetchall()
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if seek == 'before':
+        rows.reverse()
+
+    page = {'rows': [], 'next': None, 'previous': None}
+    if rows:
+        names = rows[0].keys()[:-len(keys)]
+        page['rows'] = [dict(zip(names, tuple(row)[:-len(keys)])) for row in rows]
+        first, last = tuple(rows[0])[-len(keys):], tuple(rows[-1])[-len(keys):]
+        if more or seek == 'before':
+            page['next'] = _page_token(listing, sort, 'after', last)
+        if (more and seek == 'before') or seek == 'after':
+            page['previous'] = _page_token(listing, sort, 'before', first)
+    return page
+
+def _register_listing_queries():
+    # every listing, sort and seek direction is plan-checked like the hot queries
+    for listing, spec in LISTINGS.items():
+        for sort, (keys, _) in spec['sorts'].items():
+            for seek in (None, 'after', 'before'):
+                register_query(f"page_{listing}_{sort}{'_' + seek if seek else ''}",
+                               page_query(listing, sort, (), seek),
+                               page_params((), [''] * len(keys) if seek else (), PAGE_SIZE + 1))
+
+_register_listing_queries()
+register_query('page_blood_requests_newest_by_status', page_query('blood_requests', 'newest', ['status'], 'after'),
+               page_params(['Pending'], ['2000-01-01', 0], PAGE_SIZE + 1))
 
 # Add these helper functions if needed
 
@@ -137,15 +1520,82 @@ def get_blood_unit_by_id(unit_id):
         fetch=True
     )
 
-def get_available_blood_units(blood_type=None):
-    """Fetch available blood units, optionally filtered by blood type"""
+def get_available_blood_units(blood_type=None, compatible=False, component=compatibility.RED_CELLS):
+    """
+    Fetch available blood units, optionally filtered by blood type
+
+    With compatible=True, units of every group that can be given to a
+    blood_type recipient are returned, ranked exact match first and universal
+    donors last (see compatibility.compatible_groups).
+    """
+    return cached_query(*_available_units_query(blood_type, compatible, component))
+
+def stream_available_blood_units(blood_type=None, compatible=False, component=compatibility.RED_CELLS,
+                                 chunk_size=STREAM_CHUNK_ROWS):
+    """Same units as get_available_blood_units, in chunks of rows (see stream_query)"""
+    return stream_query(*_available_units_query(blood_type, compatible, component), chunk_size)
+
+def _available_units_query(blood_type, compatible, component):
+    if blood_type and compatible:
+        blood_types = compatibility.compatible_groups(blood_type, component)
+        return compatible_units_query(blood_types), tuple(blood_types)
     if blood_type:
-        return execute_query(
-            "SELECT * FROM blood_units WHERE status = 'Available' AND blood_type = ?",
-            (blood_type,),
-            fetch=True
-        )
-    return execute_query(
-        "SELECT * FROM blood_units WHERE status = 'Available'",
-        fetch=True
-    )
+        return AVAILABLE_UNITS_BY_TYPE_QUERY, (blood_type,)
+    return AVAILABLE_UNITS_QUERY, ()
+
+def _cli_migrate(databases):
+    for database in databases or [DATABASE]:
+        conn = sql.connect(database)
+        stats = migrate(conn)
+        conn.close()
+        print(f"{database}: version {stats['from_version']} -> {stats['to_version']}, "
+              f"applied {stats['applied'] or 'nothing'} in {stats['elapsed_ms']:.2f} ms")
+    return 0
+
+# tables that can be exported with python database.py export
+EXPORT_TABLES = ('blood_units', 'blood_requests', 'donor_record', 'blood_banks', 'donor_scores')
+
+def _cli_export(args):
+    if not args or args[0] not in EXPORT_TABLES or len(args) > 2:
+        print(f"usage: python database.py export {{{','.join(EXPORT_TABLES)}}} [file.csv]")
+        return 1
+    started = time.perf_counter()
+    query = f"SELECT * FROM {args[0]}"
+    if len(args) == 2:
+        with open(args[1], 'w', newline='') as f:
+            count = export_csv(query, (), f)
+    else:
+        count = export_csv(query, (), sys.stdout)
+    print(f"exported {count} {args[0]} rows in {time.perf_counter() - started:.2f} s", file=sys.stderr)
+    return 0
+
+def _cli_check_plans(databases):
+    status = 0
+    for database in databases or [DATABASE]:
+        conn = sql.connect(database)
+        migrate(conn)
+        failures = check_query_plans(conn)
+        conn.close()
+        for name, scans in failures.items():
+            print(f"{database}: {name}: full table scan: {'; '.join(scans)}")
+        if failures:
+            status = 1
+        else:
+            print(f"{database}: all {len(QUERIES)} registered queries use an index")
+    return status
+
+if __name__ == "__main__":
+    import sys
+
+    # python database.py migrate [database ...]
+    #     applies pending migrations to each database file (e.g. database_1A.db blood_bank.db)
+    #     and reports how long it took
+    # python database.py check-plans [database ...]
+    #     runs EXPLAIN QUERY PLAN over every registered query, exits 1 on a full table scan
+    # python database.py export table [file.csv]
+    #     streams a table to CSV (stdout by default) in constant memory
+    commands = {'migrate': _cli_migrate, 'check-plans': _cli_check_plans, 'export': _cli_export}
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print(f"usage: python database.py {{{','.join(commands)}}} [database ... | table [file.csv]]")
+        sys.exit(1)
+    sys.exit(commands[sys.argv[1]](sys.argv[2:]))
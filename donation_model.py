@@ -1,11 +1,20 @@
+import os
+import tempfile
 import pandas as pd
 import numpy as np
+import joblib
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler, RobustScaler
+from sklearn.preprocessing import StandardScaler, FunctionTransformer
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score, classification_report
 from sklearn.pipeline import Pipeline
 from sklearn.impute import SimpleImputer
+from features import FEATURES, ENGINEERED_FEATURES, MODEL_DIR, PIPELINE_PATH, SCORER_PATH, engineer_features
+import numpy_scorer
+import lookup_table
+
+# the training data, next to the code
+DATA_PATH = os.path.join(MODEL_DIR, 'transfusion.csv')
 
 def load_data(file_path):
     """Load the dataset from a CSV file."""
@@ -20,25 +29,13 @@ def load_data(file_path):
         return None
 
 def preprocess_data(data):
-    """Preprocess the data with enhanced steps."""
+    """Split raw features from the target and drop training outliers."""
     if data is None:
         return None, None
 
     try:
-        X = data.iloc[:, :-1]  # Features
-        y = data.iloc[:, -1]   # Target variable
-
-        # Create preprocessing pipeline
-        preprocessing_pipeline = Pipeline([
-            # Handle missing values with median for numerical data
-            ('imputer', SimpleImputer(strategy='median')),
-            
-            # Remove outliers using IQR method
-            ('outlier_handler', RobustScaler()),
-            
-            # Standard scaling of features
-            ('scaler', StandardScaler())
-        ])
+        X = data[FEATURES]      # Features
+        y = data.iloc[:, -1]    # Target variable
 
         # Handle outliers using IQR method
         def remove_outliers(df):
@@ -49,61 +46,62 @@ def preprocess_data(data):
             upper_bound = Q3 + 1.5 * IQR
             return df[~((df < lower_bound) | (df > upper_bound)).any(axis=1)]
 
-        # Remove outliers from features
+        # Outlier removal only shapes the training set; it is not part of serving
         X_clean = remove_outliers(X)
         y_clean = y[X_clean.index]
 
-        # Apply preprocessing pipeline
-        X_processed = preprocessing_pipeline.fit_transform(X_clean)
-
-        # Convert to DataFrame to maintain feature names
-        X_processed = pd.DataFrame(X_processed, columns=X.columns, index=X_clean.index)
-
-        # Add feature interactions
-        X_processed['recency_frequency'] = X_processed['Recency (months)'] * X_processed['Frequency (times)']
-        X_processed['monetary_time'] = X_processed['Monetary (c.c. blood)'] * X_processed['Time (months)']
-
-        # Log transform highly skewed features
-        skewed_features = ['Monetary (c.c. blood)', 'Time (months)']
-        for feature in skewed_features:
-            X_processed[f'{feature}_log'] = np.log1p(X_processed[feature])
-
-        return X_processed, y_clean
+        return X_clean, y_clean
 
     except Exception as e:
         print(f"Error in preprocessing: {str(e)}")
         return None, None
 
-def train_model(X_train, y_train):
-    """Train an enhanced logistic regression model."""
-    if X_train is None or y_train is None:
-        return None
+def build_pipeline():
+    """Build the imputation, feature engineering, scaling and model pipeline."""
+    return Pipeline([
+        # Handle missing values with median for numerical data
+        ('imputer', SimpleImputer(strategy='median')),
 
-    try:
-        # Create model with balanced class weights and L2 regularization
-        model = LogisticRegression(
+        # Add feature interactions and log transform skewed features
+        ('features', FunctionTransformer(engineer_features)),
+
+        # Standard scaling of features
+        ('scaler', StandardScaler()),
+
+        # Balanced class weights and L2 regularization
+        ('model', LogisticRegression(
             class_weight='balanced',
             C=1.0,
             max_iter=1000,
             random_state=42,
             solver='lbfgs'
-        )
-        
-        model.fit(X_train, y_train)
-        return model
+        )),
+    ])
+
+def train_model(X_train, y_train):
+    """Fit the full pipeline on raw feature rows."""
+    if X_train is None or y_train is None:
+        return None
+
+    try:
+        # fit on a plain array so serving can pass raw rows without column names
+        pipeline = build_pipeline()
+        pipeline.fit(np.asarray(X_train, dtype=np.float64), y_train)
+        return pipeline
 
     except Exception as e:
         print(f"Error in model training: {str(e)}")
         return None
 
-def evaluate_model(model, X_test, y_test):
+def evaluate_model(pipeline, X_test, y_test):
     """Evaluate the model with detailed metrics."""
-    if model is None or X_test is None or y_test is None:
+    if pipeline is None or X_test is None or y_test is None:
         return
 
     try:
-        y_pred = model.predict(X_test)
-        y_prob = model.predict_proba(X_test)[:, 1]
+        X_test = np.asarray(X_test, dtype=np.float64)
+        y_pred = pipeline.predict(X_test)
+        y_prob = pipeline.predict_proba(X_test)[:, 1]
 
         print("\nModel Evaluation Metrics:")
         print("-" * 50)
@@ -112,9 +110,10 @@ def evaluate_model(model, X_test, y_test):
         print(classification_report(y_test, y_pred))
 
         # Feature importance
+        model = pipeline.named_steps['model']
         if hasattr(model, 'coef_'):
             feature_importance = pd.DataFrame({
-                'Feature': X_test.columns,
+                'Feature': ENGINEERED_FEATURES,
                 'Importance': abs(model.coef_[0])
             })
             print("\nFeature Importance:")
@@ -123,9 +122,106 @@ def evaluate_model(model, X_test, y_test):
     except Exception as e:
         print(f"Error in model evaluation: {str(e)}")
 
+def check_transform_parity(pipeline, X, reference=None):
+    """Check that serving-time transforms are bit-identical to train-time ones.
+
+    Training transforms X as one batch; serving transforms one raw row at a
+    time. Both must produce exactly the same bytes, and so must the persisted
+    pipeline compared with the in-memory `reference` it was saved from.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    transform = pipeline[:-1]
+    batch = transform.transform(X)
+    rows = np.vstack([transform.transform(X[i:i + 1]) for i in range(len(X))])
+
+    mismatches = []
+    if not np.array_equal(batch, rows):
+        mismatches.append('row-at-a-time transform differs from batch transform')
+    if reference is not None:
+        if not np.array_equal(batch, reference[:-1].transform(X)):
+            mismatches.append('persisted transform differs from train-time transform')
+        if not np.array_equal(pipeline.predict_proba(X), reference.predict_proba(X)):
+            mismatches.append('persisted probabilities differ from train-time probabilities')
+
+    for mismatch in mismatches:
+        print(f"Parity check failed: {mismatch}")
+    return not mismatches
+
+def check_scorer(scorer, pipeline, X):
+    """Check that the exported NumPy scorer reproduces the pipeline's probabilities."""
+    difference = numpy_scorer.max_difference(scorer, pipeline, X)
+    if difference > numpy_scorer.TOLERANCE:
+        print(f"Scorer check failed: probabilities differ by up to {difference:.3g}")
+        return False
+    return True
+
+def check_lookup_table(table, scorer):
+    """Check the precomputed table against the scorer on a random in-range sample."""
+    difference = lookup_table.max_difference(table, scorer)
+    if difference > lookup_table.TOLERANCE:
+        print(f"Lookup table check failed: probabilities differ by up to {difference:.3g}")
+        return False
+    return True
+
+def _publish(path, write, verify):
+    # write next to the target, verify the written copy, then swap it in
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        if not verify(tmp_path):
+            os.remove(tmp_path)
+            return False
+        os.replace(tmp_path, path)
+        return True
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+def publish_serving_model(data_path=DATA_PATH, pipeline_path=PIPELINE_PATH, scorer_path=SCORER_PATH,
+                          table_path=lookup_table.TABLE_PATH):
+    """Train the pipeline, export its scorer and lookup table and publish them atomically."""
+    data = load_data(data_path)
+    X, y = preprocess_data(data)
+    pipeline = train_model(X, y)
+    if pipeline is None:
+        return False
+
+    # the registry only ever sees artifacts that reproduce the trained pipeline;
+    # the scorer goes last because the registry watches it
+    if not _publish(pipeline_path, lambda path: joblib.dump(pipeline, path),
+                    lambda path: check_transform_parity(joblib.load(path), X, reference=pipeline)):
+        return False
+    scorer = numpy_scorer.LogisticScorer.from_pipeline(pipeline)
+    table = lookup_table.build(scorer)
+    if not _publish(table_path, lambda path: lookup_table.save(path, table),
+                    lambda path: check_lookup_table(lookup_table.ScoreTable.load(path), scorer)):
+        return False
+    if not _publish(scorer_path, scorer.save,
+                    lambda path: check_scorer(numpy_scorer.LogisticScorer.load(path), pipeline, X)):
+        return False
+
+    print(f"Published {pipeline_path}, {table_path} and {scorer_path}")
+    return True
+
+def check_published_model(data_path=DATA_PATH, pipeline_path=PIPELINE_PATH, scorer_path=SCORER_PATH,
+                          table_path=lookup_table.TABLE_PATH):
+    """Re-run the parity, scorer and lookup table checks against the published artifacts."""
+    X, y = preprocess_data(load_data(data_path))
+    if X is None:
+        return False
+    pipeline = joblib.load(pipeline_path)
+    ok = check_transform_parity(pipeline, X, reference=train_model(X, y))
+    scorer = numpy_scorer.LogisticScorer.load(scorer_path)
+    ok = check_scorer(scorer, pipeline, X) and ok
+    ok = check_lookup_table(lookup_table.ScoreTable.load(table_path), scorer) and ok
+    print("Parity check passed" if ok else "Parity check failed")
+    return ok
+
 def main():
     # Load the data
-    data = load_data('transfusion.csv')
+    data = load_data(DATA_PATH)
     if data is None:
         return
 
@@ -136,19 +232,29 @@ def main():
 
     # Split the data with stratification
     X_train, X_test, y_train, y_test = train_test_split(
-        X, y, 
-        test_size=0.2, 
+        X, y,
+        test_size=0.2,
         random_state=42,
         stratify=y
     )
 
     # Train the model
-    model = train_model(X_train, y_train)
-    if model is None:
+    pipeline = train_model(X_train, y_train)
+    if pipeline is None:
         return
 
     # Evaluate the model
-    evaluate_model(model, X_test, y_test)
+    evaluate_model(pipeline, X_test, y_test)
 
 if __name__ == "__main__":
-    main()
+    import sys
+
+    # python donation_model.py            evaluate the enhanced model
+    # python donation_model.py --publish  train, verify and publish the pipeline, scorer and lookup table
+    # python donation_model.py --check    verify the published artifacts against a fresh fit
+    if '--publish' in sys.argv[1:]:
+        sys.exit(0 if publish_serving_model() else 1)
+    elif '--check' in sys.argv[1:]:
+        sys.exit(0 if check_published_model() else 1)
+    else:
+        main()
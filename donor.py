@@ -1,33 +1,30 @@
 import streamlit as st
 from datetime import datetime, date
+import bulk_import
 import database as db
+import donor_ids
+import geo
+import compatibility
+import pagination
+import search
 import pandas as pd
-import sqlite3 as sql
+
+# function to fetch a donor's record by id, or else by donor ID (an old P-ddmmyy-xxxxxx ID is
+# followed to the ULID it was migrated to), with single index lookups (None if not found);
+# repeated lookups are answered from the size-bounded query cache until donor_record is written
+def fetch_donor(donor_id):
+    rows = db.cached_query(db.DONOR_BY_ID_QUERY, (donor_id,))
+    if not rows:
+        rows = db.cached_query(db.DONOR_BY_VERIFICATION_ID_QUERY, (donor_ids.resolve(donor_id),))
+    return rows[0] if rows else None
 
 # function to verify patient id
 def verify_donor_id(donor_id):
-    verify = False
-    conn, c = db.connection()
-    with conn:
-        c.execute(
-            """
-            SELECT id
-            FROM donor_record;
-            """
-        )
-    for id in c.fetchall():
-        if id[0] == donor_id:
-            verify = True
-            break
-    conn.close()
-    return verify
+    return fetch_donor(donor_id) is not None
 
-# function to generate unique patient id 
+# function to generate unique, time-ordered donor id (see donor_ids.py)
 def generate_donor_id(reg_date, reg_time,):
-    id_1 = datetime.now().strftime('%d%m%y')  
-    id_2 = str(hash(datetime.now()))[-6:]  # Uses last 6 digits of the hash as a unique identifier
-    id = f'P-{id_1}-{id_2}'
-    return id
+    return donor_ids.new_donor_id()
 
 # function to calculate age using given date of birth
 def calculate_age(dob):
@@ -59,55 +56,8 @@ def show_donor_details(list_of_donors):
 class Donor:
 
     def __init__(self):
-        # Add custom CSS for input and output styling
-        st.markdown("""
-            <style>
-            /* Style for text inputs */
-            .stTextInput input, .stTextArea textarea {
-                color: white !important;
-            }
-            
-            /* Style for date input */
-            .stDateInput input {
-                color: white !important;
-            }
-            
-            /* Style for radio buttons */
-            .stRadio label {
-                color: black !important;
-            }
-            
-            /* Style for selectbox */
-            .stSelectbox div[data-baseweb="select"] span {
-                color: white !important;
-            }
-            
-            /* Style for number inputs */
-            .stNumberInput input {
-                color: white !important;
-            }
-
-            /* Style for output text */
-            .dataframe {
-                color: black !important;
-            }
-            
-            /* Style for success/info messages */
-            .stSuccess, .stInfo {
-                color: black !important;
-            }
-            
-            /* Style for verification messages */
-            .element-container div {
-                color: black !important;
-            }
-            
-            /* Style for displayed data */
-            .stMarkdown p {
-                color: black !important;
-            }
-            </style>
-        """, unsafe_allow_html=True)
+        # the input and output styling is resources.STYLES['donor_form'], injected
+        # by the page handlers on every rerun; the instance lives for the session
         
         self.name = str()
         self.id = str()
@@ -185,33 +135,30 @@ class Donor:
                         'reg_time': self.time_of_registration
                     }
                 )
+            db.notify_write('donor_record')
             st.success('Donor details saved successfully!')
             st.write('Your Donor ID is: ', self.id)
-            conn.close()
+
+    # method to register donors in bulk from a CSV or Excel file
+    def import_donors(self):
+        st.write('Rows without a verification_id get one generated, as when a donor is registered here.')
+        bulk_import.render_import('donors')
 
     # method to update an existing patient record in the database
     def update_donor(self):
         id = st.text_input('Enter ID of the Donor to be updated')
+        donor = fetch_donor(id) if id != '' else None
         if id == '':
             st.empty()
-        elif not verify_donor_id(id):
+        elif donor is None:
             st.error('Invalid Donor ID!')
         else:
             st.success('Verified')
             conn, c = db.connection()
 
             # shows the current details of the patient before updating
-            with conn:
-                c.execute(
-                    """
-                    SELECT *
-                    FROM donor_record
-                    WHERE id = :id;
-                    """,
-                    { 'id': id }
-                )
-                st.write('Here are the current details of the donor:')
-                show_donor_details(c.fetchall())
+            st.write('Here are the current details of the donor:')
+            show_donor_details([donor])
 
             st.write('Enter new details of the donor:')
             self.contact_number_1 = st.text_input('Contact number')
@@ -223,20 +170,10 @@ class Donor:
 
             # executing SQLite statements to update this patient's record in the database
             if update:
-                with conn:
-                    c.execute(
-                        """
-                        SELECT date_of_birth
-                        FROM donor_record
-                        WHERE id = :id;
-                        """,
-                        { 'id': id }
-                    )
-
-                    # converts date of birth to the required format for age calculation
-                    dob = [int(d) for d in c.fetchone()[0].split('-')[::-1]]
-                    dob = date(dob[0], dob[1], dob[2])
-                    self.age = calculate_age(dob)
+                # converts date of birth to the required format for age calculation
+                dob = [int(d) for d in donor['date_of_birth'].split('-')[::-1]]
+                dob = date(dob[0], dob[1], dob[2])
+                self.age = calculate_age(dob)
 
                 with conn:
                     c.execute(
@@ -254,15 +191,16 @@ class Donor:
                             'state': self.state, 'pin': self.pin_code,
                         }
                     )
+                db.notify_write('donor_record')
                 st.success('Donor details updated successfully.')
-                conn.close()
 
     # method to delete an existing patient record from the database
     def delete_donor(self):
         id = st.text_input('Enter ID of the donor to be deleted')
+        donor = fetch_donor(id) if id != '' else None
         if id == '':
             st.empty()
-        elif not verify_donor_id(id):
+        elif donor is None:
             st.error('Invalid Donor ID')
         else:
             st.success('Verified')
@@ -270,16 +208,8 @@ class Donor:
 
             # shows the current details of the patient before deletion
             with conn:
-                c.execute(
-                    """
-                    SELECT *
-                    FROM donor_record
-                    WHERE id = :id;
-                    """,
-                    { 'id': id }
-                )
                 st.write('Here are the details of the donor to be deleted:')
-                show_donor_details(c.fetchall())
+                show_donor_details([donor])
 
                 confirm = st.checkbox('**Check this box to confirm deletion**')
                 if confirm:
@@ -287,6 +217,14 @@ class Donor:
 
                     # executing SQLite statements to delete this patient's record from the database
                     if delete:
+                        # the donor's blood units stay in stock without a donor
+                        c.execute(
+                            """
+                            UPDATE blood_units SET donor_id = NULL
+                            WHERE donor_id = :id;
+                            """,
+                            { 'id': id }
+                        )
                         c.execute(
                             """
                             DELETE FROM donor_record
@@ -294,78 +232,113 @@ class Donor:
                             """,
                             { 'id': id }
                         )
+                        conn.commit()
+                        db.notify_write('donor_record', 'blood_units')
                         st.success('Donor details deleted successfully.')
-            conn.close()
 
     # method to show the complete patient record
     def show_all_donors(self):
-        conn, c = db.connection()
-        
+        col1, col2 = st.columns(2)
+        with col1:
+            sort = st.selectbox('Sort by', ['id', 'name'], format_func=str.title, key='donor_list_sort')
+        with col2:
+            blood_group = st.selectbox('Blood Group', ['All'] + compatibility.BLOOD_GROUPS, key='donor_list_group')
+
         try:
-            c.execute("SELECT * FROM donor_record")
-            donors = c.fetchall()
+            page = pagination.current_page(
+                'donors', 'donor_list', sort,
+                {'blood_group': None if blood_group == 'All' else blood_group}
+            )
             
-            if donors:
-                df = pd.DataFrame(donors, columns=['ID', 'Name', 'Age', 'Gender', 'Date_of_Birth', 
-                                                 'Blood_Group', 'Contact_Number_1', 'Verification_ID', 
-                                                 'Address', 'City', 'State', 'PIN_Code', 
-                                                 'Date_of_Registration', 'Time_of_Registration'])
+            if page['rows']:
+                df = pd.DataFrame(page['rows'])
+                df.columns = ['ID', 'Name', 'Age', 'Gender', 'Date_of_Birth', 
+                              'Blood_Group', 'Contact_Number_1', 'Verification_ID', 
+                              'Address', 'City', 'State', 'PIN_Code', 
+                              'Date_of_Registration', 'Time_of_Registration']
                 st.dataframe(df)
+                pagination.page_controls('donor_list', page)
             else:
                 st.info("No donors found in the database.")
                 
         except Exception as e:
             st.error(f"Error retrieving donors: {e}")
-        finally:
-            conn.close()
+
+    # method to list the donors most likely to donate, from the scores scoring.py precomputes
+    def show_top_donors(self, limit=20):
+        rows = db.cached_query(db.TOP_DONOR_SCORES_QUERY, (limit,))
+        if rows:
+            df = pd.DataFrame([tuple(row) for row in rows],
+                              columns=['ID', 'Name', 'Blood_Group', 'Contact_Number_1', 'Probability', 'Scored_At'])
+            st.dataframe(df)
+        else:
+            st.info("No donor scores yet. Run `python scoring.py` to score every donor.")
 
     # method to search and show a particular patient's details in the database using patient id
     def search_donor(self):
-        id = st.text_input('Enter ID of the donor to be searched')
-        if id == '':
+        text = st.text_input('Search by donor ID, name, address or city')
+        # an exact donor ID shows that donor's record, anything else is a full-text search
+        donor = fetch_donor(text.strip()) if text != '' else None
+        if text == '':
             st.empty()
-        elif not verify_donor_id(id):
-            st.error('Invalid Donor ID')
-        else:
+        elif donor is not None:
             st.success('Verified')
-            conn, c = db.connection()
-            with conn:
-                c.execute(
-                    """
-                    SELECT *
-                    FROM donor_record
-                    WHERE id = :id;
-                    """,
-                    { 'id': id }
-                )
-                st.write('Here are the details of the donor you searched for:')
-                show_donor_details(c.fetchall())
-            conn.close()
+            st.write('Here are the details of the donor you searched for:')
+            show_donor_details([donor])
+        else:
+            donors = search.search('donors', text)
+            if donors:
+                st.write(f'Closest matches ({len(donors)}):')
+                st.dataframe(pd.DataFrame(donors))
+            else:
+                st.error('No donor matches your search')
 
-    def find_nearby_donors(self, city, blood_group):
-        conn = sql.connect('database_1A.db')
-        c = conn.cursor()
+    def find_nearby_donors(self, location, blood_group, radius_km=25, include_compatible=True):
+        conn, c = db.connection()
         
         try:
-            # Query to fetch donors based on city and blood group
-            query = """
-            SELECT id, name, blood_group, contact_number_1, address 
-            FROM donor_record 
-            WHERE LOWER(city) = LOWER(?) 
-            AND blood_group = ?
-            """
-            
-            c.execute(query, (city, blood_group))
-            donors = c.fetchall()
+            # donors whose red cells the patient can receive, exact group first
+            if include_compatible:
+                blood_groups = compatibility.compatible_groups(blood_group)
+            else:
+                blood_groups = [blood_group]
+
+            # a known PIN code gives a proximity search, anything else is matched as a city
+            centre = geo.locate(location)
+            if centre is not None:
+                nearest = geo.nearest_donors(centre[0], centre[1], blood_groups, radius_km)
+                donors = [
+                    (d['id'], d['name'], d['blood_group'], d['contact_number_1'], d['address'],
+                     round(distance, 1))
+                    for distance, d in nearest
+                ]
+                columns = ['ID', 'Name', 'Blood Group', 'Contact', 'Address', 'Distance (km)']
+                where = f"within {radius_km} km of {location}"
+            else:
+                # Query to fetch donors based on city and blood group
+                c.execute(db.donors_in_city_query(blood_groups), (location,) + tuple(blood_groups))
+                donors = c.fetchall()
+                columns = ['ID', 'Name', 'Blood Group', 'Contact', 'Address']
+                where = f"in {location}"
             
+            matching = f"compatible with {blood_group}" if include_compatible else f"with blood group {blood_group}"
             if donors:
-                df = pd.DataFrame(donors, columns=['ID', 'Name', 'Blood Group', 'Contact', 'Address'])
+                df = pd.DataFrame(donors, columns=columns)
                 st.dataframe(df, hide_index=True)
-                st.success(f"Found {len(donors)} donor(s) in {city} with blood group {blood_group}")
+                st.success(f"Found {len(donors)} donor(s) {where} {matching}")
             else:
-                st.info(f"No donors found in {city} with blood group {blood_group}")
+                st.info(f"No donors found {where} {matching}")
+
+            # donors with a PIN code the postal code table lacks have no distance to rank by
+            if centre is not None:
+                unplaced = geo.ungeocoded_donors(blood_groups)
+                if unplaced:
+                    st.warning(f"{len(unplaced)} donor(s) {matching} could not be placed on the map because "
+                               f"their PIN code is not in the postal code table:")
+                    st.dataframe(pd.DataFrame(
+                        [tuple(d)[:7] for d in unplaced],
+                        columns=['ID', 'Name', 'Blood Group', 'Contact', 'Address', 'City', 'PIN Code']
+                    ), hide_index=True)
                 
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
-        finally:
-            conn.close()
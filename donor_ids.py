@@ -0,0 +1,175 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+import database as db
+
+# Donor ID generator.
+#
+# Donor IDs (donor_record.verification_id) are ULIDs: a 48-bit millisecond
+# timestamp followed by 80 random bits, written as 26 Crockford base32
+# characters, so IDs sort in the order they were made. Within a process IDs
+# are strictly increasing: an ID made in the same millisecond as the last one
+# (or after the clock stepped back) is the last one plus one. Each new
+# millisecond draws fresh randomness, which is what keeps IDs from different
+# worker processes apart without any coordination; a forked child starts
+# over with fresh randomness instead of continuing its parent's sequence.
+#
+# New IDs land at the right-hand end of the verification_id index instead of
+# anywhere in it, as the old P-ddmmyy-xxxxxx IDs (the last 6 digits of a
+# per-process randomized hash) did; benchmarks/donor_id_benchmark.py
+# measures the difference. Existing P- IDs are rewritten to ULIDs carrying
+# their registration time by migrate_legacy_ids, and donor_id_aliases maps
+# every old ID to its new one, so donor lookups (donor.fetch_donor) still find
+# a donor by the old ID:
+#
+#     python donor_ids.py migrate-legacy [--dry-run]
+#     python donor_ids.py resolve P-061224-945910
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+ID_LENGTH = 26
+RANDOM_BITS = 80
+
+LEGACY_ID = re.compile(r'P-\d{6}-\d{6}')
+# legacy IDs rewritten per transaction
+MIGRATE_BATCH_SIZE = 1000
+
+# every pair of characters, indexed by the 10 bits they encode, so encode
+# makes 13 lookups instead of 26 divmods
+_PAIRS = [first + second for first in ALPHABET for second in ALPHABET]
+_PAIR_SHIFTS = range((ID_LENGTH - 2) * 5, -1, -10)
+
+def encode(value):
+    """A 128-bit ULID value as 26 Crockford base32 characters"""
+    return ''.join([_PAIRS[(value >> shift) & 1023] for shift in _PAIR_SHIFTS])
+
+def decode(donor_id):
+    """The 128-bit value of a ULID string (case-insensitive)"""
+    value = 0
+    for char in donor_id.upper():
+        value = value * 32 + ALPHABET.index(char)
+    return value
+
+def id_time(donor_id):
+    """When a ULID donor ID was made, as a UTC datetime"""
+    return datetime.fromtimestamp((decode(donor_id) >> RANDOM_BITS) / 1000, timezone.utc)
+
+class DonorIdGenerator:
+    """Thread-safe source of strictly increasing ULIDs"""
+
+    def __init__(self, clock=time.time_ns, randomness=os.urandom):
+        self.clock = clock
+        self.randomness = randomness
+        self._lock = threading.Lock()
+        self._last = None
+
+    def reset(self):
+        """Forget the last ID, so the next one draws fresh randomness"""
+        with self._lock:
+            self._last = None
+
+    def _next(self):
+        now = self.clock() // 1000000
+        if self._last is not None and now <= self._last >> RANDOM_BITS:
+            # same millisecond, or the clock went back: count on from the last ID;
+            # a full random part carries into the timestamp
+            self._last += 1
+        else:
+            self._last = (now << RANDOM_BITS) | int.from_bytes(self.randomness(RANDOM_BITS // 8), 'big')
+        return self._last
+
+    def new_id(self):
+        with self._lock:
+            return encode(self._next())
+
+    def new_ids(self, count):
+        """count consecutive IDs, e.g. for a bulk import"""
+        with self._lock:
+            return [encode(self._next()) for _ in range(count)]
+
+_generator = DonorIdGenerator()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_generator.reset)
+
+def new_donor_id():
+    """A new donor ID from this process's generator"""
+    return _generator.new_id()
+
+def new_donor_ids(count):
+    """count new donor IDs from this process's generator"""
+    return _generator.new_ids(count)
+
+def legacy_to_ulid(legacy_id, date_of_registration=None, time_of_registration=None):
+    """
+    The ULID a P-ddmmyy-xxxxxx ID is migrated to: its registration time, or
+    the date in the ID when that is missing, followed by 80 bits of the
+    SHA-256 of the old ID, so migrating twice gives the same ID
+    """
+    try:
+        registered = datetime.strptime(f'{date_of_registration} {time_of_registration}', '%d-%m-%Y %H:%M:%S')
+    except (TypeError, ValueError):
+        registered = datetime.strptime(legacy_id[2:8], '%d%m%y')
+    # the app records registration times in the server's local time; new IDs
+    # carry UTC milliseconds, so convert before encoding
+    millis = int(registered.astimezone(timezone.utc).timestamp() * 1000)
+    digest = int.from_bytes(hashlib.sha256(legacy_id.encode()).digest()[:RANDOM_BITS // 8], 'big')
+    return encode((millis << RANDOM_BITS) | digest)
+
+def migrate_legacy_ids(conn=None, batch_size=MIGRATE_BATCH_SIZE, dry_run=False):
+    """
+    Rewrite every P-ddmmyy-xxxxxx verification_id to a ULID, recording the
+    old ID in donor_id_aliases; returns the number of donors changed (or, with
+    dry_run, that would change)
+    """
+    conn = conn or db.get_db_connection()
+    # the range is read through the verification_id index, and a rewritten ID leaves it
+    select = """
+        SELECT rowid, verification_id, date_of_registration, time_of_registration
+        FROM donor_record
+        WHERE verification_id >= 'P-' AND verification_id < 'P.'
+          AND verification_id GLOB 'P-[0-9][0-9][0-9][0-9][0-9][0-9]-[0-9][0-9][0-9][0-9][0-9][0-9]'
+        LIMIT ?
+    """
+    if dry_run:
+        return len(conn.execute(select, (-1,)).fetchall())
+    migrated = 0
+    while True:
+        with conn:
+            rows = conn.execute(select, (batch_size,)).fetchall()
+            if not rows:
+                break
+            new_ids = [(legacy_to_ulid(old_id, reg_date, reg_time), rowid, old_id)
+                       for rowid, old_id, reg_date, reg_time in rows]
+            conn.executemany("INSERT OR REPLACE INTO donor_id_aliases (legacy_id, verification_id) VALUES (?, ?)",
+                             [(old_id, new_id) for new_id, _, old_id in new_ids])
+            conn.executemany("UPDATE donor_record SET verification_id = ? WHERE rowid = ?",
+                             [(new_id, rowid) for new_id, rowid, _ in new_ids])
+        migrated += len(rows)
+    if migrated:
+        db.notify_write('donor_record', 'donor_id_aliases')
+    return migrated
+
+def resolve(donor_id, conn=None):
+    """The current verification_id for a donor ID, following a legacy ID to its ULID"""
+    if not LEGACY_ID.fullmatch(donor_id):
+        return donor_id
+    conn = conn or db.get_db_connection()
+    row = conn.execute("SELECT verification_id FROM donor_id_aliases WHERE legacy_id = ?", (donor_id,)).fetchone()
+    return row[0] if row else donor_id
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) >= 2 and sys.argv[1] == 'migrate-legacy' and sys.argv[2:] in ([], ['--dry-run']):
+        dry_run = sys.argv[2:] == ['--dry-run']
+        count = migrate_legacy_ids(dry_run=dry_run)
+        print(f"{count} legacy donor IDs {'would be' if dry_run else 'were'} migrated")
+    elif len(sys.argv) == 3 and sys.argv[1] == 'resolve':
+        print(resolve(sys.argv[2]))
+    elif len(sys.argv) in (2, 3) and sys.argv[1] == 'new':
+        print('\n'.join(new_donor_ids(int(sys.argv[2]) if len(sys.argv) == 3 else 1)))
+    else:
+        print("usage: python donor_ids.py migrate-legacy [--dry-run] | resolve ID | new [COUNT]")
+        sys.exit(1)
@@ -0,0 +1,155 @@
+import json
+import logging
+import threading
+import time
+from datetime import date, timedelta
+import database as db
+
+# Expiry sweeper.
+#
+# Moves units whose expiry_date has passed from Available (or Reserved) to
+# Expired, so reads do not have to filter by date. A request is approved with
+# all of its units at once (see allocation.py), so when a reserved unit
+# expires its request goes back to Pending and its other reserved units back
+# to stock, and the next allocation run fills it again. Work is done in small
+# batches, each in its own short transaction found through the
+# (status, expiry_date) index, so the sweeper never holds the write lock for
+# long. It also logs a warning for stock that expires within WARN_DAYS days.
+#
+# Run it once or on an interval from the command line
+#     python expiry_sweeper.py [--once] [--interval SECONDS]
+# or in-process with start_sweeper(), as the app does.
+
+logger = logging.getLogger(__name__)
+
+EXPIRABLE_STATUSES = ('Available', 'Reserved')
+BATCH_SIZE = 500
+WARN_DAYS = 3
+INTERVAL = 3600
+
+# every unit still reserved for those of the given requests (a JSON array)
+# that are Approved: expired ones become Expired and the rest Available again.
+# Units of a Completed or Cancelled request stay with it.
+RELEASE_REQUEST_UNITS_SQL = """
+    UPDATE blood_units
+    SET status = CASE WHEN expiry_date < ? THEN 'Expired' ELSE 'Available' END, request_id = NULL
+    WHERE status = 'Reserved' AND request_id IN (
+        SELECT request_id FROM blood_requests
+        WHERE request_id IN (SELECT value FROM json_each(?)) AND status = 'Approved')
+"""
+
+REQUEUE_REQUESTS_SQL = """
+    UPDATE blood_requests SET status = 'Pending'
+    WHERE request_id IN (SELECT value FROM json_each(?)) AND status = 'Approved'
+"""
+
+def sweep(conn=None, today=None, batch_size=BATCH_SIZE, pause=0.01):
+    """
+    Mark every expired unit as Expired in batches, putting the requests whose
+    reserved units expired back to Pending; return the number of units changed
+    """
+    conn = conn or db.get_db_connection()
+    today = (today or date.today()).isoformat()
+    swept = requeued = 0
+    for status in EXPIRABLE_STATUSES:
+        while True:
+            conn.execute("BEGIN IMMEDIATE;")
+            try:
+                rows = conn.execute(db.EXPIRED_UNITS_BATCH_QUERY, (status, today, batch_size)).fetchall()
+                ids = [row[0] for row in rows]
+                requests = sorted({row[1] for row in rows if row[1] is not None})
+                if status == 'Reserved' and requests:
+                    # rare, so reading the requests' units through the status index is fine
+                    conn.execute(RELEASE_REQUEST_UNITS_SQL, (today, json.dumps(requests)))
+                    requeued += conn.execute(REQUEUE_REQUESTS_SQL, (json.dumps(requests),)).rowcount
+                conn.executemany(
+                    "UPDATE blood_units SET status = 'Expired' WHERE unit_id = ? AND status = ?",
+                    [(unit_id, status) for unit_id in ids]
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if ids:
+                db.notify_write('blood_units', 'blood_requests')
+            swept += len(ids)
+            if len(ids) < batch_size:
+                break
+            # let other writers in between batches
+            time.sleep(pause)
+    if requeued:
+        logger.warning("%d approved request(s) lost an expired unit and are Pending again", requeued)
+    return swept
+
+def near_expiry(days=WARN_DAYS, conn=None, today=None):
+    """Return (blood type, bank id, units, first expiry date) for available stock expiring within days"""
+    conn = conn or db.get_db_connection()
+    today = today or date.today()
+    return [tuple(row) for row in conn.execute(
+        db.NEAR_EXPIRY_QUERY, (today.isoformat(), (today + timedelta(days=days)).isoformat())
+    )]
+
+def run_once(warn_days=WARN_DAYS, batch_size=BATCH_SIZE):
+    """Sweep expired units and log near-expiry warnings; return (units expired, warnings)"""
+    swept = sweep(batch_size=batch_size)
+    if swept:
+        logger.info("marked %d blood unit(s) as Expired", swept)
+    warnings = near_expiry(warn_days)
+    for blood_type, bank_id, units, first_expiry in warnings:
+        logger.warning("%d unit(s) of %s at bank %s expire by %s", units, blood_type, bank_id, first_expiry)
+    return swept, warnings
+
+class ExpirySweeper(threading.Thread):
+    """Background thread that calls run_once() every interval seconds until stopped"""
+
+    def __init__(self, interval=INTERVAL, warn_days=WARN_DAYS, batch_size=BATCH_SIZE):
+        super().__init__(name='expiry-sweeper', daemon=True)
+        self.interval = interval
+        self.warn_days = warn_days
+        self.batch_size = batch_size
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                run_once(self.warn_days, self.batch_size)
+            except Exception:
+                logger.exception("expiry sweep failed")
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+def start_sweeper(interval=INTERVAL, warn_days=WARN_DAYS):
+    """Start the process-wide sweeper thread if it is not already running"""
+    global _sweeper
+    with _sweeper_lock:
+        if _sweeper is None or not _sweeper.is_alive():
+            _sweeper = ExpirySweeper(interval, warn_days)
+            _sweeper.start()
+        return _sweeper
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mark expired blood units and warn about stock close to expiry")
+    parser.add_argument('--once', action='store_true', help="sweep once and exit")
+    parser.add_argument('--interval', type=float, default=INTERVAL, help="seconds between sweeps")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="units per transaction")
+    parser.add_argument('--warn-days', type=int, default=WARN_DAYS, help="warn about units expiring within this many days")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    if args.once:
+        run_once(args.warn_days, args.batch_size)
+    else:
+        sweeper = ExpirySweeper(args.interval, args.warn_days, args.batch_size)
+        sweeper.start()
+        try:
+            while sweeper.is_alive():
+                sweeper.join(1)
+        except KeyboardInterrupt:
+            sweeper.stop()
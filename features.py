@@ -0,0 +1,41 @@
+# Feature engineering for the donor eligibility model.
+#
+# Lives in its own module so the persisted pipeline pickles a stable
+# reference (features.engineer_features) whether it was built from the
+# donation_model CLI or from the app.
+
+import os
+
+import numpy as np
+
+# the fitted sklearn pipeline training publishes, and the plain arrays
+# exported from it that the registry serves (see numpy_scorer); both live
+# next to the code, whatever the working directory
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+PIPELINE_PATH = os.path.join(MODEL_DIR, 'donation_pipeline.joblib')
+SCORER_PATH = os.path.join(MODEL_DIR, 'donation_scorer.npz')
+
+# the four raw inputs the eligibility form collects, in model order
+FEATURES = ['Recency (months)', 'Frequency (times)', 'Monetary (c.c. blood)', 'Time (months)']
+
+# raw inputs followed by the derived columns engineer_features appends
+ENGINEERED_FEATURES = FEATURES + [
+    'recency_frequency',
+    'monetary_time',
+    'Monetary (c.c. blood)_log',
+    'Time (months)_log',
+]
+
+
+def engineer_features(X):
+    """Append interaction and log features to raw (recency, frequency, monetary, time) rows."""
+    X = np.asarray(X, dtype=np.float64)
+    recency, frequency, monetary, months = X[:, 0], X[:, 1], X[:, 2], X[:, 3]
+    return np.column_stack([
+        X,
+        recency * frequency,
+        monetary * months,
+        # skewed, non-negative inputs: log before scaling so log1p never sees values below -1
+        np.log1p(monetary),
+        np.log1p(months),
+    ])
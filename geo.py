@@ -0,0 +1,160 @@
+import csv
+import math
+import database as db
+
+# Nearest-donor search.
+#
+# Donors are located by the centroid of their PIN code. The centroids live in
+# the postal_codes table, bucketed into grid cells (geo_cell), and triggers copy
+# a donor's centroid onto donor_record whenever the PIN code is set, see
+# database._m004_donor_locations. The bundled postal_codes.csv only covers the
+# areas the app has been used in; a complete table (e.g. a GeoNames postal code
+# dump) can be loaded with `python geo.py load-postal-codes FILE`. Donors whose
+# PIN code is not in the table have no coordinates: a proximity search reports
+# them separately instead of leaving them out, and
+# `python geo.py ungeocoded` lists the PIN codes that are missing.
+#
+# A search turns its radius into the grid-cell ranges it overlaps (one
+# contiguous range of geo_cell values per latitude row), ranks the centroids in
+# those cells by great-circle distance, and then reads donors from the nearest
+# centroids outwards through the (blood_group, latitude, longitude, age) index,
+# with one query per centroid covering every acceptable blood group. The work
+# depends on the number of PIN codes in the radius, not on the number of donors.
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LATITUDE = 111.32
+
+# donors outside this age range are not eligible to donate
+ELIGIBLE_AGE = (18, 65)
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def locate(pin_code):
+    """Return the (latitude, longitude) centroid of a PIN code, or None if unknown"""
+    rows = db.execute_query(
+        "SELECT latitude, longitude FROM postal_codes WHERE pin_code = ?",
+        (pin_code.strip(),),
+        fetch=True
+    )
+    return (rows[0][0], rows[0][1]) if rows else None
+
+def cell_ranges(latitude, longitude, radius_km):
+    """Return the inclusive geo_cell ranges, one per latitude row, covering a circle"""
+    size = db.GEO_CELL_DEGREES
+    lat_span = radius_km / KM_PER_DEGREE_LATITUDE
+    # longitude degrees shrink towards the poles; use the widest row of the circle
+    widest = min(abs(latitude) + lat_span, 89.9)
+    lon_span = min(radius_km / (KM_PER_DEGREE_LATITUDE * math.cos(math.radians(widest))), 180)
+
+    first_row = int((max(latitude - lat_span, -90) + 90) / size)
+    last_row = int((min(latitude + lat_span, 90 - size / 2) + 90) / size)
+    first_col = max(int((longitude - lon_span + 180) / size), 0)
+    last_col = min(int((longitude + lon_span + 180) / size), db.GEO_CELLS_PER_ROW - 1)
+
+    return [
+        (row * db.GEO_CELLS_PER_ROW + first_col, row * db.GEO_CELLS_PER_ROW + last_col)
+        for row in range(first_row, last_row + 1)
+    ]
+
+def nearest_centroids(latitude, longitude, radius_km):
+    """Return [(distance in km, latitude, longitude)] of PIN-code centroids within the radius, nearest first"""
+    conn, c = db.connection()
+    centroids = set()
+    for low, high in cell_ranges(latitude, longitude, radius_km):
+        c.execute(db.CENTROIDS_IN_CELLS_QUERY, (low, high))
+        centroids.update((row[0], row[1]) for row in c)
+
+    ranked = []
+    for lat, lon in centroids:
+        distance = haversine_km(latitude, longitude, lat, lon)
+        if distance <= radius_km:
+            ranked.append((distance, lat, lon))
+    ranked.sort()
+    return ranked
+
+def nearest_donors(latitude, longitude, blood_groups, radius_km=25.0, k=20):
+    """
+    Find the k best eligible donors within radius_km of a point
+
+    blood_groups is in order of preference (see compatibility.compatible_groups);
+    donors are ranked by that preference first and distance second. Returns a
+    list of (distance in km, donor row).
+    """
+    conn, c = db.connection()
+    query = db.donors_at_location_query(blood_groups)
+    candidates = []
+    exact = 0
+    for distance, lat, lon in nearest_centroids(latitude, longitude, radius_km):
+        c.execute(query, tuple(blood_groups) + (lat, lon) + ELIGIBLE_AGE + (k,))
+        for donor in c:
+            candidates.append((donor['preference'], distance, donor['id'], donor))
+            exact += donor['preference'] == 0
+        # centroids come nearest first, so k most-preferred donors cannot be beaten
+        if exact >= k:
+            break
+    candidates.sort(key=lambda candidate: candidate[:3])
+    return [(distance, donor) for _, distance, _, donor in candidates[:k]]
+
+def ungeocoded_donors(blood_groups):
+    """Eligible donors of any of blood_groups that a proximity search cannot place, most preferred group first"""
+    return db.execute_query(db.ungeocoded_donors_query(blood_groups), tuple(blood_groups) + ELIGIBLE_AGE,
+                            fetch=True)
+
+def ungeocoded_pin_codes():
+    """Return [(PIN code, donors)] of donor PIN codes without a centroid in postal_codes, most donors first"""
+    return db.execute_query("""
+        SELECT TRIM(pin_code), COUNT(*)
+        FROM donor_record
+        WHERE latitude IS NULL
+        GROUP BY TRIM(pin_code)
+        ORDER BY COUNT(*) DESC, TRIM(pin_code)
+    """, fetch=True)
+
+def load_postal_codes(path):
+    """
+    Load PIN code centroids into postal_codes and re-geocode every donor
+
+    Accepts either a CSV with pin_code, latitude, longitude[, place] columns or
+    a tab-separated GeoNames postal code dump.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            rows = [
+                {'pin_code': r['pin_code'], 'latitude': float(r['latitude']),
+                 'longitude': float(r['longitude']), 'place': r.get('place')}
+                for r in csv.DictReader(f)
+            ]
+        else:
+            # GeoNames: country, postal code, place, admin1..admin3 (name, code), lat, lon, accuracy
+            rows = [
+                {'pin_code': r[1], 'latitude': float(r[9]), 'longitude': float(r[10]), 'place': r[2]}
+                for r in csv.reader(f, delimiter='\t')
+            ]
+
+    conn = db.get_db_connection()
+    with conn:
+        conn.executemany(db.INSERT_POSTAL_CODE_SQL, rows)
+        conn.execute(db.GEOCODE_DONOR_SQL.format(where='1'))
+    db.notify_write('postal_codes', 'donor_record')
+    return len(rows)
+
+if __name__ == "__main__":
+    import sys
+
+    # python geo.py load-postal-codes FILE
+    # python geo.py ungeocoded
+    if len(sys.argv) == 3 and sys.argv[1] == 'load-postal-codes':
+        print(f"loaded {load_postal_codes(sys.argv[2])} postal codes")
+    elif sys.argv[1:] == ['ungeocoded']:
+        missing = ungeocoded_pin_codes()
+        for pin_code, donors in missing:
+            print(f"{pin_code or '(blank)'}\t{donors} donor(s)")
+        print(f"{sum(donors for _, donors in missing)} donor(s) in {len(missing)} PIN code(s) have no coordinates")
+    else:
+        print("usage: python geo.py load-postal-codes FILE | ungeocoded")
+        sys.exit(1)
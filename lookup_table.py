@@ -0,0 +1,95 @@
+# Precomputed eligibility scores over the form's bounded input domain.
+#
+# The form limits recency to 0-100, frequency to 0-100, monetary to 0-25000 in
+# steps of 250 and time to 0-200. A full table of that grid would hold ~207M
+# probabilities (~800 MB even as float32), but the model's score is a sum of a
+# (recency, frequency) term and a (monetary, time) term - no engineered feature
+# mixes the two pairs - so two small tables of partial scores cover the whole
+# domain exactly: 101 x 101 + 101 x 201 float64 values (~240 KB). They are
+# stored in one .npy file that is memory-mapped, so an in-range query is two
+# array reads and a sigmoid. Out-of-range queries go to the live scorer.
+
+import math
+import os
+import numpy as np
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'donation_lookup.npy')
+
+RECENCY_MAX = 100
+FREQUENCY_MAX = 100
+MONETARY_MAX = 25000
+MONETARY_STEP = 250
+TIME_MAX = 200
+
+# sizes of the two partial-score tables, stored one after the other
+RF_SHAPE = (RECENCY_MAX + 1, FREQUENCY_MAX + 1)
+MT_SHAPE = (MONETARY_MAX // MONETARY_STEP + 1, TIME_MAX + 1)
+
+# largest probability difference from the scorer allowed on the check sample
+TOLERANCE = 1e-9
+
+
+def _grid(first, second):
+    a, b = np.meshgrid(first, second, indexing='ij')
+    return a.ravel(), b.ravel()
+
+
+def build(scorer):
+    """Compute the partial-score tables for a numpy_scorer.LogisticScorer"""
+    recency, frequency = _grid(np.arange(RF_SHAPE[0]), np.arange(RF_SHAPE[1]))
+    monetary, months = _grid(np.arange(MT_SHAPE[0]) * MONETARY_STEP, np.arange(MT_SHAPE[1]))
+    zeros_rf, zeros_mt = np.zeros(len(recency)), np.zeros(len(monetary))
+
+    # score(r, f, m, t) = score(r, f, 0, 0) + score(0, 0, m, t) - score(0, 0, 0, 0)
+    rf = scorer.decision_function(np.column_stack([recency, frequency, zeros_rf, zeros_rf]))
+    mt = scorer.decision_function(np.column_stack([zeros_mt, zeros_mt, monetary, months]))
+    mt -= scorer.decision_function(np.zeros((1, 4)))[0]
+    return np.concatenate([rf, mt])
+
+
+def save(path, table):
+    # through a file object: np.save would append .npy to a bare path
+    with open(path, 'wb') as f:
+        np.save(f, table)
+
+
+class ScoreTable:
+    """Memory-mapped partial-score tables answering in-range queries"""
+
+    def __init__(self, table):
+        split = RF_SHAPE[0] * RF_SHAPE[1]
+        if table.shape != (split + MT_SHAPE[0] * MT_SHAPE[1],):
+            raise ValueError(f"lookup table has shape {table.shape}")
+        self.rf = table[:split]
+        self.mt = table[split:]
+
+    @classmethod
+    def load(cls, path):
+        return cls(np.load(path, mmap_mode='r', allow_pickle=False))
+
+    def probability(self, recency, frequency, monetary, time):
+        """P(donates) from the tables, or None if the inputs are outside the precomputed grid"""
+        if not all(float(value).is_integer() for value in (recency, frequency, monetary, time)):
+            return None
+        recency, frequency, monetary, time = int(recency), int(frequency), int(monetary), int(time)
+        if not (0 <= recency <= RECENCY_MAX and 0 <= frequency <= FREQUENCY_MAX
+                and 0 <= monetary <= MONETARY_MAX and monetary % MONETARY_STEP == 0
+                and 0 <= time <= TIME_MAX):
+            return None
+        score = (self.rf[recency * RF_SHAPE[1] + frequency]
+                 + self.mt[monetary // MONETARY_STEP * MT_SHAPE[1] + time])
+        return 1.0 / (1.0 + math.exp(-score))
+
+
+def max_difference(table, scorer, samples=10000, seed=0):
+    """Largest probability difference between the table and the scorer on random in-range inputs"""
+    rng = np.random.default_rng(seed)
+    rows = np.column_stack([
+        rng.integers(0, RECENCY_MAX + 1, samples),
+        rng.integers(0, FREQUENCY_MAX + 1, samples),
+        rng.integers(0, MONETARY_MAX // MONETARY_STEP + 1, samples) * MONETARY_STEP,
+        rng.integers(0, TIME_MAX + 1, samples),
+    ])
+    expected = scorer.predict_proba(rows)[:, 1]
+    actual = np.array([table.probability(*row) for row in rows.tolist()])
+    return float(np.max(np.abs(actual - expected)))
@@ -0,0 +1,102 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+import database as db
+
+# Dashboard metrics.
+#
+# Every figure on the Home page comes from one DashboardSnapshot, computed in a
+# single read transaction so the numbers are consistent with each other. The
+# snapshot is cached for TTL seconds and recomputed early when this process
+# commits a write (see database.notify_write); writes from other processes
+# show up once the TTL runs out.
+
+TTL = 30.0
+
+@dataclass(frozen=True)
+class DashboardSnapshot:
+    total_donors: int
+    last_registration: str
+    blood_banks: int
+    locations: int
+    pending_requests: int
+    required_units: int
+    critical_groups: tuple
+    blood_group_counts: dict = field(default_factory=dict)
+    age_group_counts: dict = field(default_factory=dict)
+    taken_at: datetime = field(default_factory=datetime.now)
+
+def compute_snapshot(conn=None):
+    """Compute every dashboard figure inside one read transaction"""
+    conn = conn or db.get_db_connection()
+
+    def scalar(query):
+        return conn.execute(query).fetchone()[0]
+
+    # in WAL mode a read transaction sees one consistent version of the database
+    conn.execute("BEGIN;")
+    try:
+        last = conn.execute(
+            "SELECT date_of_registration FROM donor_record ORDER BY rowid DESC LIMIT 1"
+        ).fetchone()
+        snapshot = DashboardSnapshot(
+            total_donors=scalar("SELECT COUNT(*) FROM donor_record"),
+            last_registration=last[0] if last else "No registrations yet",
+            blood_banks=scalar("SELECT COUNT(*) FROM blood_banks"),
+            locations=scalar("SELECT COUNT(DISTINCT city) FROM blood_banks"),
+            pending_requests=scalar(db.PENDING_REQUESTS_COUNT_QUERY),
+            required_units=scalar(db.PENDING_UNITS_QUERY) or 0,
+            critical_groups=tuple(row[0] for row in conn.execute(db.CRITICAL_BLOOD_GROUPS_QUERY)),
+            blood_group_counts={
+                row[0]: row[1] for row in conn.execute("""
+                    SELECT blood_group, COUNT(*)
+                    FROM donor_record
+                    GROUP BY blood_group
+                    ORDER BY blood_group
+                """)
+            },
+            age_group_counts={
+                row[0]: row[1] for row in conn.execute("""
+                    SELECT
+                        CASE
+                            WHEN age < 25 THEN '18-24'
+                            WHEN age BETWEEN 25 AND 34 THEN '25-34'
+                            WHEN age BETWEEN 35 AND 44 THEN '35-44'
+                            WHEN age BETWEEN 45 AND 54 THEN '45-54'
+                            ELSE '55+'
+                        END as age_group,
+                        COUNT(*)
+                    FROM donor_record
+                    GROUP BY age_group
+                    ORDER BY age_group
+                """)
+            },
+        )
+    finally:
+        conn.rollback()
+    return snapshot
+
+_cached = None       # (snapshot, write version, expires at)
+_cache_lock = threading.Lock()
+
+def get_snapshot(ttl=TTL):
+    """Return the cached snapshot, recomputing it when expired or after a write"""
+    global _cached
+    now = time.monotonic()
+    version = db.write_version()
+    cached = _cached
+    if cached is not None and cached[1] == version and now < cached[2]:
+        return cached[0]
+    with _cache_lock:
+        cached = _cached
+        if cached is not None and cached[1] == version and now < cached[2]:
+            return cached[0]
+        snapshot = compute_snapshot()
+        _cached = (snapshot, version, now + ttl)
+        return snapshot
+
+def invalidate():
+    """Drop the cached snapshot so the next get_snapshot() recomputes it"""
+    global _cached
+    _cached = None
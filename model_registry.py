@@ -0,0 +1,214 @@
+# In-process registry for the donor eligibility model.
+#
+# The serving model (donation_scorer.npz, the NumPy export of the published
+# pipeline: imputation, feature engineering, scaling and the model) is loaded
+# and validated once per process instead of on every prediction. A cheap stat()
+# check, at most every CHECK_INTERVAL seconds, notices when
+# `python donation_model.py --publish` has written a new version; it is loaded
+# and validated off to the side and swapped in as a single reference. A broken
+# publish never replaces a working model. Training never happens here, and
+# neither sklearn nor joblib is imported.
+#
+# When the published lookup table (see lookup_table) agrees with the scorer it
+# is served alongside it: in-range form inputs are answered from the table and
+# anything else falls back to the scorer.
+
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+import numpy as np
+
+import features
+import lookup_table
+from numpy_scorer import LogisticScorer
+
+CHECK_INTERVAL = 5.0
+LATENCY_SAMPLES = 1000
+
+# a plausible donor used to smoke-test freshly loaded artifacts
+SMOKE_SAMPLE = [2, 5, 1250, 24]
+
+# in-range inputs compared against the scorer before a lookup table is served
+TABLE_CHECK_SAMPLES = 1000
+
+
+class ModelUnavailableError(RuntimeError):
+    """Raised when no valid serving model has been published."""
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """A validated scorer and where it came from."""
+    scorer: LogisticScorer
+    version: str
+    loaded_at: float
+    load_time_ms: float
+    signature: tuple = field(repr=False)
+    table: lookup_table.ScoreTable = field(default=None, repr=False)
+
+    # function to score one donor, returning (prediction, probability)
+    def predict(self, recency, frequency, monetary, time):
+        row = np.array([[recency, frequency, monetary, time]], dtype=np.float64)
+        probabilities = self.scorer.predict_proba(row)[0]
+        prediction = self.scorer.classes_[np.argmax(probabilities)]
+        return prediction, probabilities[1]
+
+    # function to answer one donor from the lookup table, or None when it cannot
+    def lookup(self, recency, frequency, monetary, time):
+        if self.table is None:
+            return None
+        probability = self.table.probability(recency, frequency, monetary, time)
+        if probability is None:
+            return None
+        # same tie-break as argmax over [1 - p, p]
+        return self.scorer.classes_[int(probability > 1.0 - probability)], probability
+
+    # function to score a 2-D array of raw rows in one vectorized call
+    def predict_many(self, rows):
+        probabilities = self.scorer.predict_proba(rows)
+        predictions = self.scorer.classes_[np.argmax(probabilities, axis=1)]
+        return predictions, probabilities[:, 1]
+
+
+# function to stat the artifact so an unchanged file is never re-read
+def _signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+# function to check that a loaded scorer can actually serve predictions
+def _validate(scorer):
+    n_features = len(features.FEATURES)
+    if scorer.n_features_in_ != n_features:
+        raise ValueError(f"scorer expects {scorer.n_features_in_} features, not {n_features}")
+    if len(features.ENGINEERED_FEATURES) != len(scorer.coef):
+        raise ValueError(f"scorer has {len(scorer.coef)} coefficients, "
+                         f"not {len(features.ENGINEERED_FEATURES)}")
+    probabilities = scorer.predict_proba(np.array([SMOKE_SAMPLE], dtype=np.float64))
+    if probabilities.shape != (1, 2) or not np.all(np.isfinite(probabilities)):
+        raise ValueError("scorer returned invalid probabilities")
+
+
+class ModelRegistry:
+    """Holds the current serving model and hot-swaps it when a new one is published."""
+
+    def __init__(self, path=features.SCORER_PATH, table_path=lookup_table.TABLE_PATH,
+                 check_interval=CHECK_INTERVAL):
+        self.path = path
+        self.table_path = table_path
+        self.check_interval = check_interval
+        self._current = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.stats = {'loads': 0, 'failed_loads': 0, 'predictions': 0, 'table_hits': 0,
+                      'last_error': None, 'table_error': None}
+
+    def _load_table(self, scorer):
+        # a missing, stale or broken table only disables the lookup mode
+        if not self.table_path or not os.path.exists(self.table_path):
+            return None
+        try:
+            table = lookup_table.ScoreTable.load(self.table_path)
+            difference = lookup_table.max_difference(table, scorer, samples=TABLE_CHECK_SAMPLES)
+            if difference > lookup_table.TOLERANCE:
+                raise ValueError(f"lookup table differs from the scorer by up to {difference:.3g}")
+        except Exception as e:
+            self.stats['table_error'] = str(e)
+            return None
+        self.stats['table_error'] = None
+        return table
+
+    def _load(self, signature):
+        start = time.perf_counter()
+        with open(self.path, 'rb') as f:
+            version = hashlib.sha256(f.read()).hexdigest()[:12]
+        scorer = LogisticScorer.load(self.path)
+        _validate(scorer)
+        table = self._load_table(scorer)
+        return LoadedModel(scorer=scorer, version=version,
+                           loaded_at=time.time(),
+                           load_time_ms=(time.perf_counter() - start) * 1000,
+                           signature=signature, table=table)
+
+    # function to reload the artifacts if they changed since the last check
+    def refresh(self, force=False):
+        now = time.monotonic()
+        current = self._current
+        if current is not None and not force and now - self._checked_at < self.check_interval:
+            return current
+
+        with self._lock:
+            current = self._current
+            if current is not None and not force and now - self._checked_at < self.check_interval:
+                return current
+            self._checked_at = now
+            try:
+                signature = _signature(self.path)
+            except OSError as e:
+                self.stats['last_error'] = str(e)
+                return current
+            if current is not None and current.signature == signature:
+                return current
+            try:
+                loaded = self._load(signature)
+            except Exception as e:
+                # keep serving the last good model
+                self.stats['failed_loads'] += 1
+                self.stats['last_error'] = str(e)
+                return current
+            self._current = loaded
+            self.stats['loads'] += 1
+            self.stats['last_error'] = None
+            return loaded
+
+    def get(self):
+        """Return the current model, loading or swapping it if needed."""
+        current = self.refresh()
+        if current is None:
+            raise ModelUnavailableError(
+                "No eligibility model is available ({}). Publish one with "
+                "`python donation_model.py --publish`.".format(self.stats['last_error']))
+        return current
+
+    def predict(self, recency, frequency, monetary, time_months):
+        """Score one donor and record the prediction latency."""
+        loaded = self.get()
+        start = time.perf_counter()
+        result = loaded.lookup(recency, frequency, monetary, time_months)
+        if result is None:
+            result = loaded.predict(recency, frequency, monetary, time_months)
+        else:
+            self.stats['table_hits'] += 1
+        self._latencies.append((time.perf_counter() - start) * 1000)
+        self.stats['predictions'] += 1
+        return result
+
+    def info(self):
+        """Version, load time and prediction latency of the serving model."""
+        current = self._current
+        latencies = np.array(self._latencies) if self._latencies else None
+        return {
+            'version': current.version if current else None,
+            'loaded_at': current.loaded_at if current else None,
+            'load_time_ms': current.load_time_ms if current else None,
+            'lookup_table': current is not None and current.table is not None,
+            'latency_ms_p50': float(np.percentile(latencies, 50)) if latencies is not None else None,
+            'latency_ms_p95': float(np.percentile(latencies, 95)) if latencies is not None else None,
+            **self.stats,
+        }
+
+
+registry = ModelRegistry()
+
+
+if __name__ == "__main__":
+    # python model_registry.py  load, validate and describe the published model
+    registry.get()
+    registry.predict(*SMOKE_SAMPLE)
+    for key, value in registry.info().items():
+        print(f"{key}: {value}")
@@ -0,0 +1,70 @@
+# Dependency-free inference for the eligibility pipeline.
+#
+# The published sklearn pipeline is imputation -> engineer_features ->
+# StandardScaler -> LogisticRegression, i.e. a handful of arrays. export()
+# copies those arrays into a small .npz file and LogisticScorer replays the
+# same arithmetic with NumPy alone, so the serving path never imports sklearn
+# or unpickles anything.
+
+import numpy as np
+
+import features
+
+# largest difference from the sklearn pipeline's predict_proba allowed at publish time
+TOLERANCE = 1e-9
+
+
+class LogisticScorer:
+    """NumPy replica of the published pipeline's predict_proba"""
+
+    def __init__(self, medians, means, scales, coef, intercept, classes):
+        self.medians = np.asarray(medians, dtype=np.float64)
+        self.means = np.asarray(means, dtype=np.float64)
+        self.scales = np.asarray(scales, dtype=np.float64)
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = len(self.medians)
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        """Copy the fitted arrays out of a donation_model pipeline"""
+        steps = pipeline.named_steps
+        return cls(medians=steps['imputer'].statistics_,
+                   means=steps['scaler'].mean_,
+                   scales=steps['scaler'].scale_,
+                   coef=steps['model'].coef_[0],
+                   intercept=steps['model'].intercept_[0],
+                   classes=steps['model'].classes_)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(**{name: arrays[name] for name in arrays.files})
+
+    def save(self, path):
+        # through a file object: np.savez would append .npz to a bare path
+        with open(path, 'wb') as f:
+            np.savez(f, medians=self.medians, means=self.means, scales=self.scales,
+                     coef=self.coef, intercept=np.float64(self.intercept), classes=self.classes_)
+
+    def transform(self, X):
+        """Imputed, engineered and scaled rows, as the pipeline's steps before the model"""
+        X = np.asarray(X, dtype=np.float64)
+        X = np.where(np.isnan(X), self.medians, X)
+        X = features.engineer_features(X)
+        return (X - self.means) / self.scales
+
+    def decision_function(self, X):
+        return self.transform(X) @ self.coef + self.intercept
+
+    def predict_proba(self, X):
+        # binary LogisticRegression: P(class 1) = expit(decision_function)
+        positive = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+        return np.column_stack([1.0 - positive, positive])
+
+
+def max_difference(scorer, pipeline, X):
+    """Largest absolute predict_proba difference between the scorer and the pipeline"""
+    X = np.asarray(X, dtype=np.float64)
+    return float(np.max(np.abs(scorer.predict_proba(X) - pipeline.predict_proba(X))))
@@ -0,0 +1,39 @@
+import streamlit as st
+import database as db
+
+# Page controls for keyset-paginated listings (see database.fetch_page).
+#
+# Each listing on screen keeps its current page token and page number in
+# st.session_state under its own key; changing the sort or filters starts
+# again from the first page.
+
+# function to return the current page of a listing for this session
+def current_page(listing, key, sort=None, filters=None, page_size=db.PAGE_SIZE, cached=False):
+    query = (sort, sorted((filters or {}).items()))
+    state = st.session_state.get(key)
+    if state is None or state['query'] != query:
+        state = st.session_state[key] = {'query': query, 'token': None, 'number': 1}
+
+    page = db.fetch_page(listing, sort, filters, page_size, state['token'], cached)
+    if not page['rows'] and state['token']:
+        # the boundary row's neighbours are gone; start over
+        state.update(token=None, number=1)
+        page = db.fetch_page(listing, sort, filters, page_size, None, cached)
+    return page
+
+def _turn(key, token, step):
+    st.session_state[key]['token'] = token
+    st.session_state[key]['number'] += step
+
+# function to show Previous / Next buttons for a page returned by current_page
+def page_controls(key, page):
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("◀ Previous", key=f"{key}_previous", disabled=page['previous'] is None,
+                  on_click=_turn, args=(key, page['previous'], -1))
+    with col2:
+        st.markdown(f"<p style='text-align: center; color: black;'>Page {st.session_state[key]['number']}</p>",
+                    unsafe_allow_html=True)
+    with col3:
+        st.button("Next ▶", key=f"{key}_next", disabled=page['next'] is None,
+                  on_click=_turn, args=(key, page['next'], 1))
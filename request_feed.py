@@ -0,0 +1,126 @@
+import json
+
+# Blood request feed.
+#
+# The feed used to be one st.markdown card per request, each carrying its own
+# inline style block, all resent on every rerun. It is now a single component:
+# the stylesheet is defined once here, the current window of requests (one
+# keyset page of WINDOW_ROWS rows, see database.fetch_page) is shipped as JSON
+# and a small script keeps only the cards inside the scroll viewport (plus a
+# few either side) in the DOM. The HTML sent and the DOM built stay the same
+# size however many requests there are; Previous / Next load the neighbouring
+# window.
+
+# requests shipped to the browser per window
+WINDOW_ROWS = 200
+
+# fixed card height (px, margin included) so a card's position is its index
+CARD_HEIGHT = 118
+VIEWPORT_HEIGHT = 600
+# cards kept rendered above and below the viewport
+OVERSCAN = 4
+
+# urgency -> card accent colour; anything else gets OTHER_COLOR
+URGENCY_COLORS = {'Critical': '#ff4b4b', 'Urgent': '#ffa500', 'Normal': '#2ecc71'}
+OTHER_COLOR = '#000000'
+
+FEED_COLUMNS = ('patient_name', 'blood_group', 'units_required', 'urgency',
+                'hospital_name', 'request_date', 'required_by', 'status')
+
+def _urgency_css():
+    rules = []
+    for name, color in [*URGENCY_COLORS.items(), ('other', OTHER_COLOR)]:
+        rules.append(f".urgency-{name.lower()} {{ border-left-color: {color}; }}\n"
+                     f".urgency-{name.lower()} .badge {{ color: {color}; background-color: {color}22; }}")
+    return '\n'.join(rules)
+
+FEED_CSS = f"""
+body {{ margin: 0; font-family: "Source Sans Pro", sans-serif; }}
+.feed {{ height: 100%; overflow-y: auto; }}
+.rows {{ position: relative; }}
+.card {{
+    position: absolute; left: 0; right: 0; box-sizing: border-box;
+    height: {CARD_HEIGHT - 10}px; padding: 15px; border-radius: 10px;
+    background-color: white; border-left: 5px solid {OTHER_COLOR};
+    box-shadow: 0 2px 5px rgba(0,0,0,0.1);
+    display: flex; justify-content: space-between; align-items: center;
+}}
+.card h4 {{ margin: 0; color: black; }}
+.card p {{ margin: 5px 0; color: gray; }}
+.card .right {{ text-align: right; }}
+.card .right p {{ font-size: 0.8em; }}
+.badge {{ padding: 3px 8px; border-radius: 15px; font-size: 0.8em; }}
+{_urgency_css()}
+"""
+
+# cards are filled in with textContent, so request fields are never parsed as HTML
+FEED_SCRIPT = """
+const feed = document.getElementById('feed');
+const rows = feed.firstElementChild;
+const template = document.getElementById('card');
+rows.style.height = (ROWS.length * CARD_HEIGHT) + 'px';
+let shown = '';
+
+function card(row, index) {
+    const el = template.content.firstElementChild.cloneNode(true);
+    el.classList.add('urgency-' + (URGENCIES.includes(row.urgency) ? row.urgency.toLowerCase() : 'other'));
+    el.style.top = (index * CARD_HEIGHT) + 'px';
+    el.querySelector('h4').textContent = row.patient_name + ' \\u2022 ' + row.blood_group;
+    el.querySelector('.where').textContent = row.hospital_name + ' \\u2022 ' + row.units_required + ' units';
+    el.querySelector('.badge').textContent = row.urgency;
+    const when = el.querySelector('.when');
+    when.append('Requested: ' + row.request_date, document.createElement('br'),
+                'Required by: ' + row.required_by, document.createElement('br'),
+                'Status: ' + row.status);
+    return el;
+}
+
+function render() {
+    const first = Math.max(0, Math.floor(feed.scrollTop / CARD_HEIGHT) - OVERSCAN);
+    const last = Math.min(ROWS.length, Math.ceil((feed.scrollTop + feed.clientHeight) / CARD_HEIGHT) + OVERSCAN);
+    if (shown === first + ':' + last) return;
+    shown = first + ':' + last;
+    const fragment = document.createDocumentFragment();
+    for (let i = first; i < last; i++) fragment.appendChild(card(ROWS[i], i));
+    rows.replaceChildren(fragment);
+}
+
+let pending = false;
+feed.addEventListener('scroll', () => {
+    if (pending) return;
+    pending = true;
+    requestAnimationFrame(() => { pending = false; render(); });
+}, {passive: true});
+render();
+"""
+
+FEED_TEMPLATE = """<style>{css}</style>
+<div id="feed" class="feed"><div class="rows"></div></div>
+<template id="card"><div class="card">
+    <div><h4></h4><p class="where"></p></div>
+    <div class="right"><span class="badge"></span><p class="when"></p></div>
+</div></template>
+<script>
+const ROWS = {rows};
+const URGENCIES = {urgencies};
+const CARD_HEIGHT = {card_height}, OVERSCAN = {overscan};
+{script}
+</script>"""
+
+def feed_height(row_count):
+    """Height (px) of the feed component for a window of row_count requests"""
+    return min(VIEWPORT_HEIGHT, row_count * CARD_HEIGHT)
+
+def feed_html(rows):
+    """The whole feed component for a window of request rows (dicts of FEED_COLUMNS)"""
+    data = json.dumps([[row[column] for column in FEED_COLUMNS] for row in rows], default=str)
+    # rows go out as arrays; the script turns them back into objects
+    rows_js = (f"{data}.map(r => Object.fromEntries({json.dumps(FEED_COLUMNS)}.map((c, i) => [c, r[i]])))"
+               .replace('</', '<\\/'))
+    return FEED_TEMPLATE.format(css=FEED_CSS, rows=rows_js, urgencies=json.dumps(list(URGENCY_COLORS)),
+                                card_height=CARD_HEIGHT, overscan=OVERSCAN, script=FEED_SCRIPT)
+
+def render_feed(rows):
+    """Render a window of request rows as one virtualized, scrollable component"""
+    import streamlit.components.v1 as components
+    components.html(feed_html(rows), height=feed_height(len(rows)))
@@ -0,0 +1,435 @@
+import importlib
+import logging
+import statistics
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+import streamlit as st
+import database as db
+
+# Resources shared across Streamlit reruns.
+#
+# A rerun used to construct fresh Donor / BloodBank / BloodRequest objects and
+# re-emit a <style> block from every handler and constructor on the way. Now:
+#
+# - stateless services (BloodBank, BloodRequest) are built once per process
+#   with st.cache_resource; Donor keeps form values on the instance, so it is
+#   built once per session and kept in st.session_state;
+# - connections come from database.pool and the model from
+#   model_registry.registry, both already one per process;
+# - every stylesheet is defined once in STYLES and injected at most once per
+#   rerun, however many handlers ask for it. Streamlit removes elements that
+#   a rerun does not emit again, so a stylesheet cannot be sent only on a
+#   session's first run - each rerun sends each stylesheet it uses once;
+# - rerun() times each script run per page and logs it, with the process's
+#   query cache hit, miss and eviction counts, keeping the last RERUN_SAMPLES
+#   timings per page in the session (see rerun_stats).
+
+logger = logging.getLogger(__name__)
+
+RERUN_SAMPLES = 50
+
+STYLES = {
+    # page background, header, dashboard cards, navigation and shared widget styles
+    'app': """
+    .stApp {
+        background-image: linear-gradient(rgba(255, 255, 255, 0.97), rgba(255, 255, 255, 0.97)),
+            url("https://img.freepik.com/free-photo/close-up-doctor-holding-blood-sample_23-2149140414.jpg");
+        background-size: cover;
+        background-position: center;
+        background-repeat: no-repeat;
+        background-attachment: fixed;
+    }
+
+    .main-header {
+        background: linear-gradient(135deg, #ff4b4b, #ff8080);
+        padding: 1.5rem;
+        border-radius: 20px;
+        box-shadow: 0 10px 25px rgba(255, 75, 75, 0.2);
+        margin-bottom: 2rem;
+        text-align: center;
+        white-space: nowrap;
+        overflow: hidden;
+    }
+
+    .metric-card {
+        background: white;
+        padding: 1.8rem;
+        border-radius: 20px;
+        box-shadow: 0 8px 20px rgba(0,0,0,0.08);
+        text-align: center;
+        transition: all 0.3s ease;
+        border: 1px solid rgba(255, 75, 75, 0.1);
+    }
+
+    .metric-card:hover {
+        transform: translateY(-5px);
+        box-shadow: 0 12px 30px rgba(0,0,0,0.12);
+        border-color: rgba(255, 75, 75, 0.3);
+    }
+
+    .metric-icon {
+        font-size: 2.8em;
+        margin-bottom: 0.8rem;
+        color: #ff4b4b;
+        background: rgba(255, 75, 75, 0.1);
+        width: 70px;
+        height: 70px;
+        display: flex;
+        align-items: center;
+        justify-content: center;
+        border-radius: 50%;
+        margin: 0 auto 1rem auto;
+    }
+
+    .metric-value {
+        font-size: 2.2em;
+        font-weight: 700;
+        color: #2c3e50;
+        margin: 0.5rem 0;
+        background: linear-gradient(45deg, #ff4b4b, #ff8080);
+        -webkit-background-clip: text;
+        -webkit-text-fill-color: transparent;
+    }
+
+    .metric-label {
+        color: #2c3e50;
+        font-size: 1.1em;
+        font-weight: 600;
+        margin-bottom: 0.5rem;
+        text-transform: uppercase;
+        letter-spacing: 0.5px;
+    }
+
+    .metric-trend {
+        color: #2c3e50;
+        font-size: 0.9em;
+        padding: 0.3rem 0.8rem;
+        border-radius: 15px;
+        background: rgba(255, 75, 75, 0.1);
+        display: inline-block;
+    }
+
+    .nav-link {
+        background: white !important;
+        border-radius: 15px !important;
+        margin: 0.3rem !important;
+        transition: all 0.3s ease !important;
+        border: 1px solid rgba(255, 75, 75, 0.1) !important;
+        padding: 0.8rem 1.5rem !important;
+    }
+
+    .nav-link:hover {
+        transform: translateY(-2px) !important;
+        background: rgba(255, 75, 75, 0.05) !important;
+        border-color: rgba(255, 75, 75, 0.3) !important;
+    }
+
+    .nav-link.active {
+        background: linear-gradient(135deg, #ff4b4b, #ff8080) !important;
+        color: white !important;
+        border: none !important;
+        box-shadow: 0 5px 15px rgba(255, 75, 75, 0.3) !important;
+    }
+
+    /* Chart styling */
+    .js-plotly-plot {
+        border-radius: 20px;
+        box-shadow: 0 8px 20px rgba(0,0,0,0.08);
+        padding: 1rem;
+        background: white;
+        border: 1px solid rgba(255, 75, 75, 0.1);
+        margin-bottom: 2rem;
+    }
+
+    /* Make all text inputs and labels consistent */
+    .stTextInput label, .stNumberInput label, .stSelectbox label {
+        color: #2c3e50 !important;
+        font-weight: 600;
+        font-size: 1rem;
+    }
+
+    .stTextInput input, .stNumberInput input, .stSelectbox select {
+        border-radius: 10px;
+        border: 1px solid rgba(255, 75, 75, 0.2);
+        padding: 0.5rem 1rem;
+    }
+
+    .stButton>button {
+        background: linear-gradient(135deg, #ff4b4b, #ff8080);
+        color: white;
+        border: none;
+        padding: 0.5rem 2rem;
+        border-radius: 10px;
+        font-weight: 600;
+        transition: all 0.3s ease;
+    }
+
+    .stButton>button:hover {
+        transform: translateY(-2px);
+        box-shadow: 0 5px 15px rgba(255, 75, 75, 0.3);
+    }
+    """,
+    # Donor Management page
+    'donor_management': """
+    /* Style for donor management section */
+    .donor-section {
+        color: black !important;
+    }
+
+    /* Style for selectbox label */
+    .stSelectbox label {
+        color: black !important;
+        font-weight: 500;
+    }
+
+    /* Style for selectbox selected value */
+    .stSelectbox div[data-baseweb="select"] span {
+        color: white !important;
+    }
+
+    /* Style for dropdown options */
+    .stSelectbox div[role="listbox"] div {
+        color: black !important;
+    }
+
+    /* Style for form labels */
+    .stTextInput label, .stNumberInput label, .stDateInput label, .stTextArea label {
+        color: black !important;
+        font-weight: 500;
+    }
+
+    /* Style for form inputs */
+    .stTextInput input, .stNumberInput input, .stDateInput input, .stTextArea textarea {
+        color: white !important;
+    }
+    """,
+    # donor forms and results (Donor Management and Find Donors)
+    'donor_form': """
+    /* Style for text inputs */
+    .stTextInput input, .stTextArea textarea {
+        color: white !important;
+    }
+
+    /* Style for date input */
+    .stDateInput input {
+        color: white !important;
+    }
+
+    /* Style for radio buttons */
+    .stRadio label {
+        color: black !important;
+    }
+
+    /* Style for selectbox */
+    .stSelectbox div[data-baseweb="select"] span {
+        color: white !important;
+    }
+
+    /* Style for number inputs */
+    .stNumberInput input {
+        color: white !important;
+    }
+
+    /* Style for output text */
+    .dataframe {
+        color: black !important;
+    }
+
+    /* Style for success/info messages */
+    .stSuccess, .stInfo {
+        color: black !important;
+    }
+
+    /* Style for verification messages */
+    .element-container div {
+        color: black !important;
+    }
+
+    /* Style for displayed data */
+    .stMarkdown p {
+        color: black !important;
+    }
+    """,
+    # Blood Bank page
+    'blood_bank_management': """
+    /* Style for blood bank section */
+    .blood-bank-section {
+        color: black !important;
+    }
+
+    /* Style for selectbox label */
+    .stSelectbox label {
+        color: black !important;
+        font-weight: 500;
+    }
+
+    /* Style for selectbox selected value */
+    .stSelectbox div[data-baseweb="select"] span {
+        color: white !important;
+    }
+
+    /* Style for dropdown options */
+    .stSelectbox div[role="listbox"] div {
+        color: black !important;
+    }
+
+    /* Style for text area (address) */
+    .stTextArea textarea {
+        color: white !important;
+    }
+
+    /* Style for text area label */
+    .stTextArea label {
+        color: black !important;
+    }
+
+    /* Style for text input */
+    .stTextInput input {
+        color: white !important;
+    }
+
+    /* Style for text input label */
+    .stTextInput label {
+        color: black !important;
+        font-weight: 500;
+    }
+
+    /* Style for date input */
+    .stDateInput input {
+        color: white !important;
+    }
+
+    /* Style for date picker selected value */
+    [data-baseweb="input"] input {
+        color: white !important;
+    }
+    """,
+    # Blood Request page form
+    'blood_request_form': """
+    /* Style for all form inputs */
+    .stTextInput input, .stNumberInput input, .stSelectbox select {
+        color: white !important;
+    }
+
+    /* Style for all labels */
+    .stTextInput label, .stNumberInput label, .stSelectbox label {
+        color: black !important;
+        font-weight: 500;
+    }
+
+    /* Style for selectbox text and options */
+    .stSelectbox div[data-baseweb="select"] span {
+        color: white !important;
+    }
+
+    .stSelectbox div[role="listbox"] div {
+        color: black !important;
+    }
+
+    /* Style for date input */
+    .stDateInput input {
+        color: white !important;
+    }
+    .stDateInput label {
+        color: black !important;
+        font-weight: 500;
+    }
+    /* Style for date picker calendar */
+    .stDateInput div[data-baseweb="calendar"] {
+        color: black !important;
+    }
+    """,
+    # BloodRequest.add_request
+    'request_form': """
+    /* Make number input label black */
+    .stNumberInput label {
+        color: #000000 !important;
+    }
+    """,
+    # Eligibility page
+    'eligibility': """
+    /* Style for eligibility section */
+    .eligibility-section {
+        color: black !important;
+    }
+
+    /* Style for form labels */
+    .stTextInput label, .stNumberInput label {
+        color: black !important;
+        font-weight: 500;
+    }
+
+    /* Style for form inputs */
+    .stTextInput input, .stNumberInput input {
+        color: black !important;
+        background-color: white !important;
+        border: 1px solid rgba(255, 75, 75, 0.2) !important;
+    }
+
+    /* Style for form button */
+    .stButton button {
+        color: white !important;
+        background-color: #ff4b4b !important;
+        font-weight: 500 !important;
+    }
+
+    /* Style for form button text specifically */
+    .stButton button p {
+        color: white !important;
+    }
+    """,
+}
+
+@lru_cache(maxsize=None)
+def _style_block(names):
+    return '<style>\n' + '\n'.join(STYLES[name] for name in names) + '\n</style>'
+
+def inject_css(*names):
+    """Emit the named stylesheets that have not been emitted yet in this rerun, as one <style> block"""
+    injected = st.session_state.setdefault('_css_injected', set())
+    names = tuple(name for name in names if name not in injected)
+    if names:
+        st.markdown(_style_block(names), unsafe_allow_html=True)
+        injected.update(names)
+
+@st.cache_resource(show_spinner=False)
+def _shared(module, name):
+    return getattr(importlib.import_module(module), name)()
+
+def shared_service(cls):
+    """The process-wide instance of a stateless service class"""
+    return _shared(cls.__module__, cls.__qualname__)
+
+def session_service(cls):
+    """This session's instance of a service class that keeps per-session state"""
+    key = f'_service_{cls.__module__}.{cls.__qualname__}'
+    if key not in st.session_state:
+        st.session_state[key] = cls()
+    return st.session_state[key]
+
+@contextmanager
+def rerun():
+    """
+    Wrap one script run: resets the per-rerun stylesheet set and records how
+    long the run took under the page name stored in the yielded dict
+    """
+    st.session_state['_css_injected'] = set()
+    run = {'page': None}
+    started = time.perf_counter()
+    try:
+        yield run
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        timings = st.session_state.setdefault('_rerun_ms', {})
+        timings.setdefault(run['page'], deque(maxlen=RERUN_SAMPLES)).append(elapsed_ms)
+        cache = db.query_cache.info()
+        logger.info("%s rerun took %.1f ms; query cache %d hits, %d misses, %d evictions (%.0f%% hit rate)",
+                    run['page'], elapsed_ms, cache['hits'], cache['misses'], cache['evictions'],
+                    cache['hit_rate'] * 100)
+
+def rerun_stats():
+    """Last and median rerun time (ms) and run count per page for this session"""
+    return {page: {'last_ms': timings[-1], 'p50_ms': statistics.median(timings), 'runs': len(timings)}
+            for page, timings in st.session_state.get('_rerun_ms', {}).items()}
@@ -0,0 +1,207 @@
+import bisect
+import re
+import threading
+import time
+from collections import defaultdict
+import database as db
+
+# Full-text search over donors, blood banks and blood requests.
+#
+# Each search runs against an FTS5 index kept in sync with its table by
+# triggers (see database.SEARCH_INDEXES). Every word typed is matched as a
+# prefix (single letters as whole words) and all words must match. The
+# RANK_CANDIDATES most recently added matches - every match when there are
+# fewer - are ranked by bm25, so a common word does not mean ranking most of
+# the table.
+#
+# When nothing matches, each word that is not the prefix of any indexed term
+# is swapped for the indexed terms within a small edit distance of it
+# (transpositions count as one edit), so "jonh smiht" still finds John Smith.
+# Reading the vocabulary walks the whole index, so it is read once and reused
+# for VOCABULARY_TTL seconds; a donor added since then is still found by
+# correctly spelt searches.
+#
+#     python search.py donors "jonh smiht"
+#     python search.py rebuild
+
+RESULT_LIMIT = 20
+
+# misspelt words are replaced by at most this many of the closest terms
+CORRECTIONS_PER_TERM = 5
+
+# matches ranked per search, newest first
+RANK_CANDIDATES = 1000
+
+# seconds a vocabulary read for corrections is reused
+VOCABULARY_TTL = 300.0
+
+# index, the table it covers and the columns returned for each search
+SEARCHES = {
+    'donors': ('donor_search', 'donor_record', db.DONOR_COLUMNS),
+    'blood_banks': ('blood_bank_search', 'blood_banks',
+                    'bank_id, bank_name, address, city, contact_number, email'),
+    'blood_requests': ('blood_request_search', 'blood_requests',
+                       'request_id, patient_name, blood_group, units_required, urgency, '
+                       'hospital_name, request_date, required_by, status'),
+}
+
+_WORD = re.compile(r'\w+')
+
+def search_terms(text):
+    """The lower-cased words of a search string"""
+    return _WORD.findall(text.lower())
+
+def match_expression(terms):
+    """
+    FTS5 query requiring every term: a word as typed matches as a prefix
+    (single letters as whole words), a list of corrections as any one of
+    those whole words
+    """
+    return ' AND '.join(
+        '(' + ' OR '.join(f'"{word}"' for word in term) + ')' if isinstance(term, list)
+        else f'"{term}"' if len(term) == 1 else f'"{term}"*'
+        for term in terms
+    )
+
+def search_query(name):
+    """SQL for a ranked search; parameters are the match expression and the limit"""
+    index, table, columns = SEARCHES[name]
+    # the index has columns of the same names, so the table's are qualified
+    columns = ', '.join(f'{table}.{column.strip()}' for column in columns.split(','))
+    return f"""
+        SELECT {columns}
+        FROM (
+            SELECT rowid, rank FROM {index} WHERE {index} MATCH ?
+            ORDER BY rowid DESC LIMIT {RANK_CANDIDATES}
+        ) AS matches
+        JOIN {table} ON {table}.rowid = matches.rowid
+        ORDER BY matches.rank
+        LIMIT ?
+    """
+
+def max_edits(term):
+    """Edits tolerated when correcting a word of this length"""
+    return 0 if len(term) < 4 else 1 if len(term) < 8 else 2
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance between a and b, or limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+class Vocabulary:
+    """Sorted snapshot of an index's terms with the number of rows containing each"""
+
+    def __init__(self, rows):
+        self.terms = [term for term, _ in rows]
+        self.documents = dict(rows)
+        self.read_at = time.monotonic()
+        # (first letter, length) -> [(term, its letters)]: corrections only look
+        # at terms starting with the same letter and of a reachable length
+        self._buckets = defaultdict(list)
+        for term in self.terms:
+            self._buckets[term[0], len(term)].append((term, frozenset(term)))
+
+    @classmethod
+    def read(cls, conn, index):
+        return cls(conn.execute(f"SELECT term, doc FROM {index}_terms ORDER BY term").fetchall())
+
+    def has_prefix(self, term):
+        i = bisect.bisect_left(self.terms, term)
+        return i < len(self.terms) and self.terms[i].startswith(term)
+
+    def corrections(self, term):
+        """Terms within max_edits(term) of term, closest and most common first"""
+        limit = max_edits(term)
+        if limit == 0:
+            return []
+        letters = frozenset(term)
+        candidates = []
+        # typos are assumed to spare the first letter
+        for length in range(len(term) - limit, len(term) + limit + 1):
+            for candidate, candidate_letters in self._buckets.get((term[0], length), ()):
+                # one edit adds or removes at most two distinct letters
+                if len(letters ^ candidate_letters) > 2 * limit:
+                    continue
+                distance = edit_distance(term, candidate, limit)
+                if distance <= limit:
+                    candidates.append((distance, -self.documents[candidate], candidate))
+        return [candidate for _, _, candidate in sorted(candidates)[:CORRECTIONS_PER_TERM]]
+
+_vocabularies = {}
+_vocabulary_lock = threading.Lock()
+
+def vocabulary(conn, index):
+    """The index's Vocabulary, read again once it is VOCABULARY_TTL seconds old"""
+    with _vocabulary_lock:
+        cached = _vocabularies.get(index)
+        if cached is None or time.monotonic() - cached.read_at > VOCABULARY_TTL:
+            cached = _vocabularies[index] = Vocabulary.read(conn, index)
+        return cached
+
+def search(name, text, limit=RESULT_LIMIT, conn=None):
+    """
+    Ranked rows of a SEARCHES entry matching text, as dicts
+
+    Misspelt words are corrected against the index vocabulary when the
+    words as typed match nothing.
+    """
+    index, _, _ = SEARCHES[name]
+    terms = list(dict.fromkeys(search_terms(text)))
+    if not terms:
+        return []
+    conn = conn or db.get_db_connection()
+    query = search_query(name)
+    rows = conn.execute(query, (match_expression(terms), limit)).fetchall()
+    if not rows:
+        words = vocabulary(conn, index)
+        corrected = []
+        for term in terms:
+            if len(term) == 1 or words.has_prefix(term):
+                corrected.append(term)
+                continue
+            alternatives = words.corrections(term)
+            if not alternatives:
+                return []
+            corrected.append(alternatives)
+        if corrected != terms:
+            rows = conn.execute(query, (match_expression(corrected), limit)).fetchall()
+    return [dict(row) for row in rows]
+
+def rebuild(conn=None):
+    """Re-index every search index from its table; returns {index: seconds}"""
+    conn = conn or db.get_db_connection()
+    timings = {}
+    for index in db.SEARCH_INDEXES:
+        started = time.perf_counter()
+        with conn:
+            conn.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+        timings[index] = time.perf_counter() - started
+    return timings
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) == 2 and sys.argv[1] == 'rebuild':
+        for index, seconds in rebuild().items():
+            print(f"rebuilt {index} in {seconds:.2f} s")
+    elif len(sys.argv) == 3 and sys.argv[1] in SEARCHES:
+        started = time.perf_counter()
+        results = search(sys.argv[1], sys.argv[2])
+        for row in results:
+            print(row)
+        print(f"{len(results)} result(s) in {(time.perf_counter() - started) * 1000:.1f} ms", file=sys.stderr)
+    else:
+        print(f"usage: python search.py {{{','.join(SEARCHES)}}} TEXT | python search.py rebuild")
+        sys.exit(1)
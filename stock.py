@@ -0,0 +1,81 @@
+import database as db
+
+# Stock levels.
+#
+# stock_levels holds the number of blood_units per (bank, blood type, status)
+# and is kept exact by triggers on blood_units (see database._m006_stock_levels),
+# so "how much O- do we have" is a primary-key lookup instead of a COUNT(*).
+# Units that are not assigned to a bank are counted under bank_id 0.
+
+def stock_level(blood_type, status='Available', bank_id=None):
+    """Return the number of units of blood_type in status, at one bank or across all banks"""
+    if bank_id is None:
+        rows = db.execute_query(
+            "SELECT SUM(units) FROM stock_levels WHERE blood_type = ? AND status = ?",
+            (blood_type, status),
+            fetch=True
+        )
+    else:
+        rows = db.execute_query(
+            "SELECT units FROM stock_levels WHERE bank_id = ? AND blood_type = ? AND status = ?",
+            (bank_id, blood_type, status),
+            fetch=True
+        )
+    return (rows[0][0] or 0) if rows else 0
+
+def stock_by_blood_type(status='Available'):
+    """Return {blood type: units in status} across all banks"""
+    rows = db.execute_query(
+        "SELECT blood_type, SUM(units) FROM stock_levels WHERE status = ? GROUP BY blood_type",
+        (status,),
+        fetch=True
+    )
+    return {row[0]: row[1] for row in rows}
+
+def check_stock_levels(conn=None, repair=False):
+    """
+    Recount blood_units and compare the result with stock_levels
+
+    Returns a list of (bank_id, blood_type, status, counter value, actual count)
+    for every key that disagrees. With repair=True, stock_levels is rebuilt from
+    the recount in the same transaction.
+    """
+    conn = conn or db.get_db_connection()
+    # BEGIN IMMEDIATE keeps writers out between the recount and the rebuild
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        actual = {tuple(row[:3]): row[3] for row in conn.execute(db.COUNT_STOCK_SQL)}
+        counters = {tuple(row[:3]): row[3] for row in conn.execute(
+            "SELECT bank_id, blood_type, status, units FROM stock_levels"
+        )}
+        mismatches = [
+            key + (counters.get(key, 0), actual.get(key, 0))
+            for key in sorted(set(actual) | set(counters))
+            if counters.get(key, 0) != actual.get(key, 0)
+        ]
+        if repair and mismatches:
+            conn.execute("DELETE FROM stock_levels")
+            conn.execute(db.REBUILD_STOCK_LEVELS_SQL)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if repair and mismatches:
+        db.notify_write('stock_levels')
+    return mismatches
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check stock_levels against a recount of blood_units")
+    parser.add_argument('--repair', action='store_true', help="rebuild stock_levels if it has drifted")
+    args = parser.parse_args()
+
+    mismatches = check_stock_levels(repair=args.repair)
+    for bank_id, blood_type, status, counted, actual in mismatches:
+        print(f"bank {bank_id} {blood_type} {status}: counter {counted}, actual {actual}")
+    if not mismatches:
+        print("stock_levels is consistent with blood_units")
+    elif args.repair:
+        print(f"rebuilt stock_levels ({len(mismatches)} counters corrected)")
+    raise SystemExit(1 if mismatches and not args.repair else 0)
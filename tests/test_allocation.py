@@ -0,0 +1,92 @@
+from datetime import date
+import pytest
+import allocation
+import database as db
+
+TODAY = date(2024, 1, 1)
+
+def add_units(conn, blood_type, count, bank_id=None):
+    with conn:
+        if bank_id is not None:
+            conn.execute("INSERT OR IGNORE INTO blood_banks (bank_id, bank_name) VALUES (?, 'bank')", (bank_id,))
+        conn.executemany(
+            "INSERT INTO blood_units (blood_type, collection_date, expiry_date, status, bank_id) "
+            "VALUES (?, '2023-12-20', ?, 'Available', ?)",
+            [(blood_type, f'2024-01-{10 + n:02d}', bank_id) for n in range(count)])
+
+def add_request(conn, blood_group, units, urgency='Normal'):
+    with conn:
+        return conn.execute(
+            "INSERT INTO blood_requests (patient_name, blood_group, units_required, urgency, hospital_name, "
+            "contact_number, request_date, required_by) VALUES ('p', ?, ?, ?, 'h', '0', '2024-01-01', '2024-01-05')",
+            (blood_group, units, urgency)).lastrowid
+
+def stock(conn):
+    return conn.execute("SELECT * FROM stock_levels WHERE units != 0 ORDER BY 1, 2, 3").fetchall()
+
+def test_reservations_keep_stock_levels_exact(conn, triggers):
+    add_units(conn, 'A+', 5, bank_id=1)
+    add_units(conn, 'O-', 4)
+    add_units(conn, 'O-', 3, bank_id=1)
+    for blood_group, units in [('A+', 3), ('A+', 4), ('O-', 2), ('B+', 1)]:
+        add_request(conn, blood_group, units)
+    before = triggers()
+    version = conn.execute("SELECT version FROM table_versions WHERE name = 'blood_units'").fetchone()[0]
+
+    stats = allocation.allocate(conn, batch_size=2, today=TODAY)
+
+    assert (stats['approved'], stats['unfilled'], stats['units_reserved']) == (4, 0, 10)
+    assert triggers() == before
+    assert conn.execute("SELECT version FROM table_versions WHERE name = 'blood_units'").fetchone()[0] > version
+    counted = stock(conn)
+    with conn:
+        conn.execute("DELETE FROM stock_levels")
+        conn.execute(db.REBUILD_STOCK_LEVELS_SQL)
+    assert counted == stock(conn)
+
+def test_conflicting_batch_resets_inventory(conn, triggers, monkeypatch):
+    add_units(conn, 'O-', 4)
+    first = add_request(conn, 'O-', 2, urgency='Critical')
+    second = add_request(conn, 'O-', 3)
+    before = triggers()
+
+    load_inventory = allocation.load_inventory
+    def load_then_take_first_unit(conn, today):
+        inventory = load_inventory(conn, today)
+        # another writer uses the first unit after the allocator has read the inventory
+        with conn:
+            conn.execute("UPDATE blood_units SET status = 'Used' WHERE unit_id = 1 AND status = 'Available'")
+        return inventory
+    monkeypatch.setattr(allocation, 'load_inventory', load_then_take_first_unit)
+
+    stats = allocation.allocate(conn, batch_size=1, today=TODAY)
+
+    # the first request's batch is rolled back; its untouched unit goes to the second request
+    assert (stats['approved'], stats['conflicts'], stats['unfilled']) == (1, 1, 0)
+    assert conn.execute("SELECT request_id, status FROM blood_requests ORDER BY 1").fetchall() == [
+        (first, 'Pending'), (second, 'Approved')]
+    assert conn.execute("SELECT unit_id FROM blood_units WHERE request_id = ? ORDER BY 1", (second,)).fetchall() == [
+        (2,), (3,), (4,)]
+    assert triggers() == before
+
+def test_request_closed_meanwhile_keeps_no_units(conn, triggers, monkeypatch):
+    add_units(conn, 'O-', 3)
+    request = add_request(conn, 'O-', 2)
+    before, counted = triggers(), stock(conn)
+
+    load_inventory = allocation.load_inventory
+    def load_then_cancel_request(conn, today):
+        inventory = load_inventory(conn, today)
+        # another writer cancels the request after the allocator has queued it
+        with conn:
+            conn.execute("UPDATE blood_requests SET status = 'Cancelled' WHERE request_id = ?", (request,))
+        return inventory
+    monkeypatch.setattr(allocation, 'load_inventory', load_then_cancel_request)
+
+    stats = allocation.allocate(conn, today=TODAY)
+
+    assert (stats['approved'], stats['conflicts'], stats['units_reserved']) == (0, 1, 0)
+    assert conn.execute("SELECT status FROM blood_requests").fetchall() == [('Cancelled',)]
+    assert conn.execute("SELECT DISTINCT status, request_id FROM blood_units").fetchall() == [('Available', None)]
+    assert stock(conn) == counted
+    assert triggers() == before
@@ -0,0 +1,73 @@
+import sqlite3 as sql
+import pytest
+import database as db
+
+DONOR = ('D1', 'donor', 30, 'Female', '01-01-1995', 'O+', '555', 'V1', 'street', 'Boston', 'MA', '02108',
+         '01-01-2024', '12:00:00')
+UNIT_COLUMNS = ('donor_id', 'blood_type', 'collection_date', 'expiry_date', 'status')
+
+@pytest.fixture
+def conn(conn):
+    # transactions are opened by hand, as bulk_import does
+    conn.isolation_level = None
+    conn.execute(f"INSERT INTO donor_record VALUES ({', '.join('?' * len(DONOR))}, NULL, NULL)", DONOR)
+    return conn
+
+def unit(donor_id='D1', blood_type='O+', status='Available'):
+    return (donor_id, blood_type, '2024-01-01', '2024-02-12', status)
+
+def test_bulk_insert_matches_row_triggers(conn):
+    rows = [unit(), unit(blood_type='A+'), unit(donor_id=None), unit(status='Expired')]
+    conn.execute("BEGIN IMMEDIATE;")
+    db.bulk_insert(conn, 'blood_units', UNIT_COLUMNS, rows)
+    conn.execute("COMMIT;")
+    bulk = (conn.execute("SELECT * FROM stock_levels ORDER BY 1, 2, 3").fetchall(),
+            conn.execute("SELECT donor_id FROM donor_score_queue").fetchall())
+
+    conn.execute("DELETE FROM blood_units")
+    conn.execute("DELETE FROM stock_levels")
+    conn.execute("DELETE FROM donor_score_queue")
+    for row in rows:
+        conn.execute(f"INSERT INTO blood_units ({', '.join(UNIT_COLUMNS)}) VALUES (?, ?, ?, ?, ?)", row)
+    assert bulk == (conn.execute("SELECT * FROM stock_levels ORDER BY 1, 2, 3").fetchall(),
+                    conn.execute("SELECT donor_id FROM donor_score_queue").fetchall())
+
+@pytest.mark.parametrize('table, columns, rows', [
+    # the second unit names a donor that does not exist
+    ('blood_units', UNIT_COLUMNS, [unit(), unit(donor_id='missing')]),
+    # the second donor repeats the first one's ID
+    ('donor_record', ('id', 'name', 'age', 'gender', 'date_of_birth', 'blood_group', 'contact_number_1',
+                      'verification_id', 'address', 'city', 'state', 'pin_code', 'date_of_registration',
+                      'time_of_registration'),
+     [('D2',) + DONOR[1:7] + ('V2',) + DONOR[8:], DONOR]),
+])
+def test_failed_bulk_insert_restores_triggers(conn, triggers, table, columns, rows):
+    before = triggers()
+    count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.execute("BEGIN IMMEDIATE;")
+    with pytest.raises(sql.IntegrityError):
+        db.bulk_insert(conn, table, columns, rows)
+    # the caller's transaction is still open and the triggers are back in it
+    assert conn.in_transaction
+    assert triggers() == before
+    conn.execute("ROLLBACK;")
+    assert triggers() == before
+    assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == count
+
+    # and they fire again for an ordinary insert
+    conn.execute(f"INSERT INTO blood_units ({', '.join(UNIT_COLUMNS)}) VALUES (?, ?, ?, ?, ?)", unit())
+    assert conn.execute("SELECT units FROM stock_levels WHERE blood_type = 'O+'").fetchone() == (1,)
+    assert conn.execute("SELECT donor_id FROM donor_score_queue").fetchall() == [('D1',)]
+
+def test_rolled_back_transaction_restores_triggers(conn, triggers):
+    before = triggers()
+    conn.execute("BEGIN IMMEDIATE;")
+    db.bulk_insert(conn, 'blood_units', UNIT_COLUMNS, [unit()])
+    conn.execute("ROLLBACK;")
+    assert triggers() == before
+    assert conn.execute("SELECT COUNT(*) FROM stock_levels").fetchone() == (0,)
+
+def test_bulk_insert_needs_a_transaction(conn):
+    with pytest.raises(ValueError):
+        db.bulk_insert(conn, 'blood_units', UNIT_COLUMNS, [unit()])
+    assert conn.execute("SELECT COUNT(*) FROM blood_units").fetchone() == (0,)
@@ -0,0 +1,47 @@
+import threading
+import time
+import pytest
+import database as db
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / 'pool.db'))
+    yield pool
+    pool.close_all()
+
+def test_failed_migration_is_retried(pool, monkeypatch):
+    migrate = db.migrate
+    calls = []
+    def failing_once(conn):
+        calls.append(conn)
+        if len(calls) == 1:
+            raise RuntimeError("migration failed")
+        return migrate(conn)
+    monkeypatch.setattr(db, 'migrate', failing_once)
+
+    with pytest.raises(RuntimeError):
+        pool.get()
+    assert not pool._migrated
+    conn = pool.get()
+    assert len(calls) == 2 and pool._migrated
+    assert db.schema_version(conn) == db.MIGRATIONS[-1][0]
+
+def test_threads_wait_for_the_first_migration(pool, monkeypatch):
+    migrate = db.migrate
+    calls, versions = [], []
+    def slow(conn):
+        calls.append(conn)
+        time.sleep(0.2)
+        return migrate(conn)
+    monkeypatch.setattr(db, 'migrate', slow)
+
+    def open_connection():
+        versions.append(db.schema_version(pool.get()))
+    threads = [threading.Thread(target=open_connection) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert versions == [db.MIGRATIONS[-1][0]] * 4
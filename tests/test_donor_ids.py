@@ -0,0 +1,47 @@
+import time
+from datetime import datetime, timezone
+import pytest
+import database as db
+import donor_ids
+
+LEGACY_ID = 'P-061224-945910'
+
+@pytest.fixture
+def india_time(monkeypatch):
+    # registration times are local; UTC+05:30 makes a UTC mix-up visible
+    monkeypatch.setenv('TZ', 'Asia/Kolkata')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def test_legacy_registration_time_is_converted_to_utc(india_time):
+    new_id = donor_ids.legacy_to_ulid(LEGACY_ID, '06-12-2024', '12:00:00')
+    assert donor_ids.id_time(new_id) == datetime(2024, 12, 6, 6, 30, tzinfo=timezone.utc)
+    # without a registration time the date in the ID is local midnight
+    new_id = donor_ids.legacy_to_ulid(LEGACY_ID)
+    assert donor_ids.id_time(new_id) == datetime(2024, 12, 5, 18, 30, tzinfo=timezone.utc)
+
+def test_donor_is_found_by_legacy_id(tmp_path, monkeypatch):
+    pytest.importorskip('streamlit')
+    import donor
+
+    pool = db.ConnectionPool(str(tmp_path / 'donor_ids.db'))
+    monkeypatch.setattr(db, 'pool', pool)
+    monkeypatch.setattr(db, 'query_cache', db.QueryCache())
+    conn = db.get_db_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO donor_record (id, name, age, gender, date_of_birth, blood_group, contact_number_1, "
+            "verification_id, address, city, state, pin_code, date_of_registration, time_of_registration) "
+            "VALUES ('D1', 'donor', 30, 'Female', '01-01-1995', 'O+', '555', ?, 'street', 'Boston', 'MA', "
+            "'02108', '06-12-2024', '12:00:00')", (LEGACY_ID,))
+    assert donor.fetch_donor(LEGACY_ID)['id'] == 'D1'
+
+    assert donor_ids.migrate_legacy_ids(conn) == 1
+    new_id = donor_ids.resolve(LEGACY_ID)
+    assert new_id != LEGACY_ID and donor.fetch_donor(new_id)['id'] == 'D1'
+    assert donor.fetch_donor(LEGACY_ID)['id'] == 'D1'
+    assert donor.fetch_donor('D1')['verification_id'] == new_id
+    assert donor.fetch_donor('P-010101-000000') is None
+    pool.close_all()
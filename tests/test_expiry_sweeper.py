@@ -0,0 +1,57 @@
+from datetime import date
+import pytest
+import allocation
+import database as db
+import expiry_sweeper
+
+TODAY = date(2024, 1, 10)
+
+def add_request(conn, units):
+    with conn:
+        return conn.execute(
+            "INSERT INTO blood_requests (patient_name, blood_group, units_required, urgency, hospital_name, "
+            "contact_number, request_date, required_by) VALUES ('p', 'O-', ?, 'Normal', 'h', '0', '2024-01-01', "
+            "'2024-01-20')", (units,)).lastrowid
+
+def add_units(conn, *expiry_dates):
+    with conn:
+        conn.executemany(
+            "INSERT INTO blood_units (blood_type, collection_date, expiry_date, status) "
+            "VALUES ('O-', '2023-12-01', ?, 'Available')", [(expiry,) for expiry in expiry_dates])
+
+def units(conn):
+    return conn.execute("SELECT unit_id, status, request_id FROM blood_units ORDER BY unit_id").fetchall()
+
+def test_expired_reservation_puts_its_request_back(conn):
+    # unit 1 expires on the 9th, the rest later; the first request gets units 1 and 2
+    add_units(conn, '2024-01-09', '2024-01-15', '2024-01-16', '2024-01-17')
+    first, second = add_request(conn, 2), add_request(conn, 1)
+    allocation.allocate(conn, today=date(2024, 1, 8))
+    assert units(conn) == [(1, 'Reserved', first), (2, 'Reserved', first), (3, 'Reserved', second),
+                           (4, 'Available', None)]
+
+    assert expiry_sweeper.sweep(conn, today=TODAY) == 1
+
+    assert units(conn) == [(1, 'Expired', None), (2, 'Available', None), (3, 'Reserved', second),
+                           (4, 'Available', None)]
+    assert conn.execute("SELECT request_id, status FROM blood_requests ORDER BY 1").fetchall() == [
+        (first, 'Pending'), (second, 'Approved')]
+    counted = conn.execute("SELECT * FROM stock_levels WHERE units != 0 ORDER BY 1, 2, 3").fetchall()
+    assert counted == conn.execute(db.COUNT_STOCK_SQL + " ORDER BY 1, 2, 3").fetchall()
+
+    # the next allocation run fills the request again from unexpired stock
+    assert allocation.allocate(conn, today=TODAY)['approved'] == 1
+    assert units(conn)[1:] == [(2, 'Reserved', first), (3, 'Reserved', second), (4, 'Reserved', first)]
+
+@pytest.mark.parametrize('status', ['Completed', 'Cancelled'])
+def test_closed_request_keeps_its_units(conn, status):
+    add_units(conn, '2024-01-09', '2024-01-15')
+    request = add_request(conn, 2)
+    allocation.allocate(conn, today=date(2024, 1, 8))
+    with conn:
+        conn.execute("UPDATE blood_requests SET status = ? WHERE request_id = ?", (status, request))
+
+    assert expiry_sweeper.sweep(conn, today=TODAY) == 1
+
+    assert units(conn) == [(1, 'Expired', request), (2, 'Reserved', request)]
+    assert conn.execute("SELECT status FROM blood_requests").fetchall() == [(status,)]
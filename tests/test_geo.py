@@ -0,0 +1,32 @@
+import pytest
+import database as db
+import geo
+
+def add_donor(conn, donor_id, blood_group, pin_code, age=30):
+    conn.execute(
+        "INSERT INTO donor_record (id, name, age, gender, date_of_birth, blood_group, contact_number_1, "
+        "verification_id, address, city, state, pin_code, date_of_registration, time_of_registration) "
+        "VALUES (?, 'donor', ?, 'Female', '01-01-1995', ?, '555', ?, 'street', 'Boston', 'MA', ?, "
+        "'01-01-2024', '12:00:00')",
+        (donor_id, age, blood_group, 'V' + donor_id, pin_code))
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    pool = db.ConnectionPool(str(tmp_path / 'geo.db'))
+    monkeypatch.setattr(db, 'pool', pool)
+    conn = db.get_db_connection()
+    with conn:
+        add_donor(conn, 'placed', 'O-', '02108')
+        add_donor(conn, 'unknown', 'O-', '01169')
+        add_donor(conn, 'unknown_a', 'A+', ' 01169 ')
+        add_donor(conn, 'too_old', 'O-', '99999', age=70)
+    yield conn
+    pool.close_all()
+
+def test_ungeocoded_donors_are_reported(conn):
+    assert geo.locate('02108') is not None
+    assert [donor['id'] for donor in geo.ungeocoded_donors(['O-'])] == ['unknown']
+    assert [donor['id'] for donor in geo.ungeocoded_donors(['A+', 'O-'])] == ['unknown_a', 'unknown']
+
+def test_ungeocoded_pin_codes(conn):
+    assert [tuple(row) for row in geo.ungeocoded_pin_codes()] == [('01169', 2), ('99999', 1)]
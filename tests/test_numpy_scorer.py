@@ -0,0 +1,63 @@
+import copy
+import os
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+pytest.importorskip('sklearn')
+joblib = pytest.importorskip('joblib')
+
+import donation_model
+import numpy_scorer
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'transfusion.csv')
+
+@pytest.fixture(scope='module')
+def fitted():
+    X, y = donation_model.preprocess_data(donation_model.load_data(DATA_PATH))
+    pipeline = donation_model.train_model(X, y)
+    return pipeline, numpy_scorer.LogisticScorer.from_pipeline(pipeline), np.asarray(X, dtype=np.float64)
+
+def rows(X):
+    # the training rows, form-range rows and rows with missing values for the imputer
+    grid = np.array([[r, f, m, t] for r in (0, 2, 50, 100) for f in (0, 1, 100)
+                     for m in (0, 250, 25000) for t in (0, 24, 200)], dtype=np.float64)
+    missing = X[:4].copy()
+    missing[np.arange(4), np.arange(4)] = np.nan
+    return np.vstack([X, grid, missing])
+
+def test_scorer_transform_matches_pipeline(fitted):
+    pipeline, scorer, X = fitted
+    X = rows(X)
+    np.testing.assert_array_equal(scorer.transform(X), pipeline[:-1].transform(X))
+
+def test_scorer_probabilities_match_pipeline(fitted):
+    pipeline, scorer, X = fitted
+    X = rows(X)
+    np.testing.assert_allclose(scorer.predict_proba(X), pipeline.predict_proba(X),
+                               rtol=0, atol=numpy_scorer.TOLERANCE)
+
+def test_saved_scorer_matches(fitted, tmp_path):
+    _, scorer, X = fitted
+    scorer.save(tmp_path / 'scorer.npz')
+    loaded = numpy_scorer.LogisticScorer.load(tmp_path / 'scorer.npz')
+    assert np.array_equal(loaded.predict_proba(X), scorer.predict_proba(X))
+
+def test_persisted_pipeline_passes_parity(fitted, tmp_path):
+    pipeline, _, X = fitted
+    joblib.dump(pipeline, tmp_path / 'pipeline.joblib')
+    assert donation_model.check_transform_parity(joblib.load(tmp_path / 'pipeline.joblib'), rows(X),
+                                                 reference=pipeline)
+
+def test_parity_rejects_perturbed_pipeline(fitted):
+    pipeline, _, X = fitted
+    perturbed = copy.deepcopy(pipeline)
+    perturbed.named_steps['scaler'].mean_[0] += 1e-12
+    assert not donation_model.check_transform_parity(perturbed, rows(X), reference=pipeline)
+
+def test_scorer_check_rejects_perturbed_scorer(fitted):
+    pipeline, scorer, X = fitted
+    perturbed = copy.deepcopy(scorer)
+    perturbed.intercept += 1e-6
+    assert donation_model.check_scorer(scorer, pipeline, X)
+    assert not donation_model.check_scorer(perturbed, pipeline, X)
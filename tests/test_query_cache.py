@@ -0,0 +1,57 @@
+import sqlite3 as sql
+import threading
+import pytest
+import database as db
+
+BANKS = "SELECT bank_name FROM blood_banks ORDER BY bank_name"
+DONORS = "SELECT COUNT(*) FROM donor_record"
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    pool = db.ConnectionPool(str(tmp_path / 'cache.db'))
+    monkeypatch.setattr(db, 'pool', pool)
+    monkeypatch.setattr(db, 'query_cache', db.QueryCache())
+    yield db.query_cache
+    pool.close_all()
+
+def other_process_write(query, params=()):
+    # a connection outside the pool that never calls notify_write, as another process would
+    conn = sql.connect(db.pool.database)
+    with conn:
+        conn.execute(query, params)
+    conn.close()
+
+def rows(query):
+    return [tuple(row) for row in db.cached_query(query)]
+
+def test_outside_write_invalidates_only_its_tables(cache):
+    assert rows(BANKS) == []
+    assert rows(DONORS) == [(0,)]
+    other_process_write("INSERT INTO blood_banks (bank_name) VALUES ('North')")
+
+    assert rows(BANKS) == [('North',)]
+    hits = cache.stats['hits']
+    assert rows(DONORS) == [(0,)]
+    assert cache.stats['hits'] == hits + 1
+
+def test_pool_write_from_another_thread_keeps_other_tables(cache):
+    rows(BANKS)
+    rows(DONORS)
+    worker = threading.Thread(target=db.execute_query,
+                              args=("INSERT INTO blood_banks (bank_name) VALUES ('South')",))
+    worker.start()
+    worker.join()
+
+    assert rows(BANKS) == [('South',)]
+    hits = cache.stats['hits']
+    assert rows(DONORS) == [(0,)]
+    assert cache.stats['hits'] == hits + 1
+
+def test_bulk_insert_moves_table_version(cache):
+    conn = db.get_db_connection()
+    before = conn.execute("SELECT version FROM table_versions WHERE name = 'blood_units'").fetchone()[0]
+    conn.execute("BEGIN IMMEDIATE;")
+    db.bulk_insert(conn, 'blood_units', ('blood_type', 'collection_date', 'expiry_date', 'status'),
+                   [('O+', '2024-01-01', '2024-02-12', 'Available')] * 3)
+    conn.commit()
+    assert conn.execute("SELECT version FROM table_versions WHERE name = 'blood_units'").fetchone()[0] == before + 1
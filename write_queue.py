@@ -0,0 +1,266 @@
+import logging
+import queue
+import random
+import sqlite3 as sql
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+import database as db
+
+# Group-commit write queue.
+#
+# Request submissions and status updates from every session go through one
+# writer thread with its own connection instead of each opening a write
+# transaction of their own, so concurrent submitters never race each other
+# for SQLite's write lock. The writer takes whatever has queued up while the
+# previous group was committing - optionally waiting up to flush_interval
+# seconds after the first write for more to arrive, which bounds the latency
+# it adds - and applies it in a single transaction, each write inside its own
+# savepoint so one failing write does not undo the others. If the lock is held by
+# another process (SQLITE_BUSY) the whole group is retried with jittered
+# exponential backoff. Every submitter gets its own result or error back.
+#
+#     result = write_queue.execute_write("UPDATE blood_requests SET status = ? WHERE request_id = ?",
+#                                        ('Approved', 42))
+
+logger = logging.getLogger(__name__)
+
+# longest a write waits for others to join its group commit; under load the
+# writes queued during one commit already make the next group, and waiting
+# on top of that only added latency in benchmarks/write_queue_benchmark.py
+FLUSH_INTERVAL = 0.0
+# most writes in one group commit
+MAX_BATCH = 500
+# writes waiting to be committed before submit() blocks the caller
+MAX_PENDING = 10000
+
+# the writer's connection gives up on a busy lock quickly and backs off itself
+WRITER_BUSY_TIMEOUT_MS = 50
+BUSY_RETRIES = 8
+BUSY_BACKOFF = 0.01
+BUSY_BACKOFF_MAX = 0.5
+
+# how long execute_write waits for its write to be committed
+SUBMIT_TIMEOUT = 30.0
+LATENCY_SAMPLES = 1000
+
+_SQLITE_BUSY_CODES = (sql.SQLITE_BUSY, sql.SQLITE_LOCKED)
+
+
+class WriteQueueFullError(RuntimeError):
+    """Raised when a write cannot be queued because the writer is too far behind."""
+
+
+class WriteQueueStoppedError(RuntimeError):
+    """Raised for writes submitted to, or left in, a stopped queue."""
+
+
+@dataclass(frozen=True)
+class WriteResult:
+    """Outcome of one committed write"""
+    lastrowid: int
+    rowcount: int
+
+
+@dataclass
+class _Write:
+    query: str
+    params: object
+    tables: tuple
+    future: Future
+    submitted: float
+
+
+def _is_busy(error):
+    if getattr(error, 'sqlite_errorcode', None) in _SQLITE_BUSY_CODES:
+        return True
+    message = str(error)
+    return 'database is locked' in message or 'database is busy' in message
+
+
+class WriteQueue:
+    """
+    Single writer thread applying queued writes in group commits
+
+    submit() returns a concurrent.futures.Future resolving to a WriteResult,
+    or to the exception the write raised; execute() waits for it.
+    """
+
+    def __init__(self, database=None, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH,
+                 max_pending=MAX_PENDING):
+        self.database = database or db.pool.database
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.stats = {'writes': 0, 'failed': 0, 'batches': 0, 'busy_retries': 0, 'largest_batch': 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop_event.clear()
+                self._thread = threading.Thread(target=self._run, name='write-queue', daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Commit what is already queued, then stop the writer thread"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, query, params=(), tables=None, timeout=SUBMIT_TIMEOUT):
+        """Queue one write and return a Future for its WriteResult"""
+        if self._stop_event.is_set():
+            raise WriteQueueStoppedError("the write queue is stopped")
+        self.start()
+        params = params if isinstance(params, dict) else tuple(params)
+        write = _Write(query, params, tuple(tables or db.written_tables(query)),
+                       Future(), time.perf_counter())
+        try:
+            self._queue.put(write, timeout=timeout)
+        except queue.Full:
+            raise WriteQueueFullError(f"{self._queue.maxsize} writes are already waiting")
+        return write.future
+
+    def execute(self, query, params=(), tables=None, timeout=SUBMIT_TIMEOUT):
+        """Queue one write and wait until it is committed; raises the write's own error"""
+        return self.submit(query, params, tables, timeout).result(timeout)
+
+    def _connect(self):
+        # autocommit mode: the writer issues BEGIN, SAVEPOINT and COMMIT itself
+        conn = sql.connect(self.database, isolation_level=None, check_same_thread=False)
+        for pragma, value in db.PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma} = {value};")
+        conn.execute(f"PRAGMA busy_timeout = {WRITER_BUSY_TIMEOUT_MS};")
+        db.migrate(conn)
+        return conn
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _apply(self, conn, batch):
+        # returns one WriteResult or exception per write; raises on a busy lock
+        outcomes = []
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            for write in batch:
+                conn.execute("SAVEPOINT write;")
+                try:
+                    cursor = conn.execute(write.query, write.params)
+                    outcomes.append(WriteResult(cursor.lastrowid, cursor.rowcount))
+                    conn.execute("RELEASE write;")
+                except sql.Error as e:
+                    if _is_busy(e):
+                        raise
+                    conn.execute("ROLLBACK TO write;")
+                    conn.execute("RELEASE write;")
+                    outcomes.append(e)
+            conn.execute("COMMIT;")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK;")
+            raise
+        return outcomes
+
+    def _commit(self, conn, batch):
+        for attempt in range(BUSY_RETRIES + 1):
+            try:
+                return self._apply(conn, batch)
+            except sql.Error as e:
+                if not _is_busy(e) or attempt == BUSY_RETRIES:
+                    raise
+                self.stats['busy_retries'] += 1
+                delay = min(BUSY_BACKOFF * 2 ** attempt, BUSY_BACKOFF_MAX)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def _settle(self, batch, outcomes):
+        tables = {table for write, outcome in zip(batch, outcomes)
+                  if isinstance(outcome, WriteResult) and outcome.rowcount for table in write.tables}
+        if tables:
+            db.notify_write(*sorted(tables))
+        now = time.perf_counter()
+        for write, outcome in zip(batch, outcomes):
+            if isinstance(outcome, Exception):
+                self.stats['failed'] += 1
+                write.future.set_exception(outcome)
+            else:
+                self.stats['writes'] += 1
+                write.future.set_result(outcome)
+            self._latencies.append((now - write.submitted) * 1000)
+
+    def _run(self):
+        conn = None
+        try:
+            conn = self._connect()
+            while True:
+                batch = self._next_batch()
+                if not batch:
+                    if self._stop_event.is_set():
+                        break
+                    continue
+                self.stats['batches'] += 1
+                self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+                try:
+                    outcomes = self._commit(conn, batch)
+                except Exception as e:
+                    logger.exception("group commit of %d write(s) failed", len(batch))
+                    outcomes = [e] * len(batch)
+                self._settle(batch, outcomes)
+        except Exception:
+            logger.exception("write queue stopped")
+        finally:
+            if conn is not None:
+                conn.close()
+            # anything submitted while stopping is failed rather than left waiting
+            while True:
+                try:
+                    self._queue.get_nowait().future.set_exception(
+                        WriteQueueStoppedError("the write queue stopped before this write"))
+                except queue.Empty:
+                    break
+
+    def info(self):
+        """Write counters, queue depth and submit-to-commit latency"""
+        latencies = sorted(self._latencies)
+        batches = self.stats['batches']
+        return {
+            'pending': self._queue.qsize(),
+            'running': self._thread is not None and self._thread.is_alive(),
+            'writes_per_batch': (self.stats['writes'] + self.stats['failed']) / batches if batches else 0.0,
+            'latency_ms_p50': latencies[len(latencies) // 2] if latencies else None,
+            'latency_ms_p95': latencies[int(len(latencies) * 0.95)] if latencies else None,
+            **self.stats,
+        }
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    """Return the process-wide write queue, starting its thread if needed"""
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer._stop_event.is_set():
+            _writer = WriteQueue()
+        return _writer.start()
+
+def execute_write(query, params=(), tables=None, timeout=SUBMIT_TIMEOUT):
+    """Run one write through the process-wide queue and return its WriteResult"""
+    return get_writer().execute(query, params, tables, timeout)